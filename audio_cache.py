@@ -0,0 +1,265 @@
+import json
+import sqlite3
+from collections import Counter, defaultdict
+import numpy as np
+
+# Fingerprint parameters, after Haitsma & Kalker. Audio is 16kHz mono, as
+# fed to Whisper, and is decimated to ~5.3kHz. Long, heavily overlapping
+# frames make each 32-bit sub-fingerprint (the signs of energy differences
+# between 33 log-spaced bands in consecutive frames) robust to re-encoding,
+# volume changes and misalignment by a fraction of a hop.
+SAMPLE_RATE = 16000
+DECIMATION = 3
+FRAME_SIZE = 2048
+HOP_SIZE = 128
+FRAME_SECONDS = HOP_SIZE * DECIMATION / SAMPLE_RATE
+BAND_EDGES_HZ = np.geomspace(300, 2000, 34)
+# Time of the centre of the frames compared by sub-fingerprint 0
+FRAME_CENTRE_SECONDS = (HOP_SIZE + FRAME_SIZE / 2) * DECIMATION / SAMPLE_RATE
+
+# Only every INDEX_STRIDE-th sub-fingerprint of a cached entry is indexed;
+# queries look up every frame, so any alignment still finds its matches.
+INDEX_STRIDE = 4
+# A candidate alignment is accepted where the bit error rate, averaged
+# over about a second, stays below this threshold.
+MAX_BIT_ERROR_RATE = 0.25
+SMOOTHING_FRAMES = 32
+MIN_VOTES = 3
+# Matches are only trusted this far inside their edges, where the smoothed
+# bit error rate may run past the end of the shared audio. Every gap left
+# over is transcribed, with this much context either side so words at the
+# edges are decoded whole.
+EDGE_SECONDS = 0.5
+SQL_BATCH = 900
+
+
+def audio_fingerprint(samples):
+    """Compute the sequence of 32-bit sub-fingerprints for 16kHz mono PCM.
+
+    Sub-fingerprint i describes the audio around
+    FRAME_CENTRE_SECONDS + i * FRAME_SECONDS.
+    """
+    samples = np.asarray(samples, dtype=np.float32)
+    # Average groups of samples: a crude low-pass, but ample below 2kHz
+    samples = samples[:len(samples) // DECIMATION * DECIMATION].reshape(-1, DECIMATION).mean(axis=1)
+    if len(samples) < FRAME_SIZE + HOP_SIZE:
+        return np.empty(0, dtype=np.uint32)
+
+    frequencies = np.fft.rfftfreq(FRAME_SIZE, DECIMATION / SAMPLE_RATE)
+    band_index = np.searchsorted(BAND_EDGES_HZ, frequencies) - 1
+    bands = np.zeros((len(frequencies), len(BAND_EDGES_HZ) - 1), dtype=np.float32)
+    in_band = np.flatnonzero((band_index >= 0) & (band_index < bands.shape[1]))
+    bands[in_band, band_index[in_band]] = 1
+    window = np.hanning(FRAME_SIZE).astype(np.float32)
+    frames = np.lib.stride_tricks.sliding_window_view(samples, FRAME_SIZE)[::HOP_SIZE]
+
+    energies = np.empty((len(frames), bands.shape[1]), dtype=np.float32)
+    for batch in range(0, len(frames), 1024):
+        spectrum = np.abs(np.fft.rfft(frames[batch:batch + 1024] * window, axis=1)) ** 2
+        energies[batch:batch + len(spectrum)] = spectrum @ bands
+
+    band_diff = energies[:, :-1] - energies[:, 1:]
+    bits = (band_diff[1:] - band_diff[:-1]) > 0
+    return np.packbits(bits, axis=1, bitorder="little").view("<u4").ravel().astype(np.uint32)
+
+def bit_errors(a, b):
+    """Number of differing bits between two equal-length sub-fingerprint arrays."""
+    return np.unpackbits((a ^ b).view(np.uint8)).reshape(len(a), 32).sum(axis=1)
+
+def uncovered_gaps(regions, duration):
+    """Return the (start, end) seconds of [0, duration] not covered by regions."""
+    gaps = []
+    cursor = 0.0
+    for start, end in sorted(regions):
+        if start > cursor:
+            gaps.append((cursor, start))
+        cursor = max(cursor, end)
+    if cursor < duration:
+        gaps.append((cursor, duration))
+    return gaps
+
+
+class TranscriptionCache:
+    """Reuse word timestamps for audio that has been transcribed before.
+
+    Repeated material such as theme songs, recaps and end credits is found by
+    fingerprint, wherever it sits in the new audio, and its cached words are
+    shifted to the new offset. Only the remaining audio is sent to Whisper,
+    and it is added to the cache afterwards. Backed by SQLite, so the cache
+    persists across runs and processes.
+    """
+
+    def __init__(self, cache_file):
+        self.conn = sqlite3.connect(cache_file, timeout=30)
+        with self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS entries (
+                    id INTEGER PRIMARY KEY,
+                    fingerprint BLOB NOT NULL,
+                    words TEXT NOT NULL
+                )
+            """)
+            self.conn.execute("CREATE TABLE IF NOT EXISTS hashes (hash INTEGER, entry_id INTEGER, frame INTEGER)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS hashes_by_hash ON hashes (hash)")
+            self.conn.execute("CREATE TABLE IF NOT EXISTS stats (name TEXT PRIMARY KEY, value REAL NOT NULL)")
+        self.fingerprints = {}
+
+    def close(self):
+        self.conn.close()
+
+    def add(self, samples, words):
+        """Cache words (dicts with word/start/end relative to the samples)."""
+        fingerprint = audio_fingerprint(samples)
+        if len(fingerprint) == 0:
+            return None
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO entries (fingerprint, words) VALUES (?, ?)",
+                (fingerprint.astype("<u4").tobytes(), json.dumps(words))
+            )
+            entry_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO hashes (hash, entry_id, frame) VALUES (?, ?, ?)",
+                ((int(fingerprint[frame]), entry_id, frame) for frame in range(0, len(fingerprint), INDEX_STRIDE))
+            )
+        return entry_id
+
+    def entry_fingerprint(self, entry_id):
+        if entry_id not in self.fingerprints:
+            (blob,) = self.conn.execute("SELECT fingerprint FROM entries WHERE id = ?", (entry_id,)).fetchone()
+            self.fingerprints[entry_id] = np.frombuffer(blob, dtype="<u4").astype(np.uint32)
+        return self.fingerprints[entry_id]
+
+    def find_matches(self, fingerprint, min_match_seconds=3.0):
+        """Find regions of a fingerprint that match cached audio.
+
+        Returns non-overlapping (start_frame, end_frame, entry_id, delta)
+        tuples, where entry frame = query frame + delta.
+        """
+        # Vote for (entry, alignment) pairs using exact sub-fingerprint hits
+        frames_by_hash = defaultdict(list)
+        for frame, value in enumerate(fingerprint.tolist()):
+            if value not in (0, 0xFFFFFFFF):  # Silence and clipping match everything
+                frames_by_hash[value].append(frame)
+        votes = Counter()
+        hashes = list(frames_by_hash)
+        for batch in range(0, len(hashes), SQL_BATCH):
+            chunk = hashes[batch:batch + SQL_BATCH]
+            rows = self.conn.execute(
+                f"SELECT hash, entry_id, frame FROM hashes WHERE hash IN ({','.join('?' * len(chunk))})", chunk
+            )
+            for value, entry_id, entry_frame in rows:
+                for frame in frames_by_hash[value]:
+                    votes[(entry_id, entry_frame - frame)] += 1
+
+        # Verify the best alignments frame by frame and keep long matching runs
+        min_frames = int(min_match_seconds / FRAME_SECONDS)
+        kernel = np.ones(SMOOTHING_FRAMES) / SMOOTHING_FRAMES
+        candidates = []
+        for (entry_id, delta), count in votes.most_common(8):
+            if count < MIN_VOTES:
+                break
+            cached = self.entry_fingerprint(entry_id)
+            first = max(0, -delta)
+            last = min(len(fingerprint), len(cached) - delta)
+            if last - first < min_frames:
+                continue
+            errors = bit_errors(fingerprint[first:last], cached[first + delta:last + delta]) / 32
+            matching = np.convolve(errors, kernel, mode="same") < MAX_BIT_ERROR_RATE
+            edges = np.flatnonzero(np.diff(np.r_[0, matching.astype(np.int8), 0]))
+            for run_start, run_end in zip(edges[::2], edges[1::2]):
+                if run_end - run_start >= min_frames:
+                    candidates.append((first + run_start, first + run_end, entry_id, delta))
+
+        # Longest runs win where candidates overlap
+        matches = []
+        for candidate in sorted(candidates, key=lambda c: c[0] - c[1]):
+            if all(candidate[1] <= m[0] or candidate[0] >= m[1] for m in matches):
+                matches.append(candidate)
+        return sorted(matches)
+
+    def cached_words(self, entry_id, delta, start, end):
+        """Cached words centred within query seconds [start, end), in query time."""
+        (words_json,) = self.conn.execute("SELECT words FROM entries WHERE id = ?", (entry_id,)).fetchone()
+        shift = delta * FRAME_SECONDS
+        return [
+            {**word, "start": word["start"] - shift, "end": word["end"] - shift}
+            for word in json.loads(words_json)
+            if start <= (word["start"] + word["end"]) / 2 - shift < end
+        ]
+
+    def transcribe(self, samples, transcribe_fn, min_match_seconds=3.0):
+        """Transcribe 16kHz mono samples, reusing cached words where possible.
+
+        transcribe_fn(samples) must return a list of word dicts (word,
+        start, end) relative to the samples it is given. Returns the words
+        for the whole input, relative to its start.
+        """
+        samples = np.asarray(samples, dtype=np.float32)
+        duration = len(samples) / SAMPLE_RATE
+        matches = self.find_matches(audio_fingerprint(samples), min_match_seconds)
+
+        words = []
+        regions = []
+        for start_frame, end_frame, entry_id, delta in matches:
+            start = FRAME_CENTRE_SECONDS + int(start_frame) * FRAME_SECONDS
+            end = min(duration, FRAME_CENTRE_SECONDS + int(end_frame) * FRAME_SECONDS)
+            # Trust the match inside its edges, except at the ends of the input
+            start = start + EDGE_SECONDS if start > FRAME_CENTRE_SECONDS else 0.0
+            end = end - EDGE_SECONDS if end < duration else duration
+            if end <= start:
+                continue
+            regions.append((start, end))
+            words.extend(self.cached_words(entry_id, delta, start, end))
+
+        # Every gap is transcribed, however short; each word is taken from
+        # whichever region or gap holds its midpoint
+        for start, end in uncovered_gaps(regions, duration):
+            piece_start = max(0.0, start - EDGE_SECONDS)
+            piece = samples[int(piece_start * SAMPLE_RATE):int(min(duration, end + EDGE_SECONDS) * SAMPLE_RATE)]
+            piece_words = transcribe_fn(piece)
+            self.add(piece, piece_words)
+            words.extend(
+                {**word, "start": word["start"] + piece_start, "end": word["end"] + piece_start}
+                for word in piece_words
+                if start <= (word["start"] + word["end"]) / 2 + piece_start < end
+            )
+
+        reused = sum(end - start for start, end in regions)
+        self.record(lookups=1, hits=1 if regions else 0, seconds=duration, reused_seconds=reused)
+        return sorted(words, key=lambda word: word["start"])
+
+    def record(self, **counters):
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO stats (name, value) VALUES (?, ?) "
+                "ON CONFLICT(name) DO UPDATE SET value = value + excluded.value",
+                counters.items()
+            )
+
+    def stats(self):
+        """Return cumulative counters: lookups, hits, seconds, reused_seconds."""
+        stats = dict.fromkeys(("lookups", "hits", "seconds", "reused_seconds"), 0)
+        stats.update(self.conn.execute("SELECT name, value FROM stats").fetchall())
+        return stats
+
+
+def read_cache_stats(cache_file):
+    """Return the cumulative stats of a cache file."""
+    cache = TranscriptionCache(cache_file)
+    try:
+        return cache.stats()
+    finally:
+        cache.close()
+
+def format_cache_stats(before, after):
+    """Describe the cache activity between two stats() snapshots."""
+    lookups = after["lookups"] - before["lookups"]
+    if not lookups:
+        return "Dedupe cache: no lookups"
+    hits = after["hits"] - before["hits"]
+    seconds = after["seconds"] - before["seconds"]
+    reused = after["reused_seconds"] - before["reused_seconds"]
+    return (f"Dedupe cache: {hits:.0f}/{lookups:.0f} segments hit ({100 * hits / lookups:.0f}%), "
+            f"{reused:.0f}s of {seconds:.0f}s audio reused ({100 * reused / seconds if seconds else 0:.0f}%)")
@@ -0,0 +1,197 @@
+import os
+import json
+import time
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Seconds; titles and stages range from seconds (targeted) to hours (full Whisper)
+DURATION_BUCKETS = (1, 5, 15, 30, 60, 120, 300, 600, 1200, 1800, 3600, 7200)
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (
+        (name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for name, value in sorted(labels.items())
+    )
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+def format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+def read_run_metrics(metrics_file):
+    """Load the JSON written by swears.py --metrics-out, or None if it is missing."""
+    try:
+        with open(metrics_file) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class MetricsRegistry:
+    """Minimal thread-safe registry rendering the Prometheus text format.
+
+    Supports counters, gauges and histograms with labels; no client library
+    needed.
+    """
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.kinds = {}
+        self.help = {}
+        self.values = {}  # name -> {sorted label items: value or histogram state}
+
+    def describe(self, name, kind, help_text):
+        self.kinds[name] = kind
+        self.help[name] = help_text
+        self.values[name] = {}
+
+    def inc(self, name, amount=1, **labels):
+        """Increase a counter, or change a gauge by amount."""
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            self.values[name][key] = self.values[name].get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        with self.lock:
+            self.values[name][tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, **labels):
+        """Record a histogram observation."""
+        key = tuple(sorted(labels.items()))
+        with self.lock:
+            buckets, total, count = self.values[name].get(key, ([0] * len(DURATION_BUCKETS), 0.0, 0))
+            buckets = [n + (value <= bound) for n, bound in zip(buckets, DURATION_BUCKETS)]
+            self.values[name][key] = (buckets, total + value, count + 1)
+
+    def get(self, name, **labels):
+        return self.values[name].get(tuple(sorted(labels.items())))
+
+    def render(self):
+        lines = []
+        with self.lock:
+            for name, kind in self.kinds.items():
+                lines.append(f"# HELP {name} {self.help[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+                for key, value in sorted(self.values[name].items()):
+                    labels = dict(key)
+                    if kind != "histogram":
+                        lines.append(f"{name}{format_labels(labels)} {format_value(value)}")
+                        continue
+                    buckets, total, count = value
+                    for bound, n in zip(DURATION_BUCKETS, buckets):
+                        lines.append(f"{name}_bucket{format_labels({**labels, 'le': bound})} {n}")
+                    lines.append(f"{name}_bucket{format_labels({**labels, 'le': '+Inf'})} {count}")
+                    lines.append(f"{name}_sum{format_labels(labels)} {format_value(total)}")
+                    lines.append(f"{name}_count{format_labels(labels)} {count}")
+        return "\n".join(lines) + "\n"
+
+
+class BatchMetrics(MetricsRegistry):
+    """Metrics for a long-running batch, from process_videos.py or watch_videos.py.
+
+    Exposed on a local HTTP endpoint (serve) and/or written atomically to a
+    file for node_exporter's textfile collector (textfile). Per-title
+    numbers come from the JSON swears.py writes with --metrics-out.
+    """
+
+    def __init__(self, textfile=None):
+        super().__init__()
+        self.textfile = textfile
+        self.server = None
+        self.describe("swears_titles_processed_total", "counter", "Titles processed, by result")
+        self.describe("swears_titles_in_progress", "gauge", "Titles currently being processed")
+        self.describe("swears_queue_depth", "gauge", "Titles waiting to be processed")
+        self.describe("swears_last_title_finished_timestamp_seconds", "gauge",
+                      "Unix time the last title finished, to catch stuck workers")
+        self.describe("swears_title_duration_seconds", "histogram", "Wall time per title")
+        self.describe("swears_stage_duration_seconds", "histogram", "Wall time per pipeline stage")
+        self.describe("swears_whisper_audio_seconds_total", "counter", "Seconds of audio decoded by Whisper")
+        self.describe("swears_whisper_seconds_total", "counter",
+                      "Wall seconds spent in Whisper (audio seconds / this = realtime factor)")
+        self.describe("swears_ffmpeg_subprocesses_total", "counter", "ffmpeg/ffprobe processes started")
+        self.describe("swears_ffmpeg_seconds_total", "counter", "Wall seconds spent waiting on ffmpeg/ffprobe")
+        self.describe("swears_mute_windows_total", "counter",
+                      "Mute windows by source (whisper, or srt_fallback when Whisper missed the word)")
+
+    def serve(self, port, host="127.0.0.1"):
+        """Serve /metrics over HTTP on a background thread."""
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path not in ("/", "/metrics"):
+                    self.send_error(404)
+                    return
+                body = registry.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self.server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"Serving metrics on http://{host}:{self.server.server_address[1]}/metrics")
+
+    def publish(self):
+        """Write the textfile, if one is configured."""
+        if not self.textfile:
+            return
+        # Worker threads and the watcher's main loop publish concurrently
+        with self.lock:
+            temp_file = f"{self.textfile}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(temp_file, "w") as f:
+                f.write(self.render())
+            os.replace(temp_file, self.textfile)
+
+    def set_queue_depth(self, depth):
+        if self.get("swears_queue_depth") != depth:
+            self.set("swears_queue_depth", depth)
+            self.publish()
+
+    def title_started(self):
+        self.inc("swears_titles_in_progress")
+        self.publish()
+
+    def title_finished(self, success, seconds, run=None):
+        """Record a finished title and the run metrics swears.py reported for it."""
+        self.inc("swears_titles_in_progress", -1)
+        self.inc("swears_titles_processed_total", result="success" if success else "failure")
+        self.set("swears_last_title_finished_timestamp_seconds", time.time())
+        self.observe("swears_title_duration_seconds", seconds)
+        if run:
+            for stage, stage_seconds in run["stage_seconds"].items():
+                self.observe("swears_stage_duration_seconds", stage_seconds, stage=stage)
+            self.inc("swears_whisper_audio_seconds_total", run["whisper_audio_seconds"])
+            self.inc("swears_whisper_seconds_total", run["whisper_seconds"])
+            self.inc("swears_ffmpeg_subprocesses_total", run["ffmpeg_calls"])
+            self.inc("swears_ffmpeg_seconds_total", run["ffmpeg_seconds"])
+            for source, count in run["mute_window_sources"].items():
+                self.inc("swears_mute_windows_total", count, source=source)
+        self.publish()
+
+    def close(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+
+def add_metrics_arguments(parser):
+    parser.add_argument("--metrics-port", type=int, help="Serve Prometheus metrics on this local port")
+    parser.add_argument("--metrics-textfile",
+                        help="Write Prometheus metrics to this file (for node_exporter's textfile collector)")
+
+def create_metrics(args):
+    """Create batch metrics if --metrics-port or --metrics-textfile was given."""
+    if args.metrics_port is None and not args.metrics_textfile:
+        return None
+    metrics = BatchMetrics(textfile=args.metrics_textfile)
+    if args.metrics_port is not None:
+        metrics.serve(args.metrics_port)
+    metrics.publish()
+    return metrics
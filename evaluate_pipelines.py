@@ -0,0 +1,186 @@
+import os
+import json
+import time
+import argparse
+import itertools
+import numpy as np
+import swears
+from process_videos import find_video_files
+
+PIPELINES = ("full", "cascade", "targeted", "targeted-sync")
+
+# swears.Cleaner options for each pipeline; like swears.py, the targeted ones
+# fall back to the full pipeline for videos without subtitles
+PIPELINE_OPTIONS = {
+    "full": {"full_whisper": True},
+    "cascade": {"full_whisper": True, "cascade": True},
+    "targeted": {},
+    "targeted-sync": {"auto_sync": True},
+}
+
+# Ground truth lives next to each video, e.g. "episode.mkv" -> "episode.mutes.json":
+# {"mutes": [{"start": 12.34, "end": 12.71, "word": "..."}, ...]}
+ANNOTATION_SUFFIX = ".mutes.json"
+
+
+def annotation_path(video_file):
+    return os.path.splitext(video_file)[0] + ANNOTATION_SUFFIX
+
+def load_annotations(annotation_file):
+    """Load ground-truth mutes as sorted (starts, ends) arrays in seconds."""
+    with open(annotation_file) as f:
+        mutes = sorted(json.load(f)["mutes"], key=lambda mute: mute["start"])
+    starts = np.array([mute["start"] for mute in mutes], dtype=np.float64)
+    ends = np.array([mute["end"] for mute in mutes], dtype=np.float64)
+    return starts, ends
+
+def score_windows(pred_starts, pred_ends, true_starts, true_ends):
+    """Compare predicted mute windows with ground-truth mutes.
+
+    A window is a hit if it overlaps any true mute, and a true mute is found
+    if any window overlaps it. Returns counts (see summarize_scores), so
+    scores from several videos can be added together.
+    """
+    pred_starts, pred_ends = np.asarray(pred_starts, dtype=np.float64), np.asarray(pred_ends, dtype=np.float64)
+    true_starts, true_ends = np.asarray(true_starts, dtype=np.float64), np.asarray(true_ends, dtype=np.float64)
+    overlap = np.clip(
+        np.minimum(pred_ends[:, None], true_ends[None, :]) - np.maximum(pred_starts[:, None], true_starts[None, :]),
+        0, None
+    )
+    covered = float(overlap.sum())
+    return {
+        "windows": len(pred_starts),
+        "windows_hit": int((overlap > 0).any(axis=1).sum()),
+        "mutes": len(true_starts),
+        "mutes_found": int((overlap > 0).any(axis=0).sum()),
+        "mute_seconds": float((true_ends - true_starts).sum()),
+        "covered_seconds": covered,
+        "over_muted_seconds": float((pred_ends - pred_starts).sum()) - covered,
+    }
+
+def summarize_scores(scores):
+    """Add up per-video scores and derive precision, recall and coverage.
+
+    Coverage is the fraction of ground-truth mute time actually muted; a
+    window that finds a word but clips its end still lets part of it through.
+    """
+    total = {key: sum(score[key] for score in scores) for key in scores[0]} if scores else {}
+    return {
+        **total,
+        "precision": total["windows_hit"] / total["windows"] if total.get("windows") else 1.0,
+        "recall": total["mutes_found"] / total["mutes"] if total.get("mutes") else 1.0,
+        "coverage": total["covered_seconds"] / total["mute_seconds"] if total.get("mute_seconds") else 1.0,
+    }
+
+def build_configurations(pipelines, models, clip_buffers):
+    """Expand the option grid. clip_buffer applies to every pipeline but full."""
+    configurations = []
+    for pipeline, model in itertools.product(pipelines, models):
+        for clip_buffer in (clip_buffers if pipeline != "full" else [None]):
+            name = f"{pipeline}/{model}" + (f"/buffer={clip_buffer:g}" if clip_buffer is not None else "")
+            configurations.append({"name": name, "pipeline": pipeline, "model": model, "clip_buffer": clip_buffer})
+    return configurations
+
+def create_cleaner(configuration, target_words=None):
+    """Build the swears.Cleaner that runs a configuration, writing nothing next to the videos."""
+    return swears.Cleaner(
+        target_words=target_words, model_name=configuration["model"], force=True, add_clean_subtitles=False,
+        save_transcription=False, clip_buffer=configuration["clip_buffer"], **PIPELINE_OPTIONS[configuration["pipeline"]]
+    )
+
+def run_pipeline(cleaner, video_file):
+    """Run a video through cleaner up to its mute windows.
+
+    This is the code path swears.py runs, stopped before rendering.
+    Returns padded, merged (starts, ends).
+    """
+    result = cleaner.clean(video_file, render=False)
+    return result.starts, result.ends
+
+def evaluate(video_files, configurations, target_words=None):
+    """Run every configuration on every annotated video. Returns per-configuration results."""
+    results = []
+    for configuration in configurations:
+        runs = []
+        with create_cleaner(configuration, target_words) as cleaner:
+            for video_file in video_files:
+                print(f"\n=== {configuration['name']}: {video_file} ===")
+                true_starts, true_ends = load_annotations(annotation_path(video_file))
+                with swears.StageTimer() as timer:
+                    start = time.perf_counter()
+                    starts, ends = run_pipeline(cleaner, video_file)
+                    wall_seconds = time.perf_counter() - start
+                runs.append({
+                    "video": video_file,
+                    "wall_seconds": wall_seconds,
+                    "whisper_seconds": timer.whisper_seconds,
+                    "audio_seconds_decoded": timer.audio_seconds,
+                    "ffmpeg_seconds": timer.ffmpeg_seconds,
+                    "ffmpeg_calls": timer.ffmpeg_calls,
+                    **score_windows(starts, ends, true_starts, true_ends),
+                })
+        results.append({
+            **configuration,
+            "wall_seconds": sum(run["wall_seconds"] for run in runs),
+            "whisper_seconds": sum(run["whisper_seconds"] for run in runs),
+            "audio_seconds_decoded": sum(run["audio_seconds_decoded"] for run in runs),
+            "ffmpeg_seconds": sum(run["ffmpeg_seconds"] for run in runs),
+            **summarize_scores(runs),
+            "videos": runs,
+        })
+    return results
+
+def format_results(results, min_recall=0.95):
+    """Render a comparison table and pick the fastest configuration meeting min_recall."""
+    lines = [f"{'configuration':<36} {'wall s':>8} {'whisper s':>9} {'audio s':>8} {'ffmpeg s':>8} "
+             f"{'precision':>9} {'recall':>6} {'coverage':>8}"]
+    for result in results:
+        lines.append(
+            f"{result['name']:<36} {result['wall_seconds']:>8.1f} {result['whisper_seconds']:>9.1f} "
+            f"{result['audio_seconds_decoded']:>8.1f} {result['ffmpeg_seconds']:>8.1f} "
+            f"{result['precision']:>9.2f} {result['recall']:>6.2f} {result['coverage']:>8.2f}"
+        )
+    passing = [result for result in results if result["recall"] >= min_recall]
+    if passing:
+        best = min(passing, key=lambda result: result["wall_seconds"])
+        lines.append(f"\nFastest configuration with recall >= {min_recall:g}: {best['name']}")
+    else:
+        lines.append(f"\nNo configuration reached recall >= {min_recall:g}")
+    return "\n".join(lines)
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare pipeline configurations for speed and mute accuracy")
+    parser.add_argument("paths", nargs="+", help="Videos or directories of videos with <name>.mutes.json annotations")
+    parser.add_argument("--pipelines", nargs="+", choices=PIPELINES, default=["full", "targeted"],
+                        help="Pipelines to compare (default: full targeted)")
+    parser.add_argument("--models", nargs="+", default=["base.en"], help="Whisper models to compare (default: base.en)")
+    parser.add_argument("--clip-buffers", nargs="+", type=float, default=[2.0],
+                        help="Targeted pipeline clip buffers in seconds to compare (default: 2.0)")
+    parser.add_argument("--target-words", help="Comma-separated words to mute instead of the default list")
+    parser.add_argument("--min-recall", type=float, default=0.95,
+                        help="Accuracy bar for recommending a configuration (default: 0.95)")
+    parser.add_argument("--output", help="Write full per-video results to this JSON file")
+    args = parser.parse_args()
+
+    video_files = []
+    for path in args.paths:
+        video_files.extend(sorted(find_video_files(path)) if os.path.isdir(path) else [path])
+    annotated = [video for video in video_files if os.path.exists(annotation_path(video))]
+    for video in sorted(set(video_files) - set(annotated)):
+        print(f"Skipping {video}: no {os.path.basename(annotation_path(video))}")
+    if not annotated:
+        print("No annotated videos found.")
+        return
+
+    target_words = [word.strip() for word in args.target_words.split(",")] if args.target_words else None
+    configurations = build_configurations(args.pipelines, args.models, args.clip_buffers)
+    results = evaluate(annotated, configurations, target_words)
+
+    print("\n" + format_results(results, args.min_recall))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=4)
+        print(f"Results saved to '{args.output}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,212 @@
+import os
+import re
+import json
+import time
+import sqlite3
+import subprocess
+
+# Job states, in pipeline order. swears.py advances a job through the
+# in-progress states; process_videos.py marks it done or failed.
+QUEUED = "queued"
+EXTRACTING = "extracting"
+TRANSCRIBING = "transcribing"
+MUXING = "muxing"
+DONE = "done"
+FAILED = "failed"
+JOB_STATES = (QUEUED, EXTRACTING, TRANSCRIBING, MUXING, DONE, FAILED)
+IN_PROGRESS_STATES = (EXTRACTING, TRANSCRIBING, MUXING)
+
+# Orders accepted by job_priority (lower priority runs first)
+PRIORITY_ORDERS = ("shortest", "newest", "path")
+
+# Temp files written next to the video while a clean .m4a sidecar is rendered,
+# named after the video so cleanup can tell whose they are
+SIDECAR_TEMP_SUFFIX = ".clean-audio.temp.m4a"
+
+# Temp files written next to the video by add_audio_to_video/remove_clean_audio
+# (e.g. "episode.mkv.temp.mkv") or render_clean_tracks ("episode.mkv" +
+# SIDECAR_TEMP_SUFFIX); the first group is the video's file name
+TEMP_FILE_RE = re.compile(r"^(.+(\.[^.]+))(?:\.temp\2|" + re.escape(SIDECAR_TEMP_SUFFIX) + r")$")
+
+
+class JobJournal:
+    """Persistent, crash-safe record of batch jobs backed by SQLite.
+
+    Every state change is committed immediately, so after a crash or reboot
+    the batch resumes from the journal instead of starting from scratch.
+    """
+
+    def __init__(self, journal_file):
+        self.conn = sqlite3.connect(journal_file, timeout=30)
+        with self.conn:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS jobs (
+                    path TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    priority REAL NOT NULL DEFAULT 0,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    next_attempt REAL NOT NULL DEFAULT 0,
+                    error TEXT,
+                    updated REAL NOT NULL
+                )
+            """)
+
+    def close(self):
+        self.conn.close()
+
+    def add(self, video_file, priority=0):
+        """Queue a job unless the journal already knows about this video."""
+        with self.conn:
+            self.conn.execute(
+                "INSERT OR IGNORE INTO jobs (path, state, priority, updated) VALUES (?, ?, ?, ?)",
+                (os.path.abspath(video_file), QUEUED, priority, time.time())
+            )
+
+    def set_state(self, video_file, state, error=None):
+        if state not in JOB_STATES:
+            raise ValueError(f"Unknown job state '{state}'")
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, error = ?, updated = ? WHERE path = ?",
+                (state, error, time.time(), os.path.abspath(video_file))
+            )
+
+    def get_state(self, video_file):
+        row = self.conn.execute(
+            "SELECT state FROM jobs WHERE path = ?", (os.path.abspath(video_file),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def recover(self):
+        """Requeue jobs left in an in-progress state by a crash. Returns the count."""
+        placeholders = ",".join("?" * len(IN_PROGRESS_STATES))
+        with self.conn:
+            cursor = self.conn.execute(
+                f"UPDATE jobs SET state = ?, updated = ? WHERE state IN ({placeholders})",
+                (QUEUED, time.time(), *IN_PROGRESS_STATES)
+            )
+        return cursor.rowcount
+
+    def claim_next(self, now=None):
+        """Mark the highest-priority runnable job as started and return its path.
+
+        Returns None if no queued job is due (see next_wakeup for backoffs).
+        """
+        now = time.time() if now is None else now
+        with self.conn:
+            row = self.conn.execute(
+                "SELECT path FROM jobs WHERE state = ? AND next_attempt <= ? "
+                "ORDER BY priority, path LIMIT 1",
+                (QUEUED, now)
+            ).fetchone()
+            if row is None:
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, updated = ? WHERE path = ?",
+                (EXTRACTING, now, row[0])
+            )
+        return row[0]
+
+    def defer(self, video_file, delay):
+        """Put a claimed job back in the queue without counting the attempt."""
+        now = time.time()
+        with self.conn:
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, attempts = MAX(attempts - 1, 0), next_attempt = ?, updated = ? "
+                "WHERE path = ?",
+                (QUEUED, now + delay, now, os.path.abspath(video_file))
+            )
+
+    def record_failure(self, video_file, error, max_attempts=3, backoff=60.0):
+        """Requeue a failed job with exponential backoff, or fail it permanently.
+
+        Returns the new state.
+        """
+        path = os.path.abspath(video_file)
+        now = time.time()
+        with self.conn:
+            (attempts,) = self.conn.execute("SELECT attempts FROM jobs WHERE path = ?", (path,)).fetchone()
+            if attempts >= max_attempts:
+                state, next_attempt = FAILED, 0
+            else:
+                state, next_attempt = QUEUED, now + backoff * 2 ** (attempts - 1)
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, next_attempt = ?, error = ?, updated = ? WHERE path = ?",
+                (state, next_attempt, error, now, path)
+            )
+        return state
+
+    def next_wakeup(self):
+        """Return when the earliest backed-off job becomes due, or None."""
+        row = self.conn.execute("SELECT MIN(next_attempt) FROM jobs WHERE state = ?", (QUEUED,)).fetchone()
+        return row[0]
+
+    def counts(self):
+        """Return the number of jobs in each state."""
+        counts = dict.fromkeys(JOB_STATES, 0)
+        counts.update(self.conn.execute("SELECT state, COUNT(*) FROM jobs GROUP BY state").fetchall())
+        return counts
+
+
+def update_job_state(journal_file, video_file, state):
+    """Record pipeline progress in a job journal, if one is in use."""
+    if not journal_file:
+        return
+    journal = JobJournal(journal_file)
+    try:
+        journal.set_state(video_file, state)
+    finally:
+        journal.close()
+
+def probe_duration(media_file):
+    """Return the container duration of a media file in seconds, or None if unknown.
+
+    Shared with swears.py, which imports it from here.
+    """
+    try:
+        probe_result = subprocess.run(
+            ["ffprobe", "-v", "quiet", "-print_format", "json", "-show_format", media_file],
+            capture_output=True, text=True
+        )
+        return float(json.loads(probe_result.stdout)["format"]["duration"])
+    except (OSError, json.JSONDecodeError, KeyError, ValueError, TypeError):
+        return None
+
+def job_priority(video_file, order="shortest"):
+    """Return a sort key for a video; lower values are processed first.
+
+    "shortest" favours short titles to maximize completed titles per hour
+    (titles whose duration can't be probed go last), "newest" favours
+    recently modified files and "path" keeps alphabetical order.
+    """
+    if order == "shortest":
+        duration = probe_duration(video_file)
+        return duration if duration is not None else float("inf")
+    if order == "newest":
+        return -os.path.getmtime(video_file)
+    if order == "path":
+        return 0
+    raise ValueError(f"Unknown priority order '{order}'")
+
+def cleanup_orphan_temp_files(directory, is_active=None):
+    """Remove temp files left behind by an interrupted ffmpeg remux.
+
+    is_active(video_file), if given, protects temp files of videos that are
+    still being processed (e.g. by another node on a shared library).
+    Returns the list of removed paths.
+    """
+    removed = []
+    for root, _, files in os.walk(directory):
+        for file in files:
+            match = TEMP_FILE_RE.match(file)
+            if match:
+                path = os.path.join(root, file)
+                if is_active and is_active(os.path.join(root, match.group(1))):
+                    continue
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                removed.append(path)
+    return removed
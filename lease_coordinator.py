@@ -0,0 +1,193 @@
+import os
+import glob
+import json
+import uuid
+import socket
+import hashlib
+import threading
+from contextlib import contextmanager
+
+
+class LeaseCoordinator:
+    """Coordinate several worker nodes over a shared filesystem with lease files.
+
+    Each title is claimed by atomically creating "<key>.lease" in lease_dir
+    (O_CREAT | O_EXCL, which NFS honours). The owner renews the lease by
+    touching it; a lease whose mtime is older than ttl seconds is stale and
+    may be taken over by another node. Finished titles get a "<key>.done"
+    marker so no node picks them up again.
+
+    Keys are derived from the path relative to library_root, so nodes that
+    mount the share at different paths still agree on them. Lease ages are
+    measured against the shared filesystem's own clock, so clock skew
+    between nodes doesn't matter.
+    """
+
+    def __init__(self, lease_dir, library_root, node_id=None, ttl=300.0):
+        self.lease_dir = lease_dir
+        self.library_root = os.path.abspath(library_root)
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.ttl = ttl
+        os.makedirs(lease_dir, exist_ok=True)
+        self.clock_file = os.path.join(lease_dir, f".clock-{hashlib.sha1(self.node_id.encode()).hexdigest()}")
+
+    def key(self, video_file):
+        relative = os.path.relpath(os.path.abspath(video_file), self.library_root)
+        return hashlib.sha1(relative.replace(os.sep, "/").encode("utf-8")).hexdigest()
+
+    def lease_path(self, video_file):
+        return os.path.join(self.lease_dir, self.key(video_file) + ".lease")
+
+    def done_path(self, video_file):
+        return os.path.join(self.lease_dir, self.key(video_file) + ".done")
+
+    def shared_now(self):
+        """Return the current time according to the shared filesystem."""
+        with open(self.clock_file, "a"):
+            pass
+        os.utime(self.clock_file, None)
+        return os.stat(self.clock_file).st_mtime
+
+    def is_done(self, video_file):
+        return os.path.exists(self.done_path(video_file))
+
+    def owner(self, video_file):
+        """Return the node id holding the lease, or None if unclaimed."""
+        try:
+            with open(self.lease_path(video_file)) as f:
+                return json.load(f).get("node")
+        except (OSError, ValueError):
+            return None
+
+    def is_leased_elsewhere(self, video_file):
+        """Check whether another node holds a live lease on this title."""
+        lease_path = self.lease_path(video_file)
+        try:
+            age = self.shared_now() - os.stat(lease_path).st_mtime
+        except OSError:
+            return False
+        return age <= self.ttl and self.owner(video_file) != self.node_id
+
+    def _create_lease(self, lease_path, video_file):
+        try:
+            fd = os.open(lease_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o644)
+        except FileExistsError:
+            return False
+        with os.fdopen(fd, "w") as f:
+            json.dump({"node": self.node_id, "video": os.path.relpath(os.path.abspath(video_file), self.library_root)}, f)
+        # The previous owner may have finished and released the title since
+        # claim() checked; it writes the done marker before removing its lease
+        if self.is_done(video_file):
+            os.unlink(lease_path)
+            return False
+        return True
+
+    def claim(self, video_file):
+        """Atomically claim a title. Returns True if this node now holds the lease."""
+        if self.is_done(video_file):
+            return False
+        lease_path = self.lease_path(video_file)
+        if self._create_lease(lease_path, video_file):
+            return True
+
+        try:
+            age = self.shared_now() - os.stat(lease_path).st_mtime
+        except FileNotFoundError:
+            return self._create_lease(lease_path, video_file)
+        if age <= self.ttl:
+            return False
+
+        # Stale lease: move it aside atomically. If several nodes race, only
+        # one rename succeeds; the others see FileNotFoundError.
+        stale_path = f"{lease_path}.stale-{uuid.uuid4().hex}"
+        try:
+            os.rename(lease_path, stale_path)
+        except FileNotFoundError:
+            return False
+        renewed = self.shared_now() - os.stat(stale_path).st_mtime <= self.ttl
+        if renewed:
+            # The owner renewed between our check and the rename; give it back.
+            # Linking fails rather than replace a lease a third node created meanwhile,
+            # which the owner's heartbeat then reports as lost.
+            try:
+                os.link(stale_path, lease_path)
+            except FileExistsError:
+                pass
+            except OSError:
+                return False  # Leave it aside, where the owner keeps renewing it
+            os.unlink(stale_path)
+            return False
+        os.unlink(stale_path)
+        print(f"Took over stale lease for {video_file}")
+        return self._create_lease(lease_path, video_file)
+
+    def _renew_file(self, path):
+        """Touch a lease file if it is ours. Returns None if there is no such file.
+
+        The open file is checked and touched, and then compared by inode with
+        what is at path, so a lease another node swapped in is never renewed.
+        """
+        try:
+            with open(path) as f:
+                ours = json.load(f).get("node") == self.node_id
+                if ours:
+                    os.utime(f.fileno())
+                    inode = os.fstat(f.fileno()).st_ino
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            return False
+        if not ours:
+            return False
+        try:
+            return os.stat(path).st_ino == inode
+        except FileNotFoundError:
+            return None
+
+    def renew(self, video_file):
+        """Extend our lease. Returns False if the lease was lost to another node.
+
+        While a node checking for staleness has moved the lease aside (see
+        claim), the moved-aside file is renewed instead, so it is given back.
+        """
+        lease_path = self.lease_path(video_file)
+        renewed = self._renew_file(lease_path)
+        if renewed is not None:
+            return renewed
+        return any(self._renew_file(path) for path in glob.glob(glob.escape(lease_path) + ".stale-*"))
+
+    def release(self, video_file, done=False):
+        """Give up our lease, marking the title done first if it finished."""
+        if done:
+            with open(self.done_path(video_file), "w") as f:
+                json.dump({"node": self.node_id}, f)
+        if self.owner(video_file) == self.node_id:
+            try:
+                os.unlink(self.lease_path(video_file))
+            except FileNotFoundError:
+                pass
+
+    @contextmanager
+    def hold(self, video_file):
+        """Renew a claimed lease in the background for the duration of the block.
+
+        Yields a threading.Event that is set if the lease is lost to another
+        node; callers must check it before muxing or marking the title done.
+        """
+        stop = threading.Event()
+        lost = threading.Event()
+
+        def heartbeat():
+            while not stop.wait(self.ttl / 3):
+                if not self.renew(video_file):
+                    print(f"Warning: lost lease for {video_file}")
+                    lost.set()
+                    return
+
+        thread = threading.Thread(target=heartbeat, name="lease-heartbeat", daemon=True)
+        thread.start()
+        try:
+            yield lost
+        finally:
+            stop.set()
+            thread.join()
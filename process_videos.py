@@ -1,7 +1,21 @@
 import os
+import time
 import argparse
+import tempfile
 import subprocess
 from pathlib import Path
+from audio_cache import format_cache_stats, read_cache_stats
+from batch_metrics import add_metrics_arguments, create_metrics, read_run_metrics
+from job_journal import (
+    DONE,
+    FAILED,
+    QUEUED,
+    PRIORITY_ORDERS,
+    JobJournal,
+    cleanup_orphan_temp_files,
+    job_priority
+)
+from lease_coordinator import LeaseCoordinator
 
 # Common video file extensions
 VIDEO_EXTENSIONS = {
@@ -18,8 +32,14 @@ def find_video_files(directory):
                 video_files.append(os.path.join(root, file))
     return video_files
 
-def process_video(video_path, args):
-    """Process a single video file using swears.py."""
+def process_video(video_path, args, metrics=None, abort=None):
+    """Process a single video file using swears.py.
+
+    Returns True if swears.py exited successfully. With BatchMetrics, the
+    run's timings are collected through swears.py --metrics-out. If the
+    abort event is set while swears.py runs (e.g. the title's lease was
+    lost), swears.py is stopped before it can mux and the run fails.
+    """
     print(f"\nProcessing: {video_path}")
     
     # Build command for swears.py
@@ -38,29 +58,200 @@ def process_video(video_path, args):
         cmd.append("--embed-audio")
     if args.skip_subtitle_check:
         cmd.append("--skip-subtitle-check")
+    if args.centre_channel_only:
+        cmd.append("--centre-channel-only")
+    if args.edl:
+        cmd.append("--edl")
+    if args.seek_source:
+        cmd.append("--seek-source")
+    if args.splice_render:
+        cmd.append("--splice-render")
+    if args.constrained_decoding:
+        cmd.append("--constrained-decoding")
+    if args.auto_sync:
+        cmd.append("--auto-sync")
+    if args.streaming_render:
+        cmd.append("--streaming-render")
+    if args.cascade:
+        cmd.append("--cascade")
+    if args.all_tracks:
+        cmd.append("--all-tracks")
+    if args.chunk_minutes:
+        cmd.extend(["--chunk-minutes", str(args.chunk_minutes)])
+    if args.clip_buffer is not None:
+        cmd.extend(["--clip-buffer", str(args.clip_buffer)])
+    if args.dedupe_cache:
+        cmd.extend(["--dedupe-cache", args.dedupe_cache])
+    if args.model:
+        cmd.extend(["--model", args.model])
+    if getattr(args, "workers", 1) > 1:
+        cmd.extend(["--parallel-jobs", str(args.workers)])
+    if getattr(args, "journal", None):
+        cmd.extend(["--journal", args.journal])
+    if metrics is not None:
+        fd, metrics_file = tempfile.mkstemp(prefix="swears-metrics-", suffix=".json")
+        os.close(fd)
+        cmd.extend(["--metrics-out", metrics_file])
+        metrics.title_started()
     
+    start = time.monotonic()
+    success = False
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True)
-        if result.returncode == 0:
+        result = run_until_aborted(cmd, abort)
+        if result is None:
+            print(f"Stopped processing {video_path}: its lease was lost to another node")
+        elif result.returncode == 0:
             print(f"Successfully processed: {video_path}")
             if result.stdout:
                 print("Output:", result.stdout)
+            success = True
         else:
             print(f"Error processing {video_path}:")
             print(result.stderr)
     except Exception as e:
         print(f"Failed to process {video_path}: {str(e)}")
+    finally:
+        # Also on KeyboardInterrupt, so the title isn't left counted as in progress
+        if metrics is not None:
+            metrics.title_finished(success, time.monotonic() - start, read_run_metrics(metrics_file))
+            os.unlink(metrics_file)
+    return success
 
-def main():
-    parser = argparse.ArgumentParser(description="Recursively process video files in a directory using swears.py")
-    parser.add_argument("directory", help="Directory to search for video files")
+def run_until_aborted(cmd, abort=None, poll_seconds=1.0):
+    """Run cmd capturing its output; returns the CompletedProcess, or None if abort was set first."""
+    if abort is None:
+        return subprocess.run(cmd, capture_output=True, text=True)
+    process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    while True:
+        try:
+            stdout, stderr = process.communicate(timeout=poll_seconds)
+            return subprocess.CompletedProcess(cmd, process.returncode, stdout, stderr)
+        except subprocess.TimeoutExpired:
+            if abort.is_set():
+                process.terminate()
+                process.communicate()
+                return None
+
+def create_coordinator(args):
+    """Create a lease coordinator if --lease-dir was given."""
+    if not args.lease_dir:
+        return None
+    coordinator = LeaseCoordinator(args.lease_dir, args.directory, node_id=args.node_id, ttl=args.lease_ttl)
+    print(f"Coordinating with other nodes via '{args.lease_dir}' as node '{coordinator.node_id}'")
+    return coordinator
+
+def process_claimed_video(video, args, coordinator, metrics=None):
+    """Process a video, holding its lease while swears.py runs.
+
+    Returns True/False for success, or None if another node owns the video
+    or already finished it.
+    """
+    if coordinator is None:
+        return process_video(video, args, metrics)
+    if not coordinator.claim(video):
+        print(f"\nSkipping {video}: {'already done' if coordinator.is_done(video) else 'claimed by another node'}")
+        return None
+    success = False
+    lost = None
+    try:
+        with coordinator.hold(video) as lost:
+            success = process_video(video, args, metrics, abort=lost)
+    finally:
+        # Another node owns the title now; leave marking it done to that node
+        coordinator.release(video, done=success and not (lost is not None and lost.is_set()))
+    return success
+
+def run_journal(video_files, args, coordinator=None, metrics=None):
+    """Process video files through a persistent job journal.
+
+    Jobs interrupted by a crash are requeued, failed jobs are retried with
+    exponential backoff, and finished jobs are skipped on later runs. With a
+    coordinator, jobs claimed by another node are retried once its lease
+    could have expired.
+    """
+    is_active = coordinator.is_leased_elsewhere if coordinator else None
+    for temp_file in cleanup_orphan_temp_files(args.directory, is_active=is_active):
+        print(f"Removed orphaned temp file: {temp_file}")
+
+    journal = JobJournal(args.journal)
+    try:
+        requeued = journal.recover()
+        if requeued:
+            print(f"Requeued {requeued} interrupted job(s)")
+        for video in video_files:
+            if journal.get_state(video) is None:
+                journal.add(video, job_priority(video, args.order))
+
+        while True:
+            video = journal.claim_next()
+            if video is None:
+                wakeup = journal.next_wakeup()
+                if wakeup is None:
+                    break
+                print(f"\nWaiting {max(0, wakeup - time.time()):.0f}s before retrying failed jobs...")
+                time.sleep(max(0, wakeup - time.time()))
+                continue
+
+            counts = journal.counts()
+            print(f"\n{counts[DONE]} done, {counts[QUEUED]} queued, {counts[FAILED]} failed")
+            if metrics is not None:
+                metrics.set_queue_depth(counts[QUEUED])
+            success = process_claimed_video(video, args, coordinator, metrics)
+            if success is None:
+                if coordinator.is_done(video):
+                    journal.set_state(video, DONE)
+                else:
+                    journal.defer(video, coordinator.ttl)
+            elif success:
+                journal.set_state(video, DONE)
+            else:
+                state = journal.record_failure(video, "swears.py exited with an error",
+                                               max_attempts=args.max_attempts, backoff=args.retry_backoff)
+                print(f"Job {state}: {video}")
+
+        counts = journal.counts()
+        print(f"\nJournal: {counts[DONE]} done, {counts[FAILED]} failed")
+    finally:
+        journal.close()
+
+def add_pipeline_arguments(parser):
+    """Add the swears.py pipeline options shared by the batch and watch CLIs."""
     parser.add_argument("--force", action="store_true", help="Force replace existing 'Clean' audio tracks")
     parser.add_argument("--save-filter", action="store_true", help="Save the FFmpeg filter string to a file")
     parser.add_argument("--add-clean-subtitles", action="store_true", default=True, help="Add a clean subtitle track (default: true)")
     parser.add_argument("--subtitles-only", action="store_true", help="Only process subtitles, skip audio processing")
     parser.add_argument("--embed-audio", action="store_true", help="Embed clean audio in video instead of saving as separate file")
     parser.add_argument("--skip-subtitle-check", action="store_true", help="Skip checking subtitles for target words")
+    parser.add_argument("--centre-channel-only", action="store_true", help="For surround tracks, transcribe and mute only the centre channel")
+    parser.add_argument("--edl", action="store_true", help="Write a player-side mute list (.edl) instead of a clean audio track")
+    parser.add_argument("--seek-source", action="store_true", help="With --auto-sync: stream the sync pass from the video instead of holding the decoded track in memory")
+    parser.add_argument("--splice-render", action="store_true", help="Re-encode only the muted regions and stream-copy the rest of the audio")
+    parser.add_argument("--constrained-decoding", action="store_true", help="Prompt targeted clips with their subtitle line and decode greedily in one pass")
+    parser.add_argument("--auto-sync", action="store_true", help="Correct subtitle offset and drift against the audio before cutting targeted clips")
+    parser.add_argument("--streaming-render", action="store_true", help="Render the clean track block by block with constant memory use")
+    parser.add_argument("--all-tracks", action="store_true", help="Clean every dialogue audio track in one pass, transcribing only the best one")
+    parser.add_argument("--cascade", action="store_true", help="Without subtitles, scan with tiny.en and transcribe only flagged regions")
+    parser.add_argument("--clip-buffer", type=float, help="Seconds of audio transcribed around each flagged subtitle line or candidate word")
+    parser.add_argument("--chunk-minutes", type=float, help="Transcribe without subtitles in chunks of this many minutes to bound memory use")
+    parser.add_argument("--model", help="Whisper model to transcribe with (default: base.en)")
+    parser.add_argument("--dedupe-cache", help="Audio fingerprint cache file, to reuse transcriptions of recurring intros, recaps and credits")
+
+def main():
+    parser = argparse.ArgumentParser(description="Recursively process video files in a directory using swears.py")
+    parser.add_argument("directory", help="Directory to search for video files")
+    add_pipeline_arguments(parser)
     parser.add_argument("--dry-run", action="store_true", help="Show which files would be processed without processing them")
+    parser.add_argument("--order", choices=PRIORITY_ORDERS, default="path",
+                        help="Processing order: shortest first, newest first, or by path (default: path)")
+    parser.add_argument("--journal", help="Job journal file; resumes interrupted batches and retries failures")
+    parser.add_argument("--max-attempts", type=int, default=3, help="Attempts per video before it is marked failed (default: 3)")
+    parser.add_argument("--retry-backoff", type=float, default=60.0,
+                        help="Seconds before the first retry, doubling after each failure (default: 60)")
+    parser.add_argument("--lease-dir", help="Lease directory on the shared filesystem, for running several nodes on one library")
+    parser.add_argument("--node-id", help="Name of this node in lease files (default: hostname-pid)")
+    parser.add_argument("--lease-ttl", type=float, default=300.0,
+                        help="Seconds without renewal after which another node may take over a title (default: 300)")
+    add_metrics_arguments(parser)
     args = parser.parse_args()
 
     # Validate directory
@@ -83,12 +274,28 @@ def main():
         print("\nDry run completed. Use without --dry-run to process files.")
         return
 
-    # Process each video file
-    for i, video in enumerate(video_files, 1):
-        print(f"\nProcessing file {i} of {len(video_files)}")
-        process_video(video, args)
+    coordinator = create_coordinator(args)
+    metrics = create_metrics(args)
+    cache_stats = read_cache_stats(args.dedupe_cache) if args.dedupe_cache else None
+    if args.journal:
+        run_journal(video_files, args, coordinator, metrics)
+    else:
+        if args.order != "path":
+            video_files.sort(key=lambda video: job_priority(video, args.order))
+
+        # Process each video file
+        for i, video in enumerate(video_files, 1):
+            print(f"\nProcessing file {i} of {len(video_files)}")
+            if metrics is not None:
+                metrics.set_queue_depth(len(video_files) - i)
+            process_claimed_video(video, args, coordinator, metrics)
+    if metrics is not None:
+        metrics.set_queue_depth(0)
+        metrics.close()
 
     print("\nAll videos processed!")
+    if cache_stats is not None:
+        print(format_cache_stats(cache_stats, read_cache_stats(args.dedupe_cache)))
 
 if __name__ == "__main__":
     main() 
@@ -1,11 +1,21 @@
 import argparse
+import difflib
 import os
 import re
 import subprocess
 import whisper
 import json
+import shutil
 import string
+import struct
 import tempfile
+import threading
+import time
+import torch
+import numpy as np
+from audio_cache import TranscriptionCache
+from job_journal import EXTRACTING, TRANSCRIBING, MUXING, SIDECAR_TEMP_SUFFIX, probe_duration, update_job_state
+from whisper_tuning import load_whisper_model
 
 # Constants
 DEFAULT_TARGET_WORDS = [
@@ -26,6 +36,24 @@ DEFAULT_TARGET_WORDS = [
 # e.g. "christ" matches "Christ" but NOT "Christine", "Christian", "Christopher".
 EXACT_MATCH_WORDS = {"jesus", "christ"}
 
+# Per-word padding rules used when building mute windows. A rule matches a
+# word either by "suffix" or by exact "word" (case-insensitive, punctuation
+# stripped) and overrides the "start" and/or "end" padding in seconds.
+# Later rules take precedence over earlier ones.
+DEFAULT_BUFFER_RULES = [
+    # Past-tense words trail off ("fucked"), so give them a longer tail.
+    {"suffix": "ed", "end": 0.3},
+]
+
+# Channel order FFmpeg uses for surround layouts that carry a dedicated
+# centre (dialogue) channel. Needed to split a track and join it back.
+SURROUND_LAYOUT_CHANNELS = {
+    "5.1": ["FL", "FR", "FC", "LFE", "BL", "BR"],
+    "5.1(side)": ["FL", "FR", "FC", "LFE", "SL", "SR"],
+    "6.1": ["FL", "FR", "FC", "LFE", "BC", "SL", "SR"],
+    "7.1": ["FL", "FR", "FC", "LFE", "BL", "BR", "SL", "SR"],
+}
+
 
 def build_regex_patterns(target_words=None):
     """Build compiled regex patterns for target words.
@@ -42,6 +70,34 @@ def build_regex_patterns(target_words=None):
             patterns.append(re.compile(rf"\b{word}\w*\b", re.IGNORECASE))
     return patterns
 
+# Source codecs the splice renderer can re-encode short segments in (and
+# store in an .m4a), mapped to their FFmpeg encoder, its frame size and the
+# priming samples it emits before the first input sample (initial_padding).
+# Other codecs (DTS, TrueHD, PCM, ...) fall back to re-encoding the whole track.
+SPLICE_ENCODERS = {
+    "aac": ("aac", 1024, 1024),
+    "ac3": ("ac3", 1536, 256),
+    "eac3": ("eac3", 1536, 256),
+    "mp3": ("libmp3lame", 1152, 1105),
+    "alac": ("alac", 4096, 0),
+}
+
+# Largest timing error splice_mute_audio accepts across all its splices, in
+# seconds; a re-encoded segment that isn't a whole number of encoder frames
+# is padded to one, shifting everything after it.
+SPLICE_MAX_DRIFT = 0.01
+
+# Audio track titles whose dialogue differs from the main mix, so the main
+# mix's mute windows don't apply to them (lowercase substrings)
+NON_DIALOGUE_TRACK_WORDS = ("commentary", "description", "descriptive")
+
+# Compact word-timestamp store written by the full Whisper pipeline.
+# Layout: header, float32 starts[n], float32 ends[n], uint32 word_ids[n],
+# uint32 string_offsets[m + 1], then the UTF-8 string table blob.
+WORD_STORE_MAGIC = b"SWWS"
+WORD_STORE_VERSION = 1
+WORD_STORE_HEADER = struct.Struct("<4sIIII")  # magic, version, n words, m strings, blob size
+
 # Functions
 def find_english_audio_stream(video_file):
     """Find the best English audio stream index in a video file.
@@ -54,7 +110,7 @@ def find_english_audio_stream(video_file):
         "-show_streams", "-select_streams", "a",
         video_file
     ]
-    probe_result = subprocess.run(probe_cmd, capture_output=True, text=True)
+    probe_result = run_ffmpeg(probe_cmd, capture_output=True, text=True)
 
     try:
         streams = json.loads(probe_result.stdout).get("streams", [])
@@ -73,129 +129,614 @@ def find_english_audio_stream(video_file):
     return 0
 
 
-def extract_audio(video_file):
-    """Extract audio from the video file and return the temporary audio file path."""
-    # Find the English audio stream
-    audio_stream_idx = find_english_audio_stream(video_file)
+def probe_audio_streams(media_file):
+    """Return the ffprobe stream info of every audio stream, in audio stream order."""
+    probe_cmd = [
+        "ffprobe", "-v", "quiet", "-print_format", "json",
+        "-show_streams", "-select_streams", "a",
+        media_file
+    ]
+    probe_result = run_ffmpeg(probe_cmd, capture_output=True, text=True)
+    try:
+        return json.loads(probe_result.stdout).get("streams", [])
+    except json.JSONDecodeError:
+        return []
+
+def is_clean_stream(stream):
+    """Check whether an audio stream is a 'Clean' track added by this script."""
+    tags = {key.lower(): value for key, value in stream.get("tags", {}).items()}
+    return "Clean" in tags.get("title", "") or tags.get("handler_name") == "CleanAudio"
+
+def select_dialogue_streams(streams, centre_only=False):
+    """Pick the audio streams to clean and the one to transcribe.
+
+    streams is probe_audio_streams output. Every English track is cleaned
+    (untagged tracks if none is tagged English), skipping commentary, audio
+    description and existing Clean tracks, whose dialogue differs from the
+    main mix. The first of them is transcribed, as in single-track mode, or
+    with centre_only the first with a centre channel to isolate dialogue.
 
-    # Probe the selected audio stream for channel information
+    Returns (audio stream indices, transcription stream index).
+    """
+    candidates = []
+    for i, stream in enumerate(streams):
+        title = stream.get("tags", {}).get("title", "").lower()
+        if is_clean_stream(stream) or any(word in title for word in NON_DIALOGUE_TRACK_WORDS):
+            continue
+        candidates.append((i, stream.get("tags", {}).get("language", "").lower()))
+
+    selected = [i for i, lang in candidates if lang == "eng"]
+    if not selected:
+        selected = [i for i, lang in candidates if lang in ("", "und")] or [0]
+    transcribe_idx = selected[0]
+    if centre_only:
+        transcribe_idx = next(
+            (i for i in selected if streams[i].get("channel_layout") in SURROUND_LAYOUT_CHANNELS), transcribe_idx
+        )
+    return selected, transcribe_idx
+
+def probe_audio_stream(media_file, audio_stream_idx=0):
+    """Return the ffprobe stream info for an audio stream, or {} if missing."""
     probe_cmd = [
         "ffprobe", "-v", "quiet", "-print_format", "json",
         "-show_streams", "-select_streams", f"a:{audio_stream_idx}",
-        video_file
+        media_file
     ]
-    probe_result = subprocess.run(probe_cmd, capture_output=True, text=True)
-    audio_info = json.loads(probe_result.stdout)
+    probe_result = run_ffmpeg(probe_cmd, capture_output=True, text=True)
+    try:
+        streams = json.loads(probe_result.stdout).get("streams", [])
+    except json.JSONDecodeError:
+        return {}
+    return streams[0] if streams else {}
 
-    # Get number of channels from selected audio stream, default to 2 if not found
-    channels = 2
-    if audio_info.get("streams") and len(audio_info["streams"]) > 0:
-        channels = int(audio_info["streams"][0].get("channels", 2))
+def get_surround_channels(media_file, audio_stream_idx=0):
+    """Return (layout, channel names) for a surround track with a centre channel.
 
-    temp_audio = tempfile.NamedTemporaryFile(suffix=".m4a", delete=False)
-    temp_audio.close()
-    print(f"Extracting {channels}-channel audio from video (audio stream {audio_stream_idx})...")
+    Returns (None, None) for stereo/mono tracks and unrecognized layouts.
+    """
+    layout = probe_audio_stream(media_file, audio_stream_idx).get("channel_layout")
+    if layout not in SURROUND_LAYOUT_CHANNELS:
+        return None, None
+    return layout, SURROUND_LAYOUT_CHANNELS[layout]
 
-    subprocess.run([
-        "ffmpeg", "-y", "-i", video_file,
-        "-map", f"0:a:{audio_stream_idx}",  # Select the English audio stream
-        "-vn",  # No video
-        "-c:a", "aac",  # Use AAC codec
-        "-b:a", "256k",  # High quality bitrate
-        "-ar", "44100",  # Standard sample rate
-        "-ac", str(channels),  # Preserve original channel count
-        temp_audio.name
-    ])
-    return temp_audio.name
-
-def transcribe_audio(audio_file, transcription_file):
-    """Transcribe the full audio and save the transcription (legacy pipeline)."""
-    print("Loading Whisper model...")
-    model = whisper.load_model("base.en")
-    print("Transcribing full audio...")
-    result = model.transcribe(audio_file, word_timestamps=True, verbose=True)
-    with open(transcription_file, "w") as f:
-        json.dump(result, f, indent=4)
-    print(f"Transcription saved to '{transcription_file}'")
-
-
-def generate_filter(transcription_file, buffer=0.1, target_words=None):
-    """Generate FFmpeg filter string from a full Whisper transcription file."""
-    print("Generating mute sections from transcription...")
-    with open(transcription_file, "r") as f:
-        transcription = json.load(f)
+def save_word_store(store_file, starts, ends, words):
+    """Write word timestamps to a compact columnar word store.
+
+    Words are deduplicated into a string table and referenced by id, so a
+    feature-length transcription takes a few hundred KB instead of tens of MB.
+    """
+    string_table, word_ids = np.unique(np.asarray(words, dtype=str), return_inverse=True)
+    encoded = [word.encode("utf-8") for word in string_table.tolist()]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.uint32)
+    offsets[1:] = np.cumsum([len(word) for word in encoded], dtype=np.uint64)
+    blob = b"".join(encoded)
+
+    with open(store_file, "wb") as f:
+        f.write(WORD_STORE_HEADER.pack(WORD_STORE_MAGIC, WORD_STORE_VERSION, len(word_ids), len(encoded), len(blob)))
+        f.write(np.asarray(starts, dtype="<f4").tobytes())
+        f.write(np.asarray(ends, dtype="<f4").tobytes())
+        f.write(word_ids.astype("<u4").tobytes())
+        f.write(offsets.astype("<u4").tobytes())
+        f.write(blob)
+
+def is_word_store(transcription_file):
+    """Check whether a transcription file is a compact word store."""
+    with open(transcription_file, "rb") as f:
+        return f.read(len(WORD_STORE_MAGIC)) == WORD_STORE_MAGIC
+
+def load_word_store(store_file, mmap=True):
+    """Load a compact word store as (starts, ends, words) arrays.
+
+    With mmap the timestamp columns are memory-mapped rather than read, so
+    only the pages that are actually touched are loaded from disk.
+    """
+    with open(store_file, "rb") as f:
+        magic, version, word_count, string_count, blob_size = WORD_STORE_HEADER.unpack(f.read(WORD_STORE_HEADER.size))
+    if magic != WORD_STORE_MAGIC or version != WORD_STORE_VERSION:
+        raise ValueError(f"'{store_file}' is not a version {WORD_STORE_VERSION} word store")
+
+    def column(dtype, count, offset):
+        if mmap and count:
+            return np.memmap(store_file, dtype=dtype, mode="r", offset=offset, shape=(count,))
+        return np.fromfile(store_file, dtype=dtype, count=count, offset=offset)
+
+    offset = WORD_STORE_HEADER.size
+    starts = column("<f4", word_count, offset)
+    offset += 4 * word_count
+    ends = column("<f4", word_count, offset)
+    offset += 4 * word_count
+    word_ids = column("<u4", word_count, offset)
+    offset += 4 * word_count
+    string_offsets = np.fromfile(store_file, dtype="<u4", count=string_count + 1, offset=offset)
+    offset += 4 * (string_count + 1)
+    with open(store_file, "rb") as f:
+        f.seek(offset)
+        blob = f.read(blob_size)
+
+    string_table = np.array([
+        blob[string_offsets[i]:string_offsets[i + 1]].decode("utf-8") for i in range(string_count)
+    ], dtype=str)
+    words = string_table[word_ids] if word_count else np.empty(0, dtype=str)
+    return starts, ends, words
+
+def decode_audio_chunk(audio_file, offset=0.0, duration=None, sample_rate=16000, audio_stream_idx=None,
+                       audio_filter=None):
+    """Decode part of an audio file to mono float32 PCM, as Whisper expects.
+
+    The samples come back through a pipe, so nothing is written to disk.
+    Without duration, decodes to the end. With audio_stream_idx, audio_file
+    is the original video and that audio stream is decoded; audio_filter
+    optionally runs before the downmix (e.g. to keep only the centre channel).
+    """
+    duration_options = ["-t", str(duration)] if duration is not None else []
+    stream_options = ["-map", f"0:a:{audio_stream_idx}"] if audio_stream_idx is not None else []
+    filter_options = ["-af", audio_filter] if audio_filter else []
+    result = run_ffmpeg([
+        "ffmpeg", "-nostdin", "-v", "quiet",
+        "-ss", str(offset), *duration_options,
+        "-i", audio_file,
+        *stream_options, "-vn",
+        *filter_options,
+        "-f", "s16le", "-ac", "1", "-ar", str(sample_rate),
+        "-"
+    ], capture_output=True)
+    return np.frombuffer(result.stdout, dtype=np.int16).astype(np.float32) / 32768.0
+
+def transcribe_in_chunks(model, audio_file, chunk_seconds, cache=None, audio_stream_idx=None, audio_filter=None):
+    """Transcribe an audio file chunk by chunk so only one chunk is in memory.
 
+    Timestamps are shifted back to absolute positions and the segments are
+    combined into a single Whisper-style result. A word straddling a chunk
+    boundary may be split, so chunks should be long (tens of minutes).
+
+    With a TranscriptionCache, audio heard before (intros, recaps, credits)
+    reuses its cached words and each chunk becomes a single segment.
+    audio_stream_idx and audio_filter are passed to decode_audio_chunk.
+    """
+    segments = []
+    texts = []
+    offset = 0.0
+    while True:
+        audio = decode_audio_chunk(audio_file, offset, chunk_seconds, audio_stream_idx=audio_stream_idx,
+                                   audio_filter=audio_filter)
+        if audio.size == 0:
+            break
+        print(f"Transcribing {offset / 60:.0f}-{(offset + audio.size / 16000) / 60:.0f} min...")
+        if cache is not None:
+            words = cache.transcribe(audio, lambda piece: transcribe_clip(model, piece, 0))
+            text = "".join(word["word"] for word in words)
+            chunk = {"text": text, "segments": [{"start": 0.0, "end": audio.size / 16000, "text": text, "words": words}]}
+        else:
+            chunk = run_whisper(model, audio, word_timestamps=True, verbose=False)
+        for segment in chunk.get("segments", []):
+            segment["start"] += offset
+            segment["end"] += offset
+            for word in segment.get("words", []):
+                word["start"] += offset
+                word["end"] += offset
+            segments.append(segment)
+        texts.append(chunk.get("text", ""))
+        if audio.size < chunk_seconds * 16000:
+            break
+        offset += chunk_seconds
+    return {"text": "".join(texts), "segments": segments, "language": "en"}
+
+def load_transcription_words(transcription):
+    """Flatten a Whisper transcription into parallel word arrays.
+
+    Returns (starts, ends, words) where starts/ends are float64 arrays in
+    seconds and words is an array of the raw word strings.
+    """
+    words = [word for segment in transcription.get("segments", []) for word in segment.get("words", [])]
+    starts = np.array([word["start"] for word in words], dtype=np.float64)
+    ends = np.array([word["end"] for word in words], dtype=np.float64)
+    texts = np.array([word["word"] for word in words], dtype=str)
+    return starts, ends, texts
+
+def merge_mute_windows(starts, ends):
+    """Sort mute windows and merge any that overlap or touch.
+
+    Returns (starts, ends) arrays of disjoint windows in ascending order.
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    if starts.size == 0:
+        return starts, ends
+
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    running_end = np.maximum.accumulate(ends)
+    # A new window begins wherever the start lies beyond every earlier end
+    group_starts = np.flatnonzero(np.r_[True, starts[1:] > running_end[:-1]])
+    return starts[group_starts], np.maximum.reduceat(ends, group_starts)
+
+def build_mute_windows(starts, ends, words, target_words=None, buffer=0.1, buffer_rules=None):
+    """Build sorted, merged mute windows from word timestamp arrays.
+
+    Each unique word is matched against the target patterns and the buffer
+    rules once, so the cost is dominated by array operations rather than a
+    Python loop over every word in the transcription.
+
+    Returns (starts, ends) arrays of padded, merged windows in seconds.
+    """
+    rules = DEFAULT_BUFFER_RULES if buffer_rules is None else buffer_rules
+    words = np.asarray(words, dtype=str)
+    if words.size == 0:
+        return np.empty(0), np.empty(0)
+
+    unique_words, inverse = np.unique(words, return_inverse=True)
     regex_patterns = build_regex_patterns(target_words)
-    filter_parts = []
-
-    for segment in transcription.get("segments", []):
-        for word in segment.get("words", []):
-            if any(pattern.search(word["word"]) for pattern in regex_patterns):
-                start = max(0, word["start"] - buffer)
-                if(word["word"].rstrip(string.punctuation).endswith("ed")):
-                    buffer = 0.3
-                end = word["end"] + buffer
-                filter_parts.append(f"volume=enable='between(t,{start},{end})':volume=0")
-
-    if not filter_parts:
-        print("No target words found in the audio.")
-        return None
 
-    filter_string = ",".join(filter_parts)
-    print(f"Generated FFmpeg filter string: {filter_string}")
-    return filter_string
+    is_target = np.zeros(len(unique_words), dtype=bool)
+    start_pad = np.full(len(unique_words), buffer, dtype=np.float64)
+    end_pad = np.full(len(unique_words), buffer, dtype=np.float64)
+    for i, word in enumerate(unique_words):
+        is_target[i] = any(pattern.search(word) for pattern in regex_patterns)
+        normalized = word.strip().rstrip(string.punctuation).lower()
+        for rule in rules:
+            if "word" in rule and normalized != rule["word"].lower():
+                continue
+            if "suffix" in rule and not normalized.endswith(rule["suffix"].lower()):
+                continue
+            start_pad[i] = rule.get("start", start_pad[i])
+            end_pad[i] = rule.get("end", end_pad[i])
+
+    mask = is_target[inverse]
+    word_ids = inverse[mask]
+    window_starts = np.maximum(0, np.asarray(starts, dtype=np.float64)[mask] - start_pad[word_ids])
+    window_ends = np.asarray(ends, dtype=np.float64)[mask] + end_pad[word_ids]
+    return merge_mute_windows(window_starts, window_ends)
+
+def format_mute_filter(starts, ends):
+    """Format mute windows as an FFmpeg volume filter chain (millisecond precision)."""
+    return ",".join(
+        f"volume=enable='between(t,{round(start, 3)},{round(end, 3)})':volume=0"
+        for start, end in zip(np.asarray(starts).tolist(), np.asarray(ends).tolist())
+    )
 
-def generate_filter_from_mute_windows(mute_windows, buffer=0.1):
-    """Generate FFmpeg filter string from a list of mute windows.
+def pad_mute_windows(mute_windows, buffer=0.1):
+    """Pad targeted-pipeline mute windows and merge them into (starts, ends).
 
     Each mute window is a dict with 'start' and 'end' keys (seconds).
     """
-    if not mute_windows:
-        print("No mute windows to apply.")
-        return None
+    starts = np.maximum(0, np.array([window["start"] for window in mute_windows], dtype=np.float64) - buffer)
+    ends = np.array([window["end"] for window in mute_windows], dtype=np.float64) + buffer
+    return merge_mute_windows(starts, ends)
 
-    filter_parts = []
-    for window in mute_windows:
-        start = max(0, window["start"] - buffer)
-        end = window["end"] + buffer
-        filter_parts.append(f"volume=enable='between(t,{start},{end})':volume=0")
+def save_mute_edl(video_file, starts, ends):
+    """Save mute windows as a Kodi-style EDL sidecar next to the video.
 
-    filter_string = ",".join(filter_parts)
-    print(f"Generated FFmpeg filter with {len(filter_parts)} mute windows")
-    return filter_string
+    Each line is "start end 1" (action 1 = mute), which players such as
+    Kodi apply at playback time, so no clean audio track has to be encoded.
+    Returns the path of the EDL file.
+    """
+    base_name = os.path.splitext(video_file)[0]
+    output_edl = f"{base_name}.edl"
 
-def mute_audio(audio_file, filter_string):
-    """Apply muting to the audio file and return the path of the muted audio."""
-    # First, probe the input file to get audio channel information
-    probe_cmd = [
-        "ffprobe", "-v", "quiet", "-print_format", "json",
-        "-show_streams", "-select_streams", "a:0",
-        audio_file
-    ]
-    probe_result = subprocess.run(probe_cmd, capture_output=True, text=True)
-    audio_info = json.loads(probe_result.stdout)
+    with open(output_edl, "w") as f:
+        for start, end in zip(np.asarray(starts).tolist(), np.asarray(ends).tolist()):
+            f.write(f"{start:.3f}\t{end:.3f}\t1\n")
 
-    # Get number of channels from first audio stream, default to 2 if not found
-    channels = 2
-    if audio_info.get("streams") and len(audio_info["streams"]) > 0:
-        channels = int(audio_info["streams"][0].get("channels", 2))
+    print(f"Mute list with {len(starts)} windows saved to '{output_edl}'")
+    return output_edl
+
+def build_centre_mute_filter(layout, channels, filter_string, input_label="[0:a]", label_prefix=""):
+    """Build a filter graph that applies filter_string to the centre channel only.
+
+    The track is split into its channels, the mute chain runs on FC and the
+    channels are joined back in their original order. Output label is [out];
+    label_prefix keeps the labels of several tracks in one graph apart.
+    """
+    split_labels = "".join(f"[{label_prefix}{channel}]" for channel in channels)
+    join_labels = "".join(
+        f"[{label_prefix}FCm]" if channel == "FC" else f"[{label_prefix}{channel}]" for channel in channels
+    )
+    join_map = "|".join(f"{i}.0-{channel}" for i, channel in enumerate(channels))
+    return (
+        f"{input_label}channelsplit=channel_layout={layout}{split_labels};"
+        f"[{label_prefix}FC]{filter_string}[{label_prefix}FCm];"
+        f"{join_labels}join=inputs={len(channels)}:channel_layout={layout}:map={join_map}[{label_prefix}out]"
+    )
+
+def apply_mute_block(samples, first_frame, sample_rate, starts, ends, channel=None):
+    """Zero the samples of one PCM block that fall inside mute windows.
+
+    samples is a (frames, channels) array starting at frame first_frame of
+    the track; starts/ends are sorted, merged windows in seconds. With
+    channel, only that channel index is muted. Returns the number of frames
+    touched.
+    """
+    block_start = first_frame / sample_rate
+    block_end = (first_frame + len(samples)) / sample_rate
+    # Only windows that overlap this block
+    lo = np.searchsorted(ends, block_start, side="right")
+    hi = np.searchsorted(starts, block_end, side="left")
+    muted = 0
+    for start, end in zip(starts[lo:hi].tolist(), ends[lo:hi].tolist()):
+        a = max(0, int(round(start * sample_rate)) - first_frame)
+        b = min(len(samples), int(round(end * sample_rate)) - first_frame)
+        if b > a:
+            if channel is None:
+                samples[a:b] = 0
+            else:
+                samples[a:b, channel] = 0
+            muted += b - a
+    return muted
+
+def stream_pcm_format(stream):
+    """Return (ffmpeg raw format, numpy dtype) holding a stream's decoded samples without loss."""
+    sample_fmt = stream.get("sample_fmt", "s16").rstrip("p")  # Planar formats pipe as interleaved
+    if sample_fmt in ("flt", "dbl"):
+        return "f32le", "<f4"
+    if sample_fmt == "s32":
+        return "s32le", "<i4"
+    return "s16le", "<i2"
+
+def stream_mute_audio(audio_source, starts, ends, audio_stream_idx=0, centre_only=False, block_seconds=1.0):
+    """Mute windows while streaming PCM between two ffmpeg processes.
+
+    The source is decoded to PCM on a pipe at its own sample rate, channel
+    layout and sample format (float for AAC, AC-3 and other float
+    decoders; see stream_pcm_format), processed in fixed-size
+    blocks (only the blocks overlapping a mute window are touched) and piped
+    into the AAC encoder, so peak memory is a single block regardless of
+    the input's duration. With centre_only, surround tracks are muted on
+    the centre channel only.
+
+    Returns the path of the muted audio.
+    """
+    stream = probe_audio_stream(audio_source, audio_stream_idx)
+    channels = int(stream.get("channels", 2))
+    sample_rate = int(stream.get("sample_rate") or 48000)
+    pcm_codec, dtype = stream_pcm_format(stream)
+    starts, ends = merge_mute_windows(starts, ends)
+
+    channel = None
+    if centre_only:
+        layout, channel_names = get_surround_channels(audio_source, audio_stream_idx)
+        if layout is not None:
+            channel = channel_names.index("FC")
 
     temp_muted_audio = tempfile.NamedTemporaryFile(suffix=".m4a", delete=False)
     temp_muted_audio.close()
-    print(f"Applying mute sections to {channels}-channel audio...")
-
-    subprocess.run([
-        "ffmpeg", "-y", "-i", audio_file,
-        "-af", filter_string,
+    print(f"Streaming {channels}-channel audio through {len(starts)} mute windows...")
+
+    pcm_format = ["-f", pcm_codec, "-ar", str(sample_rate), "-ac", str(channels)]
+    # Raw PCM carries no layout, so tell the encoder which channel is which
+    layout_options = ["-channel_layout", stream["channel_layout"]] if stream.get("channel_layout") else []
+    decoder = popen_ffmpeg([
+        "ffmpeg", "-nostdin", "-v", "quiet", "-i", audio_source,
+        "-map", f"0:a:{audio_stream_idx}", "-vn",
+        *pcm_format, "-"
+    ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+    encoder = popen_ffmpeg([
+        "ffmpeg", "-y", "-v", "quiet",
+        *pcm_format, *layout_options, "-i", "-",
         "-c:a", "aac",
         "-b:a", "256k",
-        "-ar", "44100",
-        "-ac", str(channels),
         temp_muted_audio.name
-    ])
-    print(f"Muted audio temporarily saved to '{temp_muted_audio.name}'")
+    ], stdin=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    frame_bytes = np.dtype(dtype).itemsize * channels
+    block_bytes = int(block_seconds * sample_rate) * frame_bytes
+    frame = 0
+    try:
+        while True:
+            data = decoder.stdout.read(block_bytes)
+            if not data:
+                break
+            usable = len(data) - len(data) % frame_bytes  # Only a truncated stream ends mid-frame
+            block = np.frombuffer(bytearray(data[:usable]), dtype=dtype).reshape(-1, channels)
+            apply_mute_block(block, frame, sample_rate, starts, ends, channel)
+            encoder.stdin.write(block.tobytes())
+            frame += len(block)
+    finally:
+        decoder.stdout.close()
+        encoder.stdin.close()
+        decoder.wait()
+        encoder.wait()
+
+    print(f"Muted audio temporarily saved to '{temp_muted_audio.name}' ({frame / sample_rate:.0f}s streamed)")
     return temp_muted_audio.name
 
+def probe_packet_times(media_file, audio_stream_idx, intervals):
+    """Return sorted packet start times of an audio stream within the given intervals.
+
+    intervals is a list of (start, end) seconds; only those parts of the
+    file are read, so probing stays cheap on long inputs.
+    """
+    read_intervals = ",".join(f"{max(0, start)}%{end}" for start, end in intervals)
+    probe_result = run_ffmpeg([
+        "ffprobe", "-v", "quiet", "-select_streams", f"a:{audio_stream_idx}",
+        "-read_intervals", read_intervals,
+        "-show_entries", "packet=pts_time", "-of", "csv=p=0",
+        media_file
+    ], capture_output=True, text=True)
+
+    times = []
+    for line in probe_result.stdout.split():
+        try:
+            times.append(float(line.strip(",")))
+        except ValueError:
+            continue
+    return sorted(set(times))
+
+def probe_packet_count(media_file, audio_stream_idx=0):
+    """Return the number of packets in an audio stream, or 0 if it can't be read."""
+    probe_result = run_ffmpeg([
+        "ffprobe", "-v", "quiet", "-count_packets", "-select_streams", f"a:{audio_stream_idx}",
+        "-show_entries", "stream=nb_read_packets", "-of", "csv=p=0",
+        media_file
+    ], capture_output=True, text=True)
+    try:
+        return int(probe_result.stdout.strip().strip(","))
+    except ValueError:
+        return 0
+
+def plan_splice_segments(starts, ends, packet_times, margin=0.5):
+    """Split a track into stream-copied and re-encoded segments.
+
+    Each mute window, widened by margin, is snapped outwards to the nearest
+    packet (codec frame) boundaries; overlapping regions are merged. Returns
+    a list of (mode, start, end) tuples with mode "copy" or "encode", in
+    order and covering the whole track. The last segment's end is None,
+    meaning "to the end of the stream".
+    """
+    packet_times = np.asarray(packet_times, dtype=np.float64)
+    regions = []
+    for start, end in zip(np.asarray(starts).tolist(), np.asarray(ends).tolist()):
+        # Last boundary at or before the padded start, first at or after the padded end
+        i = np.searchsorted(packet_times, start - margin, side="right") - 1
+        j = np.searchsorted(packet_times, end + margin, side="left")
+        cut_start = float(packet_times[i]) if i >= 0 else 0.0
+        cut_end = float(packet_times[j]) if j < len(packet_times) else None
+        if regions and (regions[-1][1] is None or cut_start <= regions[-1][1]):
+            region_start, region_end = regions[-1]
+            regions[-1] = (region_start, None if region_end is None or cut_end is None else max(region_end, cut_end))
+        else:
+            regions.append((cut_start, cut_end))
+
+    segments = []
+    cursor = 0.0
+    for cut_start, cut_end in regions:
+        if cut_start > cursor:
+            segments.append(("copy", cursor, cut_start))
+        segments.append(("encode", cut_start, cut_end))
+        cursor = cut_end
+        if cursor is None:
+            break
+    if cursor is not None:
+        segments.append(("copy", cursor, None))
+    return segments
+
+def splice_mute_audio(video_file, starts, ends, audio_stream_idx=None, centre_only=False, margin=0.5):
+    """Mute windows by re-encoding only the regions around them.
+
+    The selected audio stream of the original video is cut at codec frame
+    boundaries around each merged mute window. Those short segments are
+    re-encoded in the source codec with the mute applied, everything else
+    is stream-copied, and the pieces are joined with the concat demuxer.
+    Render time therefore scales with the number of mutes rather than the
+    length of the title.
+
+    Encoders prime their output (e.g. 1024 samples for AAC), which would
+    shift everything after each splice. Each re-encoded segment is therefore
+    fed from `lead` samples earlier, so the priming ends exactly on a frame
+    boundary, and its first frames (the priming) are dropped from the output
+    with the noise bitstream filter; the segment then holds exactly the
+    source's frames. Segments that wouldn't be a whole number of encoder
+    frames are padded by the encoder, so that drift is checked against
+    SPLICE_MAX_DRIFT before anything is encoded, and each encoded segment's
+    packet count is checked as it is written.
+
+    Returns the path of the spliced audio (same codec as the source), or
+    None if the source codec can't be spliced or the splice would drift;
+    callers should then fall back to a full render.
+    """
+    if audio_stream_idx is None:
+        audio_stream_idx = find_english_audio_stream(video_file)
+    stream = probe_audio_stream(video_file, audio_stream_idx)
+    codec = stream.get("codec_name")
+    if codec not in SPLICE_ENCODERS or not stream.get("sample_rate"):
+        print(f"Cannot splice '{codec}' audio, falling back to a full re-encode")
+        return None
+    encoder, frame_samples, priming = SPLICE_ENCODERS[codec]
+    sample_rate = int(stream["sample_rate"])
+    # Drop whole priming frames, feeding the encoder `lead` extra samples so they end on a frame boundary
+    priming_frames = -(-priming // frame_samples)
+    lead = priming_frames * frame_samples - priming
+
+    starts, ends = merge_mute_windows(starts, ends)
+    intervals = [(start - margin - 2, end + margin + 2) for start, end in zip(starts.tolist(), ends.tolist())]
+    segments = plan_splice_segments(starts, ends, probe_packet_times(video_file, audio_stream_idx, intervals), margin)
+
+    # The last encoder frame of a segment is padded out; that shifts whatever follows
+    expected_frames = {}
+    drift = 0.0
+    for i, (mode, seg_start, seg_end) in enumerate(segments):
+        if mode == "encode" and seg_end is not None:
+            frames = (seg_end - seg_start) * sample_rate / frame_samples
+            expected_frames[i] = int(np.ceil(frames - 1e-6))
+            drift += (expected_frames[i] - frames) * frame_samples / sample_rate
+    if drift > SPLICE_MAX_DRIFT:
+        print(f"Splicing would drift {drift * 1000:.0f} ms from the source (its frames don't match "
+              f"the {encoder} encoder's), falling back to a full re-encode")
+        return None
+
+    encode_options = ["-c:a", encoder]
+    if priming_frames:
+        encode_options += ["-bsf:a", f"noise=drop=not(trunc(n/{priming_frames}))"]
+    if stream.get("bit_rate"):
+        encode_options += ["-b:a", stream["bit_rate"]]
+    encode_options += ["-ar", str(sample_rate)]
+    if stream.get("channels"):
+        encode_options += ["-ac", str(stream["channels"])]
+    layout, channel_names = get_surround_channels(video_file, audio_stream_idx) if centre_only else (None, None)
+
+    work_dir = tempfile.mkdtemp(prefix="swears-splice-")
+    segment_files = []
+    encoded = 0
+    print(f"Splicing {codec} audio: re-encoding {sum(1 for s in segments if s[0] == 'encode')} "
+          f"of {len(segments)} segments, stream-copying the rest...")
+    for i, (mode, seg_start, seg_end) in enumerate(segments):
+        segment_file = os.path.join(work_dir, f"segment_{i:05d}.mka")
+        # Encoded segments start `lead` samples early (before the track starts, as prepended silence)
+        origin = seg_start - lead / sample_rate if mode == "encode" else seg_start
+        input_start = max(0.0, origin)
+        duration_options = ["-t", str(seg_end - input_start)] if seg_end is not None else []
+        cmd = [
+            "ffmpeg", "-y",
+            "-ss", str(input_start), *duration_options,
+            "-i", video_file,
+            "-map", f"0:a:{audio_stream_idx}",
+            "-vn",
+        ]
+        if mode == "copy":
+            cmd += ["-c:a", "copy"]
+        else:
+            # Mute windows relative to the segment's origin, where its timestamps start at 0
+            inside = (starts < (seg_end if seg_end is not None else np.inf)) & (ends > seg_start)
+            filter_string = format_mute_filter(
+                np.maximum(starts[inside] - origin, 0), ends[inside] - origin
+            )
+            missing = int(round((input_start - origin) * sample_rate))
+            pad_filter = f"adelay=delays={missing}S:all=1," if missing else ""
+            if layout is not None:
+                input_label = f"[0:a:{audio_stream_idx}]"
+                filter_graph = build_centre_mute_filter(layout, channel_names, filter_string,
+                                                        input_label="[lead]" if missing else input_label)
+                if missing:
+                    filter_graph = f"{input_label}{pad_filter.rstrip(',')}[lead];{filter_graph}"
+                cmd = cmd[:cmd.index("-map")] + ["-filter_complex", filter_graph, "-map", "[out]"]
+            else:
+                cmd += ["-af", pad_filter + filter_string]
+            cmd += encode_options
+            encoded += 1
+        run_ffmpeg(cmd + [segment_file], capture_output=True)
+        segment_files.append(segment_file)
+        if i in expected_frames and probe_packet_count(segment_file) != expected_frames[i]:
+            print(f"Re-encoded segment at {seg_start:.2f}s doesn't hold {expected_frames[i]} frames, "
+                  "falling back to a full re-encode")
+            shutil.rmtree(work_dir, ignore_errors=True)
+            return None
+
+    concat_list = os.path.join(work_dir, "segments.txt")
+    with open(concat_list, "w") as f:
+        for segment_file in segment_files:
+            f.write(f"file '{segment_file}'\n")
+
+    temp_spliced_audio = tempfile.NamedTemporaryFile(suffix=".m4a", delete=False)
+    temp_spliced_audio.close()
+    run_ffmpeg([
+        "ffmpeg", "-y", "-f", "concat", "-safe", "0", "-i", concat_list,
+        "-c", "copy",
+        temp_spliced_audio.name
+    ], capture_output=True)
+
+    shutil.rmtree(work_dir, ignore_errors=True)
+    print(f"Spliced audio temporarily saved to '{temp_spliced_audio.name}' ({encoded} segments re-encoded)")
+    return temp_spliced_audio.name
+
 def check_clean_audio(video_file):
     """Check if the video file has an audio track with title 'Clean' or a separate clean audio file."""
     # Check for separate clean audio file
@@ -205,7 +746,7 @@ def check_clean_audio(video_file):
         return True
 
     # Check for embedded clean audio track
-    result = subprocess.run([
+    result = run_ffmpeg([
         "ffmpeg", "-i", video_file, "-hide_banner"
     ], capture_output=True, text=True)
 
@@ -231,7 +772,7 @@ def remove_clean_audio(video_file):
     print("Removing existing 'Clean' audio track...")
 
     # Identify all streams except 'Clean' audio tracks
-    streams = subprocess.run(
+    streams = run_ffmpeg(
         ["ffprobe", "-i", video_file, "-show_streams", "-select_streams", "a",
          "-show_entries", "stream=index:stream_tags=title", "-of", "csv=p=0"],
         capture_output=True, text=True
@@ -248,14 +789,81 @@ def remove_clean_audio(video_file):
         map_options += ["-map", f"-0:{index}"]
 
     # Run ffmpeg to remove the 'Clean' tracks
-    subprocess.run(
+    run_ffmpeg(
         ["ffmpeg", "-y", "-i", video_file, *map_options, "-c", "copy", temp_file]
     )
     os.replace(temp_file, video_file)
     print("Existing 'Clean' audio track removed.")
 
-def add_audio_to_video(video_file, clean_audio_file, output_file=None):
-    """Add the cleaned audio track back to the original video."""
+def render_clean_tracks(video_file, starts, ends, audio_stream_indices, embed=False, centre_only=False):
+    """Mute several audio tracks of a video in a single ffmpeg pass.
+
+    All selected streams are decoded in one demux of the video, each goes
+    through the same mute windows (only its centre channel, with centre_only,
+    where it has one) and is encoded to AAC. With embed, the clean tracks are
+    muxed into the video next to the stream-copied originals, replacing any
+    earlier Clean tracks, in one write; otherwise they are saved together as
+    the .Clean.m4a sidecar. Returns the path written.
+    """
+    streams = probe_audio_streams(video_file)
+    filter_string = format_mute_filter(*merge_mute_windows(starts, ends))
+    graphs = []
+    for n, audio_stream_idx in enumerate(audio_stream_indices):
+        layout, channel_names = get_surround_channels(video_file, audio_stream_idx) if centre_only else (None, None)
+        if layout is not None:
+            graphs.append(build_centre_mute_filter(
+                layout, channel_names, filter_string, input_label=f"[0:a:{audio_stream_idx}]", label_prefix=f"t{n}"
+            ))
+        else:
+            graphs.append(f"[0:a:{audio_stream_idx}]{filter_string}[t{n}out]")
+
+    if embed:
+        output_file = video_file
+        # Drop earlier Clean tracks in the same write; originals are stream-copied
+        stale = [i for i, stream in enumerate(streams) if is_clean_stream(stream)]
+        map_options = ["-map", "0", *(option for i in stale for option in ("-map", f"-0:a:{i}"))]
+        first_clean = len(streams) - len(stale)
+        codec_options = ["-c", "copy"]
+    else:
+        output_file = f"{os.path.splitext(video_file)[0]}.Clean.m4a"
+        map_options = ["-vn"]
+        first_clean = 0
+        codec_options = []
+
+    for n, audio_stream_idx in enumerate(audio_stream_indices):
+        out_idx = first_clean + n
+        source = streams[audio_stream_idx] if audio_stream_idx < len(streams) else {}
+        description = source.get("tags", {}).get("title") or source.get("channel_layout")
+        title = f"Clean ({description})" if len(audio_stream_indices) > 1 and description else "Clean"
+        map_options += ["-map", f"[t{n}out]"]
+        codec_options += [
+            f"-c:a:{out_idx}", "aac", f"-b:a:{out_idx}", "256k",
+            f"-metadata:s:a:{out_idx}", f"title={title}",
+            f"-metadata:s:a:{out_idx}", f"language={source.get('tags', {}).get('language', 'eng')}",
+            f"-metadata:s:a:{out_idx}", "handler_name=CleanAudio",
+            f"-metadata:s:a:{out_idx}", "comment=Clean audio track",
+        ]
+
+    # Temp files are named after the video, so a node's startup cleanup can check the video's lease
+    temp_file = output_file + ".temp" + os.path.splitext(output_file)[1] if embed else video_file + SIDECAR_TEMP_SUFFIX
+    print(f"Muting {len(audio_stream_indices)} audio tracks in one pass...")
+    run_ffmpeg([
+        "ffmpeg", "-y", "-i", video_file,
+        "-filter_complex", ";".join(graphs),
+        *map_options,
+        *codec_options,
+        temp_file
+    ], capture_output=True)
+    os.replace(temp_file, output_file)
+    print(f"{len(audio_stream_indices)} clean audio tracks written to '{output_file}'")
+    return output_file
+
+def add_audio_to_video(video_file, clean_audio_file, output_file=None, copy_audio=False):
+    """Add the cleaned audio track back to the original video.
+
+    With copy_audio, all audio (including the clean track) is stream-copied
+    instead of re-encoded to AAC, e.g. for tracks from splice_mute_audio.
+    """
     output_file = output_file or video_file
     temp_file = output_file + ".temp" + os.path.splitext(output_file)[1]
 
@@ -268,7 +876,7 @@ def add_audio_to_video(video_file, clean_audio_file, output_file=None):
         "-show_streams", "-select_streams", "a:0",
         video_file
     ]
-    probe_result = subprocess.run(probe_cmd, capture_output=True, text=True)
+    probe_result = run_ffmpeg(probe_cmd, capture_output=True, text=True)
     audio_info = json.loads(probe_result.stdout)
 
     # Get number of channels, default to 2 if not found
@@ -276,6 +884,19 @@ def add_audio_to_video(video_file, clean_audio_file, output_file=None):
     if audio_info.get("streams") and len(audio_info["streams"]) > 0:
         channels = int(audio_info["streams"][0].get("channels", 2))
 
+    if copy_audio:
+        audio_options = ["-c:a", "copy"]
+    else:
+        audio_options = [
+            "-c:a", "aac",  # Use AAC codec
+            "-b:a", "256k",  # High quality bitrate
+            "-ar", "44100",  # Standard sample rate
+            "-ac", str(channels),  # Use original channel count
+        ]
+
+    # The clean track follows every original audio track
+    clean_idx = len(probe_audio_streams(video_file))
+
     print("Adding clean audio back to the video...")
     cmd = [
         "ffmpeg", "-y",
@@ -284,18 +905,15 @@ def add_audio_to_video(video_file, clean_audio_file, output_file=None):
         "-map", "0",  # Include all original streams
         "-map", "1:a",  # Add clean audio as a new track
         "-c:v", "copy",
-        "-c:a", "aac",  # Use AAC codec
-        "-b:a", "256k",  # High quality bitrate
-        "-ar", "44100",  # Standard sample rate
-        "-ac", str(channels),  # Use original channel count
-        "-metadata:s:a:1", "title=Clean",
-        "-metadata:s:a:1", "language=eng",
-        "-metadata:s:a:1", "handler_name=CleanAudio",
-        "-metadata:s:a:1", "comment=Clean audio track",
+        *audio_options,
+        f"-metadata:s:a:{clean_idx}", "title=Clean",
+        f"-metadata:s:a:{clean_idx}", "language=eng",
+        f"-metadata:s:a:{clean_idx}", "handler_name=CleanAudio",
+        f"-metadata:s:a:{clean_idx}", "comment=Clean audio track",
         "-shortest",
         temp_file
     ]
-    result = subprocess.run(cmd, capture_output=True, text=True)
+    result = run_ffmpeg(cmd, capture_output=True, text=True)
     os.replace(temp_file, output_file)
     print(f"Clean audio track added to '{output_file}'.")
 
@@ -308,23 +926,19 @@ def clean_subtitle_text(text, target_words=None):
         cleaned_text = pattern.sub(lambda m: '_' * len(m.group(0)), cleaned_text)
     return cleaned_text
 
-def extract_subtitles(video_file):
-    """Extract subtitles from video file if they exist.
+def find_subtitle_track(video_file):
+    """Pick the subtitle track to read, as an ffmpeg -map selector.
 
     Uses ffprobe to find the best English subtitle track, preferring
     non-forced, non-SDH tracks. Falls back to first subtitle track
     if no English tracks are found.
     """
-    temp_subs = tempfile.NamedTemporaryFile(suffix=".srt", delete=False)
-    temp_subs.close()
-
-    # Use ffprobe to find the best English subtitle track
     probe_cmd = [
         "ffprobe", "-v", "quiet", "-print_format", "json",
         "-show_streams", "-select_streams", "s",
         video_file
     ]
-    probe_result = subprocess.run(probe_cmd, capture_output=True, text=True)
+    probe_result = run_ffmpeg(probe_cmd, capture_output=True, text=True)
 
     best_track = None
     try:
@@ -357,111 +971,19 @@ def extract_subtitles(video_file):
     if best_track is not None:
         # Extract the specific track by absolute stream index
         print(f"Extracting subtitle track index {best_track}")
-        subprocess.run([
-            "ffmpeg", "-y", "-i", video_file,
-            "-map", f"0:{best_track}",
-            temp_subs.name
-        ], capture_output=True)
-    else:
-        # No English tracks found via probe, try first subtitle track
-        subprocess.run([
-            "ffmpeg", "-y", "-i", video_file,
-            "-map", "0:s:0",
-            temp_subs.name
-        ], capture_output=True)
-
-    if os.path.getsize(temp_subs.name) == 0:
-        os.unlink(temp_subs.name)
-        return None
-
-    return temp_subs.name
-
-def clean_subtitles(subtitle_file):
-    """Clean subtitle file and return path to cleaned version."""
-    if not subtitle_file:
-        return None
-
-    temp_clean_subs = tempfile.NamedTemporaryFile(suffix=".srt", delete=False)
-    temp_clean_subs.close()
-
-    with open(subtitle_file, 'r', encoding='utf-8-sig') as f:
-        content = f.read()
-
-    # Clean the subtitle content
-    cleaned_content = clean_subtitle_text(content)
-
-    with open(temp_clean_subs.name, 'w', encoding='utf-8') as f:
-        f.write(cleaned_content)
-
-    return temp_clean_subs.name
-
-def check_clean_subtitles(video_file):
-    """Check if the video file has a subtitle track with title 'Clean'."""
-    result = subprocess.run([
-        "ffmpeg", "-i", video_file, "-hide_banner"
-    ], capture_output=True, text=True)
-
-    # Look for any of our identifying metadata in subtitle streams
-    subtitle_streams = result.stderr.split("Stream #")
-
-    for stream in subtitle_streams:
-        if "Subtitle" in stream:
-            identifiers = [
-                r"handler_name\s*:\s*CleanSubtitles",
-                r"comment\s*:\s*Clean subtitle track",
-                r"title\s*:\s*Clean"
-            ]
-            for identifier in identifiers:
-                if re.search(identifier, stream, re.IGNORECASE):
-                    return True
-
-    return False
-
-def remove_clean_subtitles(video_file):
-    """Remove the clean subtitle file if it exists."""
-    base_name = os.path.splitext(video_file)[0]
-    clean_srt = f"{base_name}.Clean.en.srt"
-
-    if os.path.exists(clean_srt):
-        os.unlink(clean_srt)
-        print("Existing clean subtitle file removed.")
-
-def add_clean_subtitles(video_file, clean_subtitle_file, output_file=None):
-    """Add cleaned subtitles as a new track to the video."""
-    if not clean_subtitle_file:
-        return
-
-    output_file = output_file or video_file
-    temp_file = output_file + ".temp" + os.path.splitext(output_file)[1]
-
-    if check_clean_subtitles(video_file):
-        remove_clean_subtitles(video_file)
-
-    # Get current subtitle track count
-    subtitle_count = len(subprocess.run(
-        ["ffprobe", "-v", "error", "-select_streams", "s",
-         "-show_entries", "stream=index", "-of", "csv=p=0", video_file],
-        capture_output=True, text=True
-    ).stdout.strip().split('\n'))
-
-    cmd = [
-        "ffmpeg", "-y",
-        "-i", video_file,
-        "-i", clean_subtitle_file,
-        "-map", "0",  # Include all streams from original
-        "-map", "1:0",  # Add new subtitle track
-        "-c", "copy",  # Copy all streams
-        "-c:s", "mov_text",  # Convert subtitles to MOV format
-        "-metadata:s:s:" + str(subtitle_count), "title=Clean",  # Add metadata to new subtitle track
-        "-metadata:s:s:" + str(subtitle_count), "language=eng",
-        "-metadata:s:s:" + str(subtitle_count), "handler_name=CleanSubtitles",
-        "-metadata:s:s:" + str(subtitle_count), "comment=Clean subtitle track",
-        temp_file
-    ]
-
-    subprocess.run(cmd)
-    os.replace(temp_file, output_file)
-    print("Clean subtitle track added.")
+        return f"0:{best_track}"
+    # No English tracks found via probe, try first subtitle track
+    return "0:s:0"
+
+def read_subtitles(video_file):
+    """Read the best subtitle track as SRT text through a pipe, or None if there is none."""
+    result = run_ffmpeg([
+        "ffmpeg", "-nostdin", "-v", "quiet", "-i", video_file,
+        "-map", find_subtitle_track(video_file),
+        "-f", "srt", "-"
+    ], capture_output=True)
+    content = result.stdout.decode("utf-8", errors="replace").lstrip("\ufeff").replace("\r\n", "\n")
+    return content if content.strip() else None
 
 def save_clean_audio(video_file, clean_audio_file):
     """Save the cleaned audio as a separate AAC file next to the video."""
@@ -470,22 +992,10 @@ def save_clean_audio(video_file, clean_audio_file):
 
     # Copy the clean audio to the output location
     with open(clean_audio_file, 'rb') as src, open(output_aac, 'wb') as dst:
-        dst.write(src.read())
+        shutil.copyfileobj(src, dst)
 
     print(f"Clean audio saved to '{output_aac}'")
-
-def has_target_words_in_subtitles(subtitle_file, target_words=None):
-    """Check if any target words exist in the subtitle file."""
-    if not subtitle_file:
-        return False
-
-    regex_patterns = build_regex_patterns(target_words)
-
-    with open(subtitle_file, 'r', encoding='utf-8-sig') as f:
-        content = f.read()
-
-    return any(pattern.search(content) for pattern in regex_patterns)
-
+    return output_aac
 
 # --- Targeted Whisper Pipeline ---
 
@@ -497,15 +1007,12 @@ def srt_time_to_seconds(time_str):
     h, m, s, ms = int(match.group(1)), int(match.group(2)), int(match.group(3)), int(match.group(4))
     return h * 3600 + m * 60 + s + ms / 1000.0
 
-def parse_srt(subtitle_file):
-    """Parse an SRT file into a list of segments.
+def parse_srt_text(content):
+    """Parse SRT text into a list of segments.
 
     Returns list of dicts with keys: index, start, end, text
     where start/end are in seconds.
     """
-    with open(subtitle_file, 'r', encoding='utf-8-sig') as f:
-        content = f.read()
-
     segments = []
     blocks = content.strip().split("\n\n")
     timestamp_re = re.compile(r"(\d{2}:\d{2}:\d{2},\d{3})\s*-->\s*(\d{2}:\d{2}:\d{2},\d{3})")
@@ -574,36 +1081,232 @@ def find_flagged_srt_segments(srt_segments, target_words=None):
 
     return flagged
 
-def extract_clip_audio(full_audio_file, start_time, end_time):
-    """Extract a short audio clip from the full audio file.
+# Subtitle-to-audio time ratios to try when estimating sync: subtitles
+# ripped from a 25 fps (PAL) release on a 23.976/24 fps video, and back
+SUBTITLE_RATE_RATIOS = (1.0, 25 / 23.976, 23.976 / 25, 25 / 24, 24 / 25)
 
-    Returns path to temporary clip file.
-    """
-    clip_file = tempfile.NamedTemporaryFile(suffix=".wav", delete=False)
-    clip_file.close()
+def speech_activity_envelope(audio_source, audio_stream_idx=None, frame_rate=100, sample_rate=8000):
+    """Return a per-frame speech activity envelope of an audio track, in [0, 1].
 
-    duration = end_time - start_time
-    subprocess.run([
-        "ffmpeg", "-y",
-        "-i", full_audio_file,
-        "-ss", str(start_time),
-        "-t", str(duration),
-        "-ar", "16000",  # Whisper expects 16kHz
-        "-ac", "1",      # Mono for Whisper
-        clip_file.name
-    ], capture_output=True)
+    The track is decoded at a low sample rate, band-limited to the speech
+    range and streamed through a pipe one second at a time, so memory is
+    just the envelope (frame_rate values per second). Log energy per frame
+    is scaled between the track's noise floor and its loud frames.
+    With audio_stream_idx, audio_source is the original video. audio_source
+    may also be 16kHz mono samples already in memory (as decode_audio_chunk
+    returns), which are band-limited frame by frame instead of decoded again.
+    """
+    if isinstance(audio_source, np.ndarray):
+        return scale_activity(speech_band_energy(audio_source, frame_rate=frame_rate))
+
+    stream_options = ["-map", f"0:a:{audio_stream_idx}", "-vn"] if audio_stream_idx is not None else ["-vn"]
+    decoder = popen_ffmpeg([
+        "ffmpeg", "-nostdin", "-v", "quiet", "-i", audio_source,
+        *stream_options,
+        "-af", "highpass=f=200,lowpass=f=3500",
+        "-f", "s16le", "-ac", "1", "-ar", str(sample_rate), "-"
+    ], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+
+    frame_samples = sample_rate // frame_rate
+    energies = []
+    try:
+        while True:
+            data = decoder.stdout.read(2 * sample_rate)
+            if not data:
+                break
+            samples = np.frombuffer(data, dtype="<i2", count=len(data) // 2).astype(np.float32)
+            frames = samples[:len(samples) - len(samples) % frame_samples].reshape(-1, frame_samples)
+            energies.append(np.log10(np.mean(frames ** 2, axis=1) + 1.0))
+    finally:
+        decoder.stdout.close()
+        decoder.wait()
+
+    return scale_activity(np.concatenate(energies) if energies else np.empty(0, dtype=np.float32))
+
+def speech_band_energy(samples, sample_rate=16000, frame_rate=100, low=200, high=3500, block_frames=6000):
+    """Per-frame log energy of float samples between low and high Hz, a minute of frames at a time."""
+    frame_samples = sample_rate // frame_rate
+    frequencies = np.fft.rfftfreq(frame_samples, 1 / sample_rate)
+    band = (frequencies >= low) & (frequencies <= high)
+    energy = np.empty(len(samples) // frame_samples, dtype=np.float32)
+    for first in range(0, energy.size, block_frames):
+        frames = samples[first * frame_samples:(first + block_frames) * frame_samples]
+        frames = frames[:len(frames) - len(frames) % frame_samples].reshape(-1, frame_samples) * 32768.0
+        # Parseval: twice the one-sided band power over frame_samples squared is the band's mean square
+        power = np.abs(np.fft.rfft(frames, axis=1)[:, band]) ** 2
+        energy[first:first + len(frames)] = np.log10(2 * power.sum(axis=1) / frame_samples ** 2 + 1.0)
+    return energy
+
+def scale_activity(energy):
+    """Scale per-frame log energy between the 20th (noise floor) and 95th (loud) percentiles."""
+    if energy.size == 0:
+        return energy
+    floor, loud = np.percentile(energy, [20, 95])
+    return np.clip((energy - floor) / max(loud - floor, 1e-6), 0, 1).astype(np.float32)
+
+def subtitle_cue_track(srt_segments, frame_count, frame_rate=100):
+    """Return a 0/1 array marking frames covered by a subtitle cue."""
+    track = np.zeros(frame_count, dtype=np.float32)
+    for seg in srt_segments:
+        start = max(0, int(seg["start"] * frame_rate))
+        end = min(frame_count, int(np.ceil(seg["end"] * frame_rate)))
+        track[start:end] = 1
+    return track
+
+def best_cue_lag(activity, cues, start, end, max_lag):
+    """Find the shift of cues[start:end] that best lines up with activity.
+
+    Cross-correlates through an FFT over lags of up to max_lag frames either
+    way (audio beyond either end of the track counts as silence). Returns
+    (lag in frames, peak sharpness in standard deviations above the mean
+    correlation), or None if the window has too little to go on.
+    """
+    cue_window = cues[start:end]
+    if cue_window.sum() < 0.05 * len(cue_window) or cue_window.all():
+        return None
+    audio_start = max(0, start - max_lag)
+    audio = activity[audio_start:min(len(activity), end + max_lag)]
 
-    return clip_file.name
+    size = 1 << (len(audio) + len(cue_window)).bit_length()
+    correlation = np.fft.irfft(
+        np.fft.rfft(audio - audio.mean(), size) * np.conj(np.fft.rfft(cue_window - cue_window.mean(), size)), size
+    )
+    lags = np.arange(-max_lag, max_lag + 1)
+    shifts = lags + (start - audio_start)  # Position of the cue window within audio
+    keep = (shifts > -len(cue_window)) & (shifts < len(audio))
+    lags, values = lags[keep], correlation[shifts[keep] % size]
+    spread = values.std()
+    if spread == 0:
+        return None
+    best = int(np.argmax(values))
+    return int(lags[best]), float((values[best] - values.mean()) / spread)
+
+def fit_cue_offsets(activity, cues, frame_rate, max_lag, window, min_sharpness, max_residual):
+    """Fit offset + drift * t through the local cue offsets of each window (see estimate_subtitle_sync)."""
+    times, offsets = [], []
+    tried = 0
+    for start in range(0, len(activity) - window + 1, window):
+        end = len(activity) if start + 2 * window > len(activity) else start + window  # Fold the remainder in
+        match = best_cue_lag(activity, cues, start, end, max_lag)
+        tried += match is not None
+        if match is not None and match[1] >= min_sharpness:
+            times.append((start + end) / 2 / frame_rate)
+            offsets.append(match[0] / frame_rate)
+    if not times:
+        return None
+    times, offsets = np.array(times), np.array(offsets)
 
-def transcribe_clip(model, clip_file, clip_offset):
+    if len(times) < 3:
+        drift = 0.0
+        offset = float(np.median(offsets))
+    else:
+        pairs = np.triu_indices(len(times), 1)
+        drift = float(np.median((offsets[pairs[1]] - offsets[pairs[0]]) / (times[pairs[1]] - times[pairs[0]])))
+        offset = float(np.median(offsets - drift * times))
+    inliers = np.abs(offsets - (offset + drift * times)) <= max_residual
+    if inliers.sum() >= 3:
+        drift, offset = (float(value) for value in np.polyfit(times[inliers], offsets[inliers], 1))
+    if inliers.sum() < max(min(2, tried), tried // 2):
+        return None  # Too few windows agree for the sync to be trusted
+    residual = float(np.sqrt(np.mean((offsets[inliers] - (offset + drift * times[inliers])) ** 2)))
+    return {"offset": offset, "drift": drift, "residual": residual, "windows": int(inliers.sum())}
+
+def estimate_subtitle_sync(activity, srt_segments, frame_rate=100, max_offset=60.0, window_seconds=600.0,
+                           min_sharpness=6.0, max_residual=1.0):
+    """Estimate how far subtitle cues are from the speech they caption.
+
+    The title is cut into windows and each window's cues are cross-correlated
+    with the speech activity envelope (see speech_activity_envelope) to find
+    a local offset. A line through the local offsets (Theil-Sen, then least
+    squares on the inliers) gives a global offset plus a linear drift, which
+    covers both delayed subtitles and slow drift. Subtitles timed for another
+    frame rate drift too fast for that, so the cues are also tried stretched
+    by each SUBTITLE_RATE_RATIOS entry and the best fit wins.
+
+    Returns a dict with 'offset' (seconds), 'drift' (seconds per second),
+    'residual' (RMS error of the inliers in seconds) and 'windows', or None
+    if the subtitles could not be matched to the audio. Map subtitle times
+    with sync_subtitle_time.
+    """
+    if len(activity) == 0 or not srt_segments:
+        return None
+    window = min(int(window_seconds * frame_rate), len(activity))
+    best = None
+    for ratio in SUBTITLE_RATE_RATIOS:
+        stretched = [{"start": seg["start"] * ratio, "end": seg["end"] * ratio} for seg in srt_segments]
+        cues = subtitle_cue_track(stretched, len(activity), frame_rate)
+        sync = fit_cue_offsets(activity, cues, frame_rate, int(max_offset * frame_rate), window,
+                               min_sharpness, max_residual)
+        if sync is not None and (best is None or (sync["windows"], -sync["residual"]) > (best["windows"], -best["residual"])):
+            # Audio time = ratio * t + offset + drift * ratio * t
+            best = {**sync, "drift": ratio * (1 + sync["drift"]) - 1}
+    return best
+
+def sync_subtitle_time(seconds, sync):
+    """Map a subtitle timestamp onto the audio timeline."""
+    return seconds + sync["offset"] + sync["drift"] * seconds
+
+def synced_clip_buffer(sync, clip_buffer=2.0, min_buffer=0.5):
+    """Clip buffer to use once subtitles are synced: wide enough for the fit's residual error."""
+    return min(clip_buffer, max(min_buffer, 0.25 + 3 * sync["residual"]))
+
+def auto_sync_subtitles(srt_segments, audio_source, audio_stream_idx=None, clip_buffer=2.0):
+    """Estimate the subtitle sync for a title and the tighter clip buffer it allows.
+
+    audio_source is a file (see speech_activity_envelope) or the track's
+    16kHz samples when they are already in memory. Returns (sync,
+    clip_buffer); sync is None (and clip_buffer unchanged) when the
+    subtitles could not be matched to the audio.
+    """
+    print("Estimating subtitle sync from speech activity...")
+    activity = speech_activity_envelope(audio_source, audio_stream_idx)
+    sync = estimate_subtitle_sync(activity, srt_segments)
+    if sync is None:
+        print(f"  Could not match subtitles to the audio, keeping a {clip_buffer:g}s clip buffer")
+        return None, clip_buffer
+    clip_buffer = synced_clip_buffer(sync, clip_buffer)
+    print(f"  Subtitle offset {sync['offset']:+.2f}s, drift {sync['drift'] * 3600:+.1f}s/hour "
+          f"(residual {sync['residual']:.2f}s over {sync['windows']} windows), clip buffer {clip_buffer:.2f}s")
+    return sync, clip_buffer
+
+def constrained_decode_options(model, prompt):
+    """Whisper decode options for a short clip whose expected text is known.
+
+    The subtitle line becomes the prompt, a single temperature of 0 disables
+    the temperature-fallback retry ladder (and with it the compression ratio
+    and log-probability checks that trigger it), decoding is greedy, and
+    the number of sampled tokens is capped at a small multiple of the
+    prompt's length.
+    """
+    options = {
+        "temperature": 0.0,
+        "condition_on_previous_text": False,
+        "compression_ratio_threshold": None,
+        "logprob_threshold": None,
+        "no_speech_threshold": None,
+        "beam_size": None,
+        "best_of": None,
+    }
+    if prompt:
+        tokenizer = whisper.tokenizer.get_tokenizer(model.is_multilingual)
+        expected_tokens = len(tokenizer.encode(" " + prompt.strip()))
+        # Leave room for dialogue caught in the clip buffer on either side
+        options["initial_prompt"] = prompt
+        options["sample_len"] = min(2 * expected_tokens + 16, model.dims.n_text_ctx // 2)
+    return options
+
+def transcribe_clip(model, clip_file, clip_offset, prompt=None, constrained=False):
     """Run Whisper on a short audio clip and return word-level timestamps.
 
     clip_offset is the start time of the clip relative to the full audio,
     so we can convert clip-relative timestamps back to absolute timestamps.
+    With constrained, the clip is decoded with constrained_decode_options,
+    using prompt (the subtitle text) as the expected content.
 
     Returns list of dicts with keys: word, start, end (absolute timestamps).
     """
-    result = model.transcribe(clip_file, word_timestamps=True, verbose=False)
+    decode_options = constrained_decode_options(model, prompt) if constrained else {}
+    result = run_whisper(model, clip_file, word_timestamps=True, verbose=False, **decode_options)
 
     words = []
     for segment in result.get("segments", []):
@@ -616,55 +1319,60 @@ def transcribe_clip(model, clip_file, clip_offset):
 
     return words
 
-def targeted_transcription(video_file, subtitle_file, full_audio_file, transcription_file, target_words=None, clip_buffer=2.0):
-    """Run targeted Whisper transcription on flagged subtitle segments only.
+def sync_segments(segments, sync):
+    """Move subtitle segments onto the audio timeline (see estimate_subtitle_sync)."""
+    return [
+        {**seg, "start": sync_subtitle_time(seg["start"], sync), "end": sync_subtitle_time(seg["end"], sync)}
+        for seg in segments
+    ]
+
+def transcribe_targeted_segments(model, flagged, load_clip, target_words=None, clip_buffer=2.0,
+                                 constrained_decoding=False, cache=None):
+    """Transcribe the clip around each flagged subtitle segment and find the target words in it.
 
-    Instead of transcribing the entire audio, this:
-    1. Parses SRT subtitles to find segments with swear words
-    2. Extracts short audio clips around those segments
-    3. Runs Whisper only on those clips for precise word timestamps
-    4. Falls back to SRT timestamp-based muting if Whisper misses the word
+    load_clip(start, end) returns that stretch of the dialogue track as
+    16kHz mono float32 samples, e.g. a slice of audio already in memory or
+    decode_audio_chunk piping it from the source. Segments where Whisper
+    misses the word fall back to their subtitle timing. clip_buffer is the
+    audio kept either side of each line; constrained_decoding biases
+    Whisper towards the target words (see constrained_decode_options).
 
-    Returns list of mute windows (dicts with 'start', 'end', 'source' keys).
-    Also saves transcription data to transcription_file.
+    Returns the transcription data: counts, mute windows (dicts with
+    'start', 'end', 'word', 'source') and per-clip results with decode times.
     """
     regex_patterns = build_regex_patterns(target_words)
-
-    # Parse SRT and find flagged segments
-    srt_segments = parse_srt(subtitle_file)
-    flagged = find_flagged_srt_segments(srt_segments, target_words)
-
-    if not flagged:
-        print("No target words found in subtitles.")
-        # Save empty transcription
-        with open(transcription_file, "w") as f:
-            json.dump({"pipeline": "targeted", "flagged_segments": 0, "mute_windows": []}, f, indent=4)
-        return []
-
     print(f"Found {len(flagged)} subtitle segments with target words")
     for seg in flagged:
         text_preview = seg["text"][:60].replace("\n", " ")
         print(f"  [{seg['start']:.1f}s - {seg['end']:.1f}s] {text_preview}... => {seg['matched_words']}")
 
-    # Load Whisper model once
-    print("\nLoading Whisper model for targeted transcription...")
-    model = whisper.load_model("base.en")
-
     mute_windows = []
     clip_results = []
 
     for seg in flagged:
-        # Extract a clip with buffer around the subtitle segment
+        # Cut a clip with buffer around the subtitle segment
         clip_start = max(0, seg["start"] - clip_buffer)
         clip_end = seg["end"] + clip_buffer
 
         text_preview = seg["text"][:50].replace("\n", " ")
         print(f"\nProcessing segment [{seg['start']:.1f}s - {seg['end']:.1f}s]: {text_preview}...")
-        clip_file = extract_clip_audio(full_audio_file, clip_start, clip_end)
+        clip = load_clip(clip_start, clip_end)
 
         # Run Whisper on the clip
-        words = transcribe_clip(model, clip_file, clip_start)
-        os.unlink(clip_file)
+        decode_start = time.perf_counter()
+        if clip.size == 0:
+            words = []
+        elif cache is not None:
+            words = [
+                {**word, "start": word["start"] + clip_start, "end": word["end"] + clip_start}
+                for word in cache.transcribe(
+                    clip,
+                    lambda piece: transcribe_clip(model, piece, 0, prompt=seg["text"], constrained=constrained_decoding)
+                )
+            ]
+        else:
+            words = transcribe_clip(model, clip, clip_start, prompt=seg["text"], constrained=constrained_decoding)
+        decode_seconds = time.perf_counter() - decode_start
 
         # Search for target words in Whisper results
         found_in_whisper = False
@@ -701,25 +1409,579 @@ def targeted_transcription(video_file, subtitle_file, full_audio_file, transcrip
             "whisper_words": [{"word": w["word"], "start": w["start"], "end": w["end"]} for w in words],
             "target_words_found": [{"word": w["word"], "start": w["start"], "end": w["end"]} for w in whisper_words_for_segment],
             "used_fallback": not found_in_whisper,
+            "decode_seconds": round(decode_seconds, 3),
         })
 
-    # Save transcription data
     transcription_data = {
         "pipeline": "targeted",
         "flagged_segments": len(flagged),
         "total_mute_windows": len(mute_windows),
         "whisper_hits": sum(1 for w in mute_windows if w["source"] == "whisper"),
         "srt_fallbacks": sum(1 for w in mute_windows if w["source"] == "srt_fallback"),
+        "constrained_decoding": constrained_decoding,
+        "clip_buffer": clip_buffer,
+        "decode_seconds": round(sum(clip["decode_seconds"] for clip in clip_results), 3),
         "mute_windows": mute_windows,
         "clip_results": clip_results,
     }
-    with open(transcription_file, "w") as f:
-        json.dump(transcription_data, f, indent=4)
-    print(f"\nTranscription saved to '{transcription_file}'")
-    print(f"  {transcription_data['whisper_hits']} words muted via Whisper (precise)")
+    print(f"\n  {transcription_data['whisper_hits']} words muted via Whisper (precise)")
     print(f"  {transcription_data['srt_fallbacks']} segments muted via SRT fallback (conservative)")
+    print(f"  {transcription_data['decode_seconds']:.2f}s spent decoding {len(clip_results)} clips "
+          f"({transcription_data['decode_seconds'] / len(clip_results):.2f}s per clip)")
+    return transcription_data
+
+def find_candidate_regions(starts, ends, words, target_words=None, threshold=0.7, clip_buffer=1.0):
+    """Flag regions of a rough transcription that might contain target words.
+
+    Meant for a cheap first pass, so it errs towards recall: besides words
+    matching the target patterns, any word of three or more letters spelled
+    similarly to a target word (difflib ratio >= threshold, e.g. "duck" for
+    "fuck") is flagged. Returns merged (starts, ends) with clip_buffer
+    seconds around each flagged word.
+    """
+    words = np.asarray(words, dtype=str)
+    if words.size == 0:
+        return np.empty(0), np.empty(0)
 
-    return mute_windows
+    unique_words, inverse = np.unique(words, return_inverse=True)
+    regex_patterns = build_regex_patterns(target_words)
+    targets = {re.sub(r"[^a-z]", "", word.lower()) for word in (target_words if target_words is not None else DEFAULT_TARGET_WORDS)}
+    flagged = np.zeros(len(unique_words), dtype=bool)
+    for i, word in enumerate(unique_words):
+        letters = re.sub(r"[^a-z]", "", word.lower())
+        flagged[i] = any(pattern.search(word) for pattern in regex_patterns) or (
+            len(letters) >= 3 and any(difflib.SequenceMatcher(None, letters, target).ratio() >= threshold for target in targets)
+        )
+
+    mask = flagged[inverse]
+    region_starts = np.maximum(0, np.asarray(starts, dtype=np.float64)[mask] - clip_buffer)
+    region_ends = np.asarray(ends, dtype=np.float64)[mask] + clip_buffer
+    return merge_mute_windows(region_starts, region_ends)
+
+def transcribe_regions(model, starts, ends, load_clip):
+    """Transcribe each (start, end) region, with clips from load_clip(start, end) as 16kHz samples.
+
+    Returns the words with absolute timestamps, as transcribe_clip does.
+    """
+    words = []
+    for start, end in zip(np.asarray(starts).tolist(), np.asarray(ends).tolist()):
+        clip = load_clip(start, end)
+        if clip.size:
+            words.extend(transcribe_clip(model, clip, start))
+    return words
+
+def find_scan_fallbacks(scan_transcription, region_starts, precise_words, target_words=None, min_probability=0.5):
+    """Confident scan-pass target words whose candidate region has no target word in the precise pass.
+
+    When the precise model mishears a word the cheap scan_model caught with
+    at least min_probability (words without one count as confident), the
+    scan word's own timing is kept so it is still muted. region_starts are
+    the sorted starts from find_candidate_regions. Returns the scan words
+    (dicts with 'word', 'start' and 'end').
+    """
+    regex_patterns = build_regex_patterns(target_words)
+    region_starts = np.asarray(region_starts, dtype=np.float64)
+
+    def region_of(word):
+        return int(np.searchsorted(region_starts, word["start"], side="right")) - 1
+
+    def is_target(word):
+        return any(pattern.search(word["word"]) for pattern in regex_patterns)
+
+    hit_regions = {region_of(word) for word in precise_words if is_target(word)}
+    return [
+        {"word": word["word"], "start": word["start"], "end": word["end"]}
+        for segment in scan_transcription.get("segments", [])
+        for word in segment.get("words", [])
+        if word.get("probability", 1.0) >= min_probability and is_target(word) and region_of(word) not in hit_regions
+    ]
+
+
+class StageTimer:
+    """Measure ffmpeg/ffprobe and Whisper work while the block runs.
+
+    Nothing is patched: swears.py starts ffmpeg through run_ffmpeg and
+    popen_ffmpeg and Whisper through run_whisper, which report to every
+    timer active on the calling thread. Counts every ffmpeg/ffprobe process
+    (including pipes), times the ones run to completion, and counts the
+    audio seconds Whisper decodes from the clip length (or, for a file,
+    its probed duration).
+    """
+
+    def __init__(self):
+        self.ffmpeg_seconds = 0.0
+        self.ffmpeg_calls = 0
+        self.whisper_seconds = 0.0
+        self.audio_seconds = 0.0
+
+    def __enter__(self):
+        _active_timers.stack = active_timers() + (self,)
+        return self
+
+    def __exit__(self, *exc_info):
+        _active_timers.stack = tuple(timer for timer in active_timers() if timer is not self)
+        return False
+
+
+_active_timers = threading.local()
+
+def active_timers():
+    """The StageTimers active on this thread."""
+    return getattr(_active_timers, "stack", ())
+
+def run_ffmpeg(cmd, **kwargs):
+    """subprocess.run an ffmpeg/ffprobe command, timed by the active StageTimers."""
+    timers = active_timers()
+    start = time.perf_counter()
+    try:
+        return subprocess.run(cmd, **kwargs)
+    finally:
+        for timer in timers:
+            timer.ffmpeg_calls += 1
+            timer.ffmpeg_seconds += time.perf_counter() - start
+
+def popen_ffmpeg(cmd, **kwargs):
+    """subprocess.Popen an ffmpeg command, counted by the active StageTimers."""
+    for timer in active_timers():
+        timer.ffmpeg_calls += 1
+    return subprocess.Popen(cmd, **kwargs)
+
+def run_whisper(model, audio, **options):
+    """model.transcribe audio (samples or a file), timed by the active StageTimers."""
+    timers = active_timers()
+    if timers:
+        audio_seconds = (probe_duration(audio) or 0.0) if isinstance(audio, str) else len(audio) / 16000
+    start = time.perf_counter()
+    try:
+        with torch.inference_mode():
+            return model.transcribe(audio, **options)
+    finally:
+        for timer in timers:
+            timer.audio_seconds += audio_seconds
+            timer.whisper_seconds += time.perf_counter() - start
+
+
+class RunMetrics:
+    """Timings and counts for one title, saved as JSON with --metrics-out.
+
+    process_videos.py reads the file back to feed its metrics exporter.
+    """
+
+    def __init__(self):
+        self.timer = StageTimer()
+        self.stages = {}
+        self.sources = {}
+        self.pipeline = None
+        self.stage = None
+        self.stage_started = None
+
+    def enter_stage(self, stage):
+        """Close the current stage's timing and start timing the next (None to stop)."""
+        now = time.perf_counter()
+        if self.stage is not None:
+            self.stages[self.stage] = self.stages.get(self.stage, 0.0) + now - self.stage_started
+        self.stage, self.stage_started = stage, now
+
+    def count_sources(self, mute_windows):
+        for window in mute_windows:
+            self.sources[window["source"]] = self.sources.get(window["source"], 0) + 1
+
+    def save(self, metrics_file):
+        self.enter_stage(None)
+        with open(metrics_file, "w") as f:
+            json.dump({
+                "pipeline": self.pipeline,
+                "stage_seconds": self.stages,
+                "mute_window_sources": self.sources,
+                "whisper_audio_seconds": self.timer.audio_seconds,
+                "whisper_seconds": self.timer.whisper_seconds,
+                "ffmpeg_seconds": self.timer.ffmpeg_seconds,
+                "ffmpeg_calls": self.timer.ffmpeg_calls,
+            }, f, indent=4)
+
+
+# Cleaner options and their defaults, named after the swears.py flags
+CLEANER_OPTIONS = {
+    "force": False,
+    "embed_audio": False,
+    "add_clean_subtitles": True,
+    "subtitles_only": False,
+    "skip_subtitle_check": False,
+    "full_whisper": False,
+    "export_json": False,
+    "centre_channel_only": False,
+    "seek_source": False,
+    "constrained_decoding": False,
+    "auto_sync": False,
+    "splice_render": False,
+    "streaming_render": False,
+    "cascade": False,
+    "all_tracks": False,
+    "chunk_minutes": None,
+    "clip_buffer": None,
+    "edl": False,
+    "save_filter": False,
+    "save_transcription": True,
+}
+
+
+class CleanResult:
+    """What Cleaner.clean did with one title.
+
+    status is "cleaned" ("analysed" when rendering was skipped), or why it
+    stopped early: "missing", "exists", "no_target_words", "subtitles_only"
+    or "no_mutes". starts/ends are the
+    padded, merged mute windows in seconds and mute_windows the targeted
+    pipeline's unpadded windows (or the cascade's scan fallbacks) with their
+    word and source; sources counts windows per source. outputs lists
+    the files written; timings holds seconds per stage and in "total".
+    """
+
+    def __init__(self, video_file):
+        self.video_file = video_file
+        self.status = None
+        self.message = None
+        self.pipeline = None
+        self.starts = np.empty(0)
+        self.ends = np.empty(0)
+        self.mute_windows = []
+        self.sources = {}
+        self.sync = None
+        self.clean_subtitles = None
+        self.transcription = None
+        self.outputs = []
+        self.timings = {}
+
+    def stop(self, status, message):
+        print(message)
+        self.status, self.message = status, message
+        return self
+
+
+class Cleaner:
+    """Clean titles in-process, keeping the matcher and models between them.
+
+    Takes the swears.py options as keyword arguments (see CLEANER_OPTIONS)
+    and holds the target-word patterns, the loaded Whisper models and the
+    dedupe cache, so a service can clean many titles per process. Within a
+    title, subtitles, decoded audio, segments and mute windows are passed
+    between stages in memory; only outputs are written (clean subtitles,
+    the transcription unless save_transcription is off, and the clean audio
+    or EDL). main() is a thin wrapper around it.
+    """
+
+    def __init__(self, target_words=None, model_name="base.en", workers=1, dedupe_cache=None, **options):
+        unknown = sorted(set(options) - set(CLEANER_OPTIONS))
+        if unknown:
+            raise TypeError(f"Unknown Cleaner options: {', '.join(unknown)}")
+        for name, default in CLEANER_OPTIONS.items():
+            setattr(self, name, options.get(name, default))
+        self.target_words = target_words
+        self.patterns = build_regex_patterns(target_words)
+        self.model_name = model_name
+        self.workers = workers
+        self.models = {}
+        self.cache = TranscriptionCache(dedupe_cache) if dedupe_cache else None
+
+    @classmethod
+    def from_args(cls, args):
+        """Build a Cleaner from parsed swears.py arguments."""
+        options = {name: getattr(args, name, default) for name, default in CLEANER_OPTIONS.items()}
+        return cls(model_name=args.model, workers=args.parallel_jobs, dedupe_cache=args.dedupe_cache, **options)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+    def close(self):
+        if self.cache is not None:
+            self.cache.close()
+            self.cache = None
+
+    def load_model(self, name=None):
+        """Load a Whisper model on first use and keep it for later titles."""
+        name = name or self.model_name
+        if name not in self.models:
+            print(f"\nLoading Whisper model ({name})...")
+            self.models[name] = load_whisper_model(name, self.workers)
+        return self.models[name]
+
+    def clean(self, video_file, on_stage=None, metrics=None, render=True):
+        """Clean one title and return a CleanResult.
+
+        on_stage(stage) is called as the title enters each job stage
+        (extracting, transcribing, muxing), and metrics, a RunMetrics (a new
+        one by default), records the pipeline, stage times and window sources.
+        With render=False, it stops once the mute windows are known, without
+        writing an EDL, filter or clean audio (e.g. to benchmark pipelines).
+        """
+        metrics = metrics if metrics is not None else RunMetrics()
+        result = CleanResult(video_file)
+        started = time.perf_counter()
+
+        def enter_stage(stage):
+            if on_stage is not None:
+                on_stage(stage)
+            metrics.enter_stage(stage)
+
+        try:
+            self.process(result, enter_stage, render)
+        finally:
+            metrics.enter_stage(None)
+            metrics.pipeline = result.pipeline
+            for source, count in result.sources.items():
+                metrics.sources[source] = metrics.sources.get(source, 0) + count
+            result.timings = {**metrics.stages, "total": time.perf_counter() - started}
+        return result
+
+    def process(self, result, enter_stage, render=True):
+        video_file = result.video_file
+        if not os.path.exists(video_file):
+            return result.stop("missing", f"Error: File '{video_file}' not found.")
+
+        # Check for an existing mute list or clean audio
+        base_path = os.path.splitext(video_file)[0]
+        if self.edl:
+            # An EDL run writes no audio, so an earlier clean track doesn't count
+            if os.path.exists(f"{base_path}.edl") and not self.force:
+                return result.stop("exists", "Mute list (.edl) already exists. Use --force to replace it.")
+        elif check_clean_audio(video_file):
+            if not self.force:
+                return result.stop("exists", "'Clean' audio track already exists. Use --force to replace it.")
+
+        transcription_file = f"{base_path}_transcription.json"
+        word_store_file = f"{base_path}_transcription.words"
+        if (os.path.exists(transcription_file) or os.path.exists(word_store_file)) and not self.force:
+            return result.stop("exists", "Transcription already exists. Skipping.")
+
+        # Read subtitles straight into memory
+        enter_stage(EXTRACTING)
+        subtitles = read_subtitles(video_file)
+        has_swears_in_subs = False
+        if subtitles and not self.skip_subtitle_check:
+            print("Checking subtitles for target words...")
+            has_swears_in_subs = any(pattern.search(subtitles) for pattern in self.patterns)
+            if not has_swears_in_subs:
+                return result.stop("no_target_words", "No target words found in subtitles, skipping audio processing.")
+
+            print("Found target words in subtitles, creating clean version...")
+            result.clean_subtitles = clean_subtitle_text(subtitles, self.target_words)
+            if self.add_clean_subtitles:
+                output_srt = f"{base_path}.Clean.en.srt"
+                with open(output_srt, "w", encoding="utf-8") as f:
+                    f.write(result.clean_subtitles)
+                result.outputs.append(output_srt)
+                print(f"Clean subtitles saved to '{output_srt}'")
+        elif not subtitles:
+            print("No subtitle track found, will use full Whisper transcription.")
+
+        if self.subtitles_only:
+            return result.stop("subtitles_only", "Subtitles only, skipping audio processing.")
+
+        # With all_tracks, every dialogue track is cleaned but only one is transcribed
+        if self.all_tracks:
+            audio_streams, audio_stream_idx = select_dialogue_streams(probe_audio_streams(video_file),
+                                                                      self.centre_channel_only)
+            print(f"Cleaning audio streams {audio_streams}, transcribing audio stream {audio_stream_idx}")
+        else:
+            audio_stream_idx = find_english_audio_stream(video_file)
+            audio_streams = [audio_stream_idx]
+        # Transcribe from the dialogue channel alone when requested and available
+        asr_filter = None
+        if self.centre_channel_only and get_surround_channels(video_file, audio_stream_idx)[0]:
+            asr_filter = "pan=mono|c0=FC"
+
+        # Decide pipeline: targeted (subtitle-driven) vs full Whisper
+        enter_stage(TRANSCRIBING)
+        if subtitles and has_swears_in_subs and not self.full_whisper:
+            self.transcribe_targeted(result, parse_srt_text(subtitles), audio_stream_idx, asr_filter,
+                                     transcription_file)
+        else:
+            self.transcribe_full(result, audio_stream_idx, asr_filter, transcription_file, word_store_file)
+        if result.starts.size == 0:
+            return result.stop("no_mutes", "No sections to mute. Exiting.")
+        if not render:
+            result.status = "analysed"
+            return result
+
+        if self.edl:
+            # Players mute at playback time, so skip rendering a clean track entirely
+            result.outputs.append(save_mute_edl(video_file, result.starts, result.ends))
+            result.status = "cleaned"
+            return result
+
+        print(f"Generated FFmpeg filter with {len(result.starts)} mute windows")
+        if self.save_filter:
+            filter_file = f"{base_path}_filter-string.txt"
+            with open(filter_file, "w") as f:
+                f.write(format_mute_filter(result.starts, result.ends))
+            result.outputs.append(filter_file)
+            print(f"FFmpeg filter string saved to '{filter_file}'")
+
+        enter_stage(MUXING)
+        self.render(result, audio_streams)
+        result.status = "cleaned"
+        return result
+
+    def transcribe_targeted(self, result, srt_segments, audio_stream_idx, asr_filter, transcription_file):
+        """Targeted pipeline: transcribe only clips around subtitle lines with target words.
+
+        Each clip is decoded on its own from the source, so memory stays at
+        one clip. auto_sync needs a pass over the whole track anyway, so the
+        track is then decoded into memory once, for both the speech envelope
+        and the clips, unless seek_source or chunk_minutes asks to bound
+        memory; the envelope is then streamed from the source instead.
+        """
+        print("\n=== Using targeted Whisper pipeline (subtitle-driven) ===")
+        result.pipeline = "targeted"
+        video_file = result.video_file
+        flagged = find_flagged_srt_segments(srt_segments, self.target_words)
+        if not flagged:
+            print("No target words found in subtitles.")
+            return
+
+        audio = None
+        if self.auto_sync and not (self.seek_source or self.chunk_minutes):
+            print(f"Decoding audio stream {audio_stream_idx} for subtitle sync and transcription...")
+            audio = decode_audio_chunk(video_file, audio_stream_idx=audio_stream_idx, audio_filter=asr_filter)
+
+        clip_buffer = self.clip_buffer if self.clip_buffer is not None else 2.0
+        if self.auto_sync:
+            if audio is not None:
+                result.sync, clip_buffer = auto_sync_subtitles(srt_segments, audio, clip_buffer=clip_buffer)
+            else:
+                result.sync, clip_buffer = auto_sync_subtitles(srt_segments, video_file, audio_stream_idx, clip_buffer)
+            if result.sync is not None:
+                flagged = sync_segments(flagged, result.sync)
+
+        def load_clip(start, end):
+            if audio is None:
+                return decode_audio_chunk(video_file, start, end - start, audio_stream_idx=audio_stream_idx,
+                                          audio_filter=asr_filter)
+            return audio[int(start * 16000):int(end * 16000)]
+
+        transcription = transcribe_targeted_segments(
+            self.load_model(), flagged, load_clip, target_words=self.target_words, clip_buffer=clip_buffer,
+            constrained_decoding=self.constrained_decoding, cache=self.cache
+        )
+        transcription["subtitle_sync"] = result.sync
+        result.transcription = transcription
+        result.mute_windows = transcription["mute_windows"]
+        for window in result.mute_windows:
+            result.sources[window["source"]] = result.sources.get(window["source"], 0) + 1
+        if result.mute_windows:
+            result.starts, result.ends = pad_mute_windows(result.mute_windows)
+
+        if self.save_transcription:
+            with open(transcription_file, "w") as f:
+                json.dump(transcription, f, indent=4)
+            result.outputs.append(transcription_file)
+            print(f"Transcription saved to '{transcription_file}'")
+
+    def transcribe_full(self, result, audio_stream_idx, asr_filter, transcription_file, word_store_file):
+        """Full Whisper pipeline (fallback for no subtitles), or two-stage spotting with cascade.
+
+        The dialogue track is decoded into memory once, or chunk by chunk
+        with chunk_minutes (and with the dedupe cache, an hour at a time).
+        """
+        video_file = result.video_file
+        chunk_seconds = self.chunk_minutes * 60 if self.chunk_minutes else None
+        if self.cache is not None and not self.cascade:
+            chunk_seconds = chunk_seconds or 3600
+        audio = None
+        if not chunk_seconds:
+            print(f"Decoding audio stream {audio_stream_idx} for transcription...")
+            audio = decode_audio_chunk(video_file, audio_stream_idx=audio_stream_idx, audio_filter=asr_filter)
+
+        def transcribe_track(model, cache=None):
+            if audio is None:
+                return transcribe_in_chunks(model, video_file, chunk_seconds, cache, audio_stream_idx, asr_filter)
+            return run_whisper(model, audio, word_timestamps=True, verbose=not self.cascade)
+
+        if self.cascade:
+            print("\n=== Using two-stage keyword spotting (no subtitles available) ===")
+            result.pipeline = "cascade"
+            scan = self.load_model("tiny.en")
+            print("Scanning full audio for candidate regions...")
+            scan_result = transcribe_track(scan)
+            region_starts, region_ends = find_candidate_regions(
+                *load_transcription_words(scan_result), target_words=self.target_words,
+                clip_buffer=self.clip_buffer if self.clip_buffer is not None else 1.0
+            )
+            print(f"Flagged {len(region_starts)} candidate regions ({(region_ends - region_starts).sum():.0f}s of audio)")
+
+            def load_clip(start, end):
+                if audio is None:
+                    return decode_audio_chunk(video_file, start, end - start, audio_stream_idx=audio_stream_idx,
+                                              audio_filter=asr_filter)
+                return audio[int(start * 16000):int(end * 16000)]
+
+            words = transcribe_regions(self.load_model(), region_starts, region_ends, load_clip) if len(region_starts) else []
+            fallbacks = find_scan_fallbacks(scan_result, region_starts, words, target_words=self.target_words)
+            if fallbacks:
+                print(f"Keeping scan timing for {len(fallbacks)} target words the precise pass missed")
+            result.mute_windows = [{**word, "word": word["word"].strip(), "source": "scan_fallback"} for word in fallbacks]
+            result.sources["scan_fallback"] = len(fallbacks)
+            result.sources["whisper"] = len(build_mute_windows(*load_transcription_words({"segments": [{"words": words}]}),
+                                                               target_words=self.target_words)[0])
+            words = sorted(words + fallbacks, key=lambda word: word["start"])
+            result.transcription = {"text": "".join(word["word"] for word in words),
+                                    "segments": [{"words": words}] if words else [], "language": "en",
+                                    "scan_fallbacks": fallbacks}
+        else:
+            print("\n=== Using full Whisper transcription (no subtitles available) ===")
+            result.pipeline = "full"
+            model = self.load_model()
+            print("Transcribing full audio...")
+            result.transcription = transcribe_track(model, self.cache)
+
+        starts, ends, words = load_transcription_words(result.transcription)
+        if self.save_transcription:
+            save_word_store(word_store_file, starts, ends, words)
+            result.outputs.append(word_store_file)
+            print(f"Transcription saved to '{word_store_file}'")
+        if self.export_json:
+            with open(transcription_file, "w") as f:
+                json.dump(result.transcription, f, separators=(",", ":"))
+            result.outputs.append(transcription_file)
+            print(f"Transcription exported to '{transcription_file}'")
+
+        result.starts, result.ends = build_mute_windows(starts, ends, words, target_words=self.target_words)
+        if not self.cascade:
+            result.sources["whisper"] = len(result.starts)
+
+    def render(self, result, audio_streams):
+        """Write the clean audio.
+
+        Every selected track is muted and written in one pass from the
+        source (see render_clean_tracks). splice_render and streaming_render
+        apply to single-track runs and fall back to that pass when they can't
+        be used.
+        """
+        video_file = result.video_file
+        audio_stream_idx = audio_streams[0]
+        muted_audio = None
+        if not self.all_tracks and self.splice_render:
+            muted_audio = splice_mute_audio(video_file, result.starts, result.ends, audio_stream_idx,
+                                            centre_only=self.centre_channel_only)
+        spliced = muted_audio is not None
+        if not self.all_tracks and not spliced and self.streaming_render:
+            muted_audio = stream_mute_audio(video_file, result.starts, result.ends, audio_stream_idx=audio_stream_idx,
+                                            centre_only=self.centre_channel_only)
+
+        if muted_audio is None:
+            result.outputs.append(render_clean_tracks(video_file, result.starts, result.ends, audio_streams,
+                                                      embed=self.embed_audio, centre_only=self.centre_channel_only))
+        elif self.embed_audio:
+            add_audio_to_video(video_file, muted_audio, copy_audio=spliced)
+            result.outputs.append(video_file)
+            os.unlink(muted_audio)
+        else:
+            result.outputs.append(save_clean_audio(video_file, muted_audio))
+            os.unlink(muted_audio)
 
 
 # Main Functionality
@@ -734,107 +1996,56 @@ def main():
     parser.add_argument("--embed-audio", action="store_true", help="Embed clean audio in video instead of saving as separate file")
     parser.add_argument("--skip-subtitle-check", action="store_true", help="Skip checking subtitles for target words")
     parser.add_argument("--full-whisper", action="store_true", help="Force full-episode Whisper transcription instead of targeted")
+    parser.add_argument("--export-json", action="store_true",
+                       help="Also export the full Whisper transcription as JSON")
+    parser.add_argument("--centre-channel-only", action="store_true",
+                       help="For surround tracks, transcribe and mute only the centre (dialogue) channel")
+    parser.add_argument("--seek-source", action="store_true",
+                       help="With --auto-sync: stream the sync pass from the video instead of holding the decoded track in memory")
+    parser.add_argument("--constrained-decoding", action="store_true",
+                       help="Targeted pipeline: prompt each clip with its subtitle line and decode greedily in one pass")
+    parser.add_argument("--auto-sync", action="store_true",
+                       help="Targeted pipeline: correct subtitle offset and drift against the audio, then cut tighter clips")
+    parser.add_argument("--splice-render", action="store_true",
+                       help="Re-encode only the muted regions of the original audio and stream-copy the rest")
+    parser.add_argument("--streaming-render", action="store_true",
+                       help="Render the clean track block by block through pipes, with constant memory use")
+    parser.add_argument("--all-tracks", action="store_true",
+                       help="Clean every dialogue audio track in one pass, transcribing only the best one")
+    parser.add_argument("--cascade", action="store_true",
+                       help="Without subtitles: scan with tiny.en, then transcribe only flagged regions with the main model")
+    parser.add_argument("--clip-buffer", type=float,
+                       help="Seconds of audio around each flagged subtitle line (targeted, default: 2) "
+                            "or candidate word (--cascade, default: 1) to transcribe")
+    parser.add_argument("--chunk-minutes", type=float,
+                       help="Full Whisper pipeline: transcribe in chunks of this many minutes to bound memory use")
+    parser.add_argument("--dedupe-cache",
+                       help="SQLite cache of fingerprinted audio, to reuse transcriptions of recurring intros, recaps and credits")
+    parser.add_argument("--edl", action="store_true",
+                       help="Write a player-side mute list (.edl) instead of encoding a clean audio track")
+    parser.add_argument("--model", default="base.en", help="Whisper model to transcribe with (default: base.en)")
+    parser.add_argument("--parallel-jobs", type=int, default=1,
+                       help="Number of swears.py processes sharing this host, to pick the tuned CPU profile (default: 1)")
+    parser.add_argument("--journal", help="Job journal file to record pipeline progress in (used by process_videos.py)")
+    parser.add_argument("--metrics-out", help="Write stage timings and counts for this run as JSON (used by process_videos.py)")
     args = parser.parse_args()
 
-    video_file = args.video_file
-    if not os.path.exists(video_file):
-        print(f"Error: File '{video_file}' not found.")
-        return
-
-    # Check for existing clean audio
-    if check_clean_audio(video_file):
-        if not args.force:
-            print("'Clean' audio track already exists. Use --force to replace it.")
-            return
-
-    base_name = os.path.splitext(os.path.basename(video_file))[0]
-    output_dir = os.path.dirname(video_file)
-    transcription_file = os.path.join(output_dir, f"{base_name}_transcription.json")
+    metrics = RunMetrics()
+    cleaner = Cleaner.from_args(args)
 
-    if os.path.exists(transcription_file) and not args.force:
-        print("Transcription already exists. Skipping.")
-        return
+    def on_stage(stage):
+        update_job_state(args.journal, args.video_file, stage)
 
-    # Extract subtitles
-    subtitle_file = extract_subtitles(video_file)
-    has_subtitles = subtitle_file is not None
-    has_swears_in_subs = False
-
-    if subtitle_file and not args.skip_subtitle_check:
-        print("Checking subtitles for target words...")
-        has_swears_in_subs = has_target_words_in_subtitles(subtitle_file)
-
-        if has_swears_in_subs:
-            print("Found target words in subtitles, creating clean version...")
-            clean_subtitle_file = clean_subtitles(subtitle_file)
-
-            # Save cleaned subtitles
-            base_path = os.path.splitext(video_file)[0]
-            output_srt = f"{base_path}.Clean.en.srt"
-            with open(clean_subtitle_file, 'rb') as src, open(output_srt, 'wb') as dst:
-                dst.write(src.read())
-            print(f"Clean subtitles saved to '{output_srt}'")
-            os.unlink(clean_subtitle_file)
+    try:
+        if args.metrics_out:
+            with metrics.timer:
+                cleaner.clean(args.video_file, on_stage, metrics)
         else:
-            print("No target words found in subtitles, skipping audio processing.")
-            os.unlink(subtitle_file)
-            return
-    elif subtitle_file:
-        pass  # skip_subtitle_check mode
-    else:
-        print("No subtitle track found, will use full Whisper transcription.")
-
-    if args.subtitles_only:
-        if subtitle_file:
-            os.unlink(subtitle_file)
-        return
-
-    # Extract full audio for processing
-    extracted_audio = extract_audio(video_file)
-
-    # Decide pipeline: targeted (subtitle-driven) vs full Whisper
-    if has_subtitles and has_swears_in_subs and not args.full_whisper:
-        # --- Targeted Pipeline ---
-        print("\n=== Using targeted Whisper pipeline (subtitle-driven) ===")
-        mute_windows = targeted_transcription(
-            video_file, subtitle_file, extracted_audio, transcription_file
-        )
-        os.unlink(subtitle_file)
-
-        if not mute_windows:
-            print("No mute windows generated. Exiting.")
-            os.unlink(extracted_audio)
-            return
-
-        filter_string = generate_filter_from_mute_windows(mute_windows)
-    else:
-        # --- Full Whisper Pipeline (fallback for no subtitles) ---
-        if subtitle_file:
-            os.unlink(subtitle_file)
-        print("\n=== Using full Whisper transcription (no subtitles available) ===")
-        transcribe_audio(extracted_audio, transcription_file)
-
-        filter_string = generate_filter(transcription_file)
-
-    if not filter_string:
-        print("No sections to mute. Exiting.")
-        os.unlink(extracted_audio)
-        return
-
-    if args.save_filter:
-        filter_file = os.path.join(output_dir, f"{base_name}_filter-string.txt")
-        with open(filter_file, 'w') as f:
-            f.write(filter_string)
-        print(f"FFmpeg filter string saved to '{filter_file}'")
-
-    muted_audio = mute_audio(extracted_audio, filter_string)
-    os.unlink(extracted_audio)
-
-    if args.embed_audio:
-        add_audio_to_video(video_file, muted_audio)
-    else:
-        save_clean_audio(video_file, muted_audio)
-    os.unlink(muted_audio)
+            cleaner.clean(args.video_file, on_stage, metrics)
+    finally:
+        cleaner.close()
+        if args.metrics_out:
+            metrics.save(args.metrics_out)
 
 if __name__ == "__main__":
     main()
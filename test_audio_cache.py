@@ -0,0 +1,111 @@
+import numpy as np
+import pytest
+from audio_cache import (
+    SAMPLE_RATE,
+    TranscriptionCache,
+    audio_fingerprint,
+    bit_errors,
+    format_cache_stats,
+    read_cache_stats,
+    uncovered_gaps
+)
+
+def synthetic_audio(seed, seconds):
+    """Broadband test signal: many partials with slowly varying amplitudes."""
+    rng = np.random.default_rng(seed)
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    audio = np.zeros_like(t)
+    for _ in range(120):
+        frequency, rate = rng.uniform(200, 2500), rng.uniform(0.5, 4)
+        audio += np.sin(2 * np.pi * frequency * t + rng.uniform(0, 6)) * (1 + np.sin(2 * np.pi * rate * t + rng.uniform(0, 6)))
+    return (audio / 40).astype(np.float32)
+
+def fake_transcriber(calls):
+    """Return one word per second of audio, recording the length of each call."""
+    def transcribe(samples):
+        calls.append(len(samples) / SAMPLE_RATE)
+        return [{"word": f" w{i}", "start": i + 0.2, "end": i + 0.6} for i in range(int(len(samples) / SAMPLE_RATE))]
+    return transcribe
+
+@pytest.fixture
+def cache(tmp_path):
+    cache = TranscriptionCache(str(tmp_path / "cache.sqlite"))
+    yield cache
+    cache.close()
+
+def test_fingerprint_ignores_volume():
+    """Test that scaling the audio leaves the fingerprint unchanged"""
+    audio = synthetic_audio(1, 5)
+    fingerprint = audio_fingerprint(audio)
+    assert fingerprint.dtype == np.uint32
+    assert len(fingerprint) > 100
+    assert bit_errors(fingerprint, audio_fingerprint(audio * 0.5)).sum() == 0
+
+def test_cache_reuses_recurring_intro(cache):
+    """Test that an intro heard before is matched at its new offset and not retranscribed"""
+    intro = synthetic_audio(1, 20)
+    first = np.concatenate([synthetic_audio(2, 10), intro, synthetic_audio(3, 15)])
+    noise = np.random.default_rng(0).normal(0, 0.002, len(intro)).astype(np.float32)
+    second = np.concatenate([synthetic_audio(4, 7.3), intro * 0.7 + noise, synthetic_audio(5, 12)])
+
+    calls = []
+    cache.transcribe(first, fake_transcriber(calls))
+    assert calls == [45.0]
+
+    calls.clear()
+    words = cache.transcribe(second, fake_transcriber(calls))
+    # Only the audio around the intro went to the transcriber
+    assert sum(calls) < 22
+    # An intro word at 25.2s in the first episode moved back by 2.7s
+    intro_word = next(word for word in words if word["word"] == " w25" and 20 < word["start"] < 25)
+    assert intro_word["start"] == pytest.approx(22.5, abs=0.05)
+    assert [word["start"] for word in words] == sorted(word["start"] for word in words)
+
+    stats = cache.stats()
+    assert stats["lookups"] == 2
+    assert stats["hits"] == 1
+    # The 20s intro, less the half second at each edge that is retranscribed
+    assert stats["reused_seconds"] == pytest.approx(19, abs=1)
+
+def test_word_in_short_gap_is_transcribed(cache):
+    """Test that a word squeezed between two cached stretches is still transcribed, and whole"""
+    first_part, second_part = synthetic_audio(1, 15), synthetic_audio(2, 15)
+
+    def transcribe(samples):
+        # "Hears" a word wherever the audio is exactly silent
+        silent = np.flatnonzero(samples == 0)
+        if not silent.size:
+            return []
+        return [{"word": " damn", "start": silent[0] / SAMPLE_RATE, "end": (silent[-1] + 1) / SAMPLE_RATE}]
+
+    cache.transcribe(np.concatenate([first_part, second_part]), transcribe)
+    words = cache.transcribe(np.concatenate([first_part, np.zeros(int(0.4 * SAMPLE_RATE), np.float32), second_part]),
+                             transcribe)
+
+    assert cache.stats()["hits"] == 1
+    assert [word["word"] for word in words] == [" damn"]
+    assert words[0]["start"] == pytest.approx(15.0, abs=0.01)
+    assert words[0]["end"] == pytest.approx(15.4, abs=0.01)
+
+def test_unrelated_audio_misses(cache):
+    """Test that new audio is transcribed in full"""
+    calls = []
+    cache.transcribe(synthetic_audio(1, 10), fake_transcriber(calls))
+    cache.transcribe(synthetic_audio(2, 10), fake_transcriber(calls))
+    assert calls == [10.0, 10.0]
+    assert cache.stats()["hits"] == 0
+
+def test_uncovered_gaps():
+    """Test finding the stretches not covered by matched regions"""
+    assert uncovered_gaps([], 10) == [(0.0, 10)]
+    assert uncovered_gaps([(4, 6), (2, 3), (5, 8)], 10) == [(0.0, 2), (3, 4), (8, 10)]
+    assert uncovered_gaps([(0, 10)], 10) == []
+
+def test_format_cache_stats(tmp_path):
+    """Test the per-batch hit rate summary"""
+    cache_file = str(tmp_path / "cache.sqlite")
+    before = read_cache_stats(cache_file)
+    assert format_cache_stats(before, before) == "Dedupe cache: no lookups"
+
+    after = {"lookups": 4, "hits": 1, "seconds": 200, "reused_seconds": 50}
+    assert format_cache_stats(before, after) == "Dedupe cache: 1/4 segments hit (25%), 50s of 200s audio reused (25%)"
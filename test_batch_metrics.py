@@ -0,0 +1,103 @@
+import json
+import threading
+import urllib.request
+from batch_metrics import BatchMetrics, MetricsRegistry, read_run_metrics
+
+RUN = {
+    "pipeline": "targeted",
+    "stage_seconds": {"extracting": 2.5, "transcribing": 40.0, "muxing": 12.0},
+    "mute_window_sources": {"whisper": 5, "srt_fallback": 1},
+    "whisper_audio_seconds": 60.0,
+    "whisper_seconds": 30.0,
+    "ffmpeg_seconds": 14.0,
+    "ffmpeg_calls": 9,
+}
+
+def test_render_counters_and_histograms():
+    """Test the Prometheus text format output"""
+    registry = MetricsRegistry()
+    registry.describe("jobs_total", "counter", "Jobs")
+    registry.describe("job_seconds", "histogram", "Job time")
+    registry.inc("jobs_total", result="success")
+    registry.inc("jobs_total", 2, result="success")
+    registry.inc("jobs_total", result='fa"il')
+    registry.observe("job_seconds", 3)
+    registry.observe("job_seconds", 100.5)
+
+    lines = registry.render().splitlines()
+    assert "# TYPE jobs_total counter" in lines
+    assert 'jobs_total{result="success"} 3' in lines
+    assert 'jobs_total{result="fa\\"il"} 1' in lines
+    assert 'job_seconds_bucket{le="1"} 0' in lines
+    assert 'job_seconds_bucket{le="5"} 1' in lines
+    assert 'job_seconds_bucket{le="120"} 2' in lines
+    assert 'job_seconds_bucket{le="+Inf"} 2' in lines
+    assert "job_seconds_sum 103.5" in lines
+    assert "job_seconds_count 2" in lines
+
+def test_title_finished_records_run(tmp_path):
+    """Test that a title's run metrics feed the batch counters and the textfile"""
+    textfile = tmp_path / "swears.prom"
+    metrics = BatchMetrics(textfile=str(textfile))
+    metrics.title_started()
+    metrics.title_started()
+    assert metrics.get("swears_titles_in_progress") == 2
+
+    metrics.title_finished(True, 55.0, RUN)
+    metrics.title_finished(False, 3.0)  # swears.py failed before writing its metrics
+    assert metrics.get("swears_titles_in_progress") == 0
+    assert metrics.get("swears_titles_processed_total", result="success") == 1
+    assert metrics.get("swears_titles_processed_total", result="failure") == 1
+    assert metrics.get("swears_mute_windows_total", source="srt_fallback") == 1
+    assert metrics.get("swears_ffmpeg_subprocesses_total") == 9
+
+    text = textfile.read_text()
+    assert 'swears_stage_duration_seconds_count{stage="transcribing"} 1' in text
+    assert "swears_whisper_audio_seconds_total 60" in text
+
+def test_concurrent_publish(tmp_path):
+    """Test that threads publishing at once neither collide nor leave temp files"""
+    textfile = tmp_path / "swears.prom"
+    metrics = BatchMetrics(textfile=str(textfile))
+    errors = []
+
+    def worker(n):
+        try:
+            for i in range(50):
+                metrics.title_started()
+                metrics.set_queue_depth(n * 100 + i)
+                metrics.title_finished(True, 1.0, RUN)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=worker, args=(n,)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    assert [path.name for path in tmp_path.iterdir()] == ["swears.prom"]
+    assert metrics.get("swears_titles_processed_total", result="success") == 400
+    assert 'swears_titles_processed_total{result="success"} 400' in textfile.read_text()
+
+def test_metrics_http_endpoint():
+    """Test that /metrics serves the current values"""
+    metrics = BatchMetrics()
+    metrics.serve(0)
+    try:
+        metrics.set_queue_depth(7)
+        port = metrics.server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            body = response.read().decode()
+        assert response.headers["Content-Type"].startswith("text/plain")
+        assert "swears_queue_depth 7" in body.splitlines()
+    finally:
+        metrics.close()
+
+def test_read_run_metrics(tmp_path):
+    """Test reading swears.py --metrics-out files, including missing ones"""
+    metrics_file = tmp_path / "run.json"
+    metrics_file.write_text(json.dumps(RUN))
+    assert read_run_metrics(str(metrics_file)) == RUN
+    assert read_run_metrics(str(tmp_path / "missing.json")) is None
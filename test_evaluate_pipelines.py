@@ -0,0 +1,59 @@
+import json
+import pytest
+from evaluate_pipelines import (
+    annotation_path,
+    build_configurations,
+    format_results,
+    load_annotations,
+    score_windows,
+    summarize_scores
+)
+
+def test_load_annotations_sorted(tmp_path):
+    """Test that ground-truth mutes load next to their video, sorted by start"""
+    video = str(tmp_path / "episode.mkv")
+    assert annotation_path(video) == str(tmp_path / "episode.mutes.json")
+    with open(annotation_path(video), "w") as f:
+        json.dump({"mutes": [{"start": 9.0, "end": 9.5, "word": "b"}, {"start": 2.0, "end": 2.4, "word": "a"}]}, f)
+
+    starts, ends = load_annotations(annotation_path(video))
+    assert starts.tolist() == [2.0, 9.0]
+    assert ends.tolist() == [2.4, 9.5]
+
+def test_score_windows():
+    """Test window precision/recall and time coverage against ground truth"""
+    # Window 1 covers mute 1 fully, window 2 clips half of mute 2, window 3 is a false alarm
+    score = score_windows([1.9, 5.0, 20.0], [2.6, 5.2, 21.0], [2.0, 5.0, 30.0], [2.4, 5.4, 30.5])
+    summary = summarize_scores([score])
+    assert summary["precision"] == pytest.approx(2 / 3)
+    assert summary["recall"] == pytest.approx(2 / 3)
+    assert summary["coverage"] == pytest.approx(0.6 / 1.3)
+    assert summary["over_muted_seconds"] == pytest.approx(1.9 - 0.6)
+
+def test_summarize_adds_videos():
+    """Test that scores from several videos are pooled before computing ratios"""
+    summary = summarize_scores([score_windows([], [], [1.0], [1.5]), score_windows([4.0], [5.0], [4.2], [4.6])])
+    assert summary["windows"] == 1
+    assert summary["mutes"] == 2
+    assert summary["recall"] == 0.5
+    assert summary["precision"] == 1.0
+
+def test_build_configurations():
+    """Test that clip buffers only multiply the targeted pipelines"""
+    configurations = build_configurations(["full", "targeted"], ["tiny.en", "base.en"], [1.0, 2.0])
+    assert [c["name"] for c in configurations] == [
+        "full/tiny.en", "full/base.en",
+        "targeted/tiny.en/buffer=1", "targeted/tiny.en/buffer=2",
+        "targeted/base.en/buffer=1", "targeted/base.en/buffer=2",
+    ]
+
+def test_format_results_recommends_fastest_passing():
+    """Test that the fastest configuration meeting the recall bar is recommended"""
+    base = {"whisper_seconds": 1, "audio_seconds_decoded": 1, "ffmpeg_seconds": 1, "precision": 1, "coverage": 1}
+    results = [
+        {**base, "name": "full/base.en", "wall_seconds": 300, "recall": 1.0},
+        {**base, "name": "targeted/tiny.en/buffer=1", "wall_seconds": 20, "recall": 0.8},
+        {**base, "name": "targeted/base.en/buffer=2", "wall_seconds": 40, "recall": 0.97},
+    ]
+    assert format_results(results, 0.95).endswith("recall >= 0.95: targeted/base.en/buffer=2")
+    assert format_results(results, 1.5).endswith("No configuration reached recall >= 1.5")
@@ -0,0 +1,125 @@
+import os
+import pytest
+from job_journal import (
+    DONE,
+    FAILED,
+    QUEUED,
+    MUXING,
+    TRANSCRIBING,
+    JobJournal,
+    SIDECAR_TEMP_SUFFIX,
+    cleanup_orphan_temp_files,
+    job_priority
+)
+from lease_coordinator import LeaseCoordinator
+
+@pytest.fixture
+def journal(tmp_path):
+    journal = JobJournal(str(tmp_path / "journal.sqlite"))
+    yield journal
+    journal.close()
+
+def test_claim_follows_priority(journal):
+    """Test that jobs are claimed lowest priority value first"""
+    journal.add("long.mkv", priority=7200)
+    journal.add("short.mkv", priority=1300)
+    journal.add("medium.mkv", priority=2700)
+
+    claimed = [journal.claim_next() for _ in range(4)]
+    assert claimed == [os.path.abspath(name) for name in ("short.mkv", "medium.mkv", "long.mkv")] + [None]
+    assert journal.get_state("short.mkv") == "extracting"
+
+def test_recover_requeues_interrupted_jobs(tmp_path):
+    """Test that a journal reopened after a crash resumes in-progress jobs"""
+    journal_file = str(tmp_path / "journal.sqlite")
+    journal = JobJournal(journal_file)
+    journal.add("a.mkv")
+    journal.add("b.mkv")
+    journal.claim_next()
+    journal.set_state("a.mkv", MUXING)
+    journal.set_state("b.mkv", DONE)
+    journal.close()
+
+    journal = JobJournal(journal_file)
+    assert journal.recover() == 1
+    assert journal.get_state("a.mkv") == QUEUED
+    assert journal.get_state("b.mkv") == DONE
+    journal.close()
+
+def test_failures_back_off_then_fail(journal):
+    """Test exponential backoff between retries and permanent failure"""
+    journal.add("flaky.mkv")
+
+    assert journal.claim_next(now=0) is not None
+    assert journal.record_failure("flaky.mkv", "boom", max_attempts=2, backoff=10) == QUEUED
+    wakeup = journal.next_wakeup()
+    assert journal.claim_next(now=wakeup - 1) is None
+    assert journal.claim_next(now=wakeup) is not None
+
+    journal.set_state("flaky.mkv", TRANSCRIBING)
+    assert journal.record_failure("flaky.mkv", "boom", max_attempts=2, backoff=10) == FAILED
+    assert journal.next_wakeup() is None
+    assert journal.counts()[FAILED] == 1
+
+def test_job_priority_orders(tmp_path, monkeypatch):
+    """Test newest-first, and shortest-first with unprobeable titles last"""
+    old, new = tmp_path / "old.mkv", tmp_path / "new.mkv"
+    old.write_bytes(b"x" * 2000)
+    new.write_bytes(b"x" * 1000)
+    os.utime(old, (1000, 1000))
+    os.utime(new, (2000, 2000))
+
+    assert job_priority(str(new), "newest") < job_priority(str(old), "newest")
+
+    # A small file that can't be probed must not jump ahead of long, probed titles
+    durations = {str(old): 7200.0, str(new): None}
+    monkeypatch.setattr("job_journal.probe_duration", durations.get)
+    assert job_priority(str(old), "shortest") == 7200.0
+    assert job_priority(str(old), "shortest") < job_priority(str(new), "shortest")
+
+def test_cleanup_orphan_temp_files(tmp_path):
+    """Test that only interrupted remux temp files are removed"""
+    (tmp_path / "show").mkdir()
+    orphan = tmp_path / "show" / "episode.mkv.temp.mkv"
+    orphan.write_bytes(b"partial")
+    (tmp_path / "show" / "episode.mkv").write_bytes(b"video")
+    (tmp_path / "show" / "episode.temp.notes.txt").write_text("keep")
+
+    assert cleanup_orphan_temp_files(str(tmp_path)) == [str(orphan)]
+    assert sorted(os.listdir(tmp_path / "show")) == ["episode.mkv", "episode.temp.notes.txt"]
+
+def test_cleanup_skips_temp_files_of_active_videos(tmp_path):
+    """Test that temp files of videos another node is remuxing are kept"""
+    busy = tmp_path / "busy.mkv.temp.mkv"
+    stale = tmp_path / "stale.mp4.temp.mp4"
+    busy.write_bytes(b"in progress")
+    stale.write_bytes(b"orphan")
+
+    removed = cleanup_orphan_temp_files(str(tmp_path), is_active=lambda video: video.endswith("busy.mkv"))
+    assert removed == [str(stale)]
+    assert busy.exists()
+
+def test_active_lease_protects_sidecar_temp(tmp_path):
+    """Test that a sidecar render in progress on another node survives startup cleanup"""
+    library = tmp_path / "library"
+    library.mkdir()
+    rendering = LeaseCoordinator(str(tmp_path / "leases"), str(library), node_id="a")
+    starting = LeaseCoordinator(str(tmp_path / "leases"), str(library), node_id="b")
+    assert rendering.claim(str(library / "busy.mkv"))
+    busy = library / ("busy.mkv" + SIDECAR_TEMP_SUFFIX)
+    orphan = library / ("idle.mkv" + SIDECAR_TEMP_SUFFIX)
+    busy.write_bytes(b"in progress")
+    orphan.write_bytes(b"orphan")
+
+    assert cleanup_orphan_temp_files(str(library), is_active=starting.is_leased_elsewhere) == [str(orphan)]
+    assert busy.exists()
+
+def test_defer_does_not_count_attempt(journal):
+    """Test that deferring a job claimed elsewhere keeps its attempt budget"""
+    journal.add("shared.mkv")
+    journal.claim_next(now=0)
+    journal.defer("shared.mkv", 300)
+
+    assert journal.get_state("shared.mkv") == QUEUED
+    assert journal.claim_next() is None
+    assert journal.record_failure("shared.mkv", "boom", max_attempts=1) == QUEUED
@@ -0,0 +1,145 @@
+import os
+import json
+import multiprocessing
+import pytest
+from lease_coordinator import LeaseCoordinator
+
+VIDEOS = [f"show/episode_{i:02d}.mkv" for i in range(40)]
+
+def run_node(lease_dir, library_root, node_id, claims_file):
+    """Worker node: claim and 'process' every title it can get."""
+    coordinator = LeaseCoordinator(lease_dir, library_root, node_id=node_id, ttl=60)
+    claimed = []
+    for video in VIDEOS:
+        path = os.path.join(library_root, video)
+        if coordinator.claim(path):
+            with coordinator.hold(path):
+                claimed.append(video)
+            coordinator.release(path, done=True)
+    with open(claims_file, "w") as f:
+        json.dump(claimed, f)
+
+def test_nodes_claim_each_title_exactly_once(tmp_path):
+    """Test that concurrent node processes never process the same title twice"""
+    lease_dir = str(tmp_path / "leases")
+    library_root = str(tmp_path / "library")
+    context = multiprocessing.get_context("spawn")
+    nodes = []
+    for i in range(4):
+        claims_file = str(tmp_path / f"node{i}.json")
+        process = context.Process(target=run_node, args=(lease_dir, library_root, f"node{i}", claims_file))
+        process.start()
+        nodes.append((process, claims_file))
+
+    claimed = []
+    for process, claims_file in nodes:
+        process.join(timeout=60)
+        assert process.exitcode == 0
+        with open(claims_file) as f:
+            claimed.extend(json.load(f))
+
+    assert sorted(claimed) == VIDEOS
+
+def test_done_titles_are_not_claimed_again(tmp_path):
+    """Test that a finished title stays finished for every node"""
+    video = str(tmp_path / "library" / "movie.mkv")
+    first = LeaseCoordinator(str(tmp_path / "leases"), str(tmp_path / "library"), node_id="a")
+    second = LeaseCoordinator(str(tmp_path / "leases"), str(tmp_path / "library"), node_id="b")
+
+    assert first.claim(video)
+    assert not second.claim(video)
+    assert second.is_leased_elsewhere(video)
+    first.release(video, done=True)
+    assert not second.claim(video)
+    assert second.is_done(video)
+
+def test_stale_lease_is_taken_over(tmp_path):
+    """Test that a lease that stops being renewed can be claimed by another node"""
+    video = str(tmp_path / "library" / "movie.mkv")
+    crashed = LeaseCoordinator(str(tmp_path / "leases"), str(tmp_path / "library"), node_id="crashed", ttl=30)
+    survivor = LeaseCoordinator(str(tmp_path / "leases"), str(tmp_path / "library"), node_id="survivor", ttl=30)
+
+    assert crashed.claim(video)
+    assert not survivor.claim(video)
+    stale = crashed.shared_now() - 120
+    os.utime(crashed.lease_path(video), (stale, stale))
+
+    assert survivor.claim(video)
+    assert survivor.owner(video) == "survivor"
+    assert not crashed.renew(video)
+    assert survivor.renew(video)
+
+def test_hold_signals_lost_lease(tmp_path):
+    """Test that hold() sets its event once another node takes the lease over"""
+    video = str(tmp_path / "library" / "movie.mkv")
+    coordinator = LeaseCoordinator(str(tmp_path / "leases"), str(tmp_path / "library"), node_id="a", ttl=0.3)
+    assert coordinator.claim(video)
+
+    with coordinator.hold(video) as lost:
+        assert not lost.is_set()
+        with open(coordinator.lease_path(video), "w") as f:
+            json.dump({"node": "b"}, f)
+        assert lost.wait(2)
+
+def test_renewed_lease_is_given_back(tmp_path):
+    """Test that a lease renewed while being taken over is put back, not deleted"""
+    video = str(tmp_path / "library" / "movie.mkv")
+    owner = LeaseCoordinator(str(tmp_path / "leases"), str(tmp_path / "library"), node_id="owner", ttl=30)
+    other = LeaseCoordinator(str(tmp_path / "leases"), str(tmp_path / "library"), node_id="other", ttl=30)
+    assert owner.claim(video)
+
+    # The lease looks stale when checked, but the owner renews it before the rename
+    now = other.shared_now()
+    clock = iter([now + 120, now])
+    other.shared_now = lambda: next(clock)
+
+    assert not other.claim(video)
+    assert owner.owner(video) == "owner"
+    assert owner.renew(video)
+    leases = [name for name in os.listdir(tmp_path / "leases") if not name.startswith(".clock-")]
+    assert leases == [os.path.basename(owner.lease_path(video))]
+
+def test_give_back_keeps_a_third_nodes_lease(tmp_path):
+    """Test that giving a renewed lease back never replaces a lease created in the meantime"""
+    video = str(tmp_path / "library" / "movie.mkv")
+    owner = LeaseCoordinator(str(tmp_path / "leases"), str(tmp_path / "library"), node_id="owner", ttl=30)
+    other = LeaseCoordinator(str(tmp_path / "leases"), str(tmp_path / "library"), node_id="other", ttl=30)
+    third = LeaseCoordinator(str(tmp_path / "leases"), str(tmp_path / "library"), node_id="third", ttl=30)
+    assert owner.claim(video)
+
+    now = other.shared_now()
+    calls = []
+
+    def shared_now():
+        calls.append(None)
+        if len(calls) == 2:  # Between the rename and the give-back
+            assert third.claim(video)
+        return now + 120 if len(calls) == 1 else now
+
+    other.shared_now = shared_now
+    assert not other.claim(video)
+    assert owner.owner(video) == "third"
+    assert not owner.renew(video)
+
+def test_renew_while_lease_is_moved_aside(tmp_path):
+    """Test that the owner keeps renewing its lease while another node checks it for staleness"""
+    video = str(tmp_path / "library" / "movie.mkv")
+    owner = LeaseCoordinator(str(tmp_path / "leases"), str(tmp_path / "library"), node_id="owner", ttl=30)
+    assert owner.claim(video)
+    stale_path = owner.lease_path(video) + ".stale-0123"
+    os.rename(owner.lease_path(video), stale_path)
+    old = owner.shared_now() - 60
+    os.utime(stale_path, (old, old))
+
+    assert owner.renew(video)
+    assert os.stat(stale_path).st_mtime > old
+
+    with open(stale_path, "w") as f:
+        json.dump({"node": "someone-else"}, f)
+    assert not owner.renew(video)
+
+def test_keys_ignore_mount_point(tmp_path):
+    """Test that nodes mounting the library at different paths agree on keys"""
+    a = LeaseCoordinator(str(tmp_path / "leases"), "/mnt/nas/library", node_id="a")
+    b = LeaseCoordinator(str(tmp_path / "leases"), "/srv/media", node_id="b")
+    assert a.key("/mnt/nas/library/show/e01.mkv") == b.key("/srv/media/show/e01.mkv")
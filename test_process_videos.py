@@ -1,7 +1,13 @@
 import os
 import pytest
 from pathlib import Path
-from process_videos import find_video_files
+import json
+import threading
+import process_videos
+from types import SimpleNamespace
+from batch_metrics import BatchMetrics
+from lease_coordinator import LeaseCoordinator
+from process_videos import find_video_files, process_claimed_video, process_video, run_until_aborted
 
 # Constants
 SAMPLE_VIDEO_MP4 = "sample_video.mp4"
@@ -19,4 +25,49 @@ def test_find_video_files():
     if os.path.exists(SAMPLE_VIDEO_MKV):
         expected_videos.add(str(BASE_DIR / SAMPLE_VIDEO_MKV))
     
-    assert set(video_files) == expected_videos, "Did not find expected sample videos"
\ No newline at end of file
+    assert set(video_files) == expected_videos, "Did not find expected sample videos"
+
+def test_lost_lease_is_not_marked_done(tmp_path, monkeypatch):
+    """Test that a title whose lease was taken over mid-run is left for the new owner"""
+    video = str(tmp_path / "library" / "movie.mkv")
+    coordinator = LeaseCoordinator(str(tmp_path / "leases"), str(tmp_path / "library"), node_id="a", ttl=0.3)
+
+    def stolen_run(video_path, args, metrics=None, abort=None):
+        with open(coordinator.lease_path(video_path), "w") as f:
+            json.dump({"node": "b"}, f)
+        assert abort.wait(2)
+        return True
+
+    monkeypatch.setattr(process_videos, "process_video", stolen_run)
+    assert process_claimed_video(video, SimpleNamespace(), coordinator)
+    assert not coordinator.is_done(video)
+    assert coordinator.owner(video) == "b"
+
+class DefaultOptions(SimpleNamespace):
+    """Parsed process_videos.py arguments with every option left unset"""
+    def __getattr__(self, name):
+        return None
+
+def test_interrupted_title_is_finished(monkeypatch):
+    """Test that a run stopped by Ctrl-C still leaves the in-progress gauge and its metrics file clean"""
+    metrics = BatchMetrics()
+    commands = []
+
+    def interrupted_run(cmd, abort=None):
+        commands.append(cmd)
+        raise KeyboardInterrupt
+
+    monkeypatch.setattr(process_videos, "run_until_aborted", interrupted_run)
+    with pytest.raises(KeyboardInterrupt):
+        process_video("movie.mkv", DefaultOptions(workers=1), metrics)
+
+    assert metrics.get("swears_titles_in_progress") == 0
+    assert metrics.get("swears_titles_processed_total", result="failure") == 1
+    assert not os.path.exists(commands[0][commands[0].index("--metrics-out") + 1])
+
+def test_run_until_aborted():
+    """Test that a command is stopped once the abort event is set"""
+    abort = threading.Event()
+    assert run_until_aborted(["python3", "-c", "print('ok')"], abort).stdout == "ok\n"
+    abort.set()
+    assert run_until_aborted(["python3", "-c", "import time; time.sleep(30)"], abort, poll_seconds=0.1) is None
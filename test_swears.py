@@ -1,16 +1,42 @@
+import io
 import os
 import json
 import pytest
 import shutil
+import subprocess
+import threading
+import numpy as np
+from types import SimpleNamespace
 from pathlib import Path
 from swears import (
-    transcribe_audio,
     check_clean_audio,
-    extract_audio,
-    mute_audio,
-    generate_filter,
+    build_mute_windows,
+    merge_mute_windows,
+    build_centre_mute_filter,
+    save_word_store,
+    load_word_store,
+    pad_mute_windows,
+    save_mute_edl,
+    plan_splice_segments,
+    splice_mute_audio,
+    decode_audio_chunk,
+    probe_packet_count,
+    probe_duration,
+    constrained_decode_options,
+    apply_mute_block,
+    stream_mute_audio,
+    find_candidate_regions,
+    find_scan_fallbacks,
+    select_dialogue_streams,
+    render_clean_tracks,
+    Cleaner,
+    StageTimer,
+    run_whisper,
+    subtitle_cue_track,
+    estimate_subtitle_sync,
+    sync_subtitle_time,
     add_audio_to_video,
-    save_clean_audio
+    format_mute_filter
 )
 
 # Constants for test files
@@ -37,108 +63,569 @@ def test_sample_videos_exist(video_files):
     input_video, _ = video_files
     assert os.path.exists(input_video), f"Sample video file {input_video} not found"
 
+def clean_sample(input_video, **options):
+    """Run the CLI's Cleaner over a sample video without writing sidecar files"""
+    options = {"force": True, "add_clean_subtitles": False, "save_transcription": False, **options}
+    with Cleaner(target_words=TEST_TARGET_WORDS, **options) as cleaner:
+        return cleaner.clean(input_video)
+
 def test_transcription_creation(video_files):
     """Test that transcription is created and contains expected structure"""
     input_video, _ = video_files
-    # Extract and transcribe audio
-    extracted_audio = extract_audio(input_video)
-    transcribe_audio(extracted_audio, EXPECTED_TRANSCRIPTION)
-    
+    transcription_file = Path(os.path.splitext(input_video)[0] + "_transcription.json")
+    result = clean_sample(input_video, full_whisper=True, export_json=True)
+
     # Check transcription file exists
-    transcription_file = BASE_DIR / EXPECTED_TRANSCRIPTION
     assert transcription_file.exists(), "Transcription file was not created"
-    
+
     # Verify transcription content structure
     with open(transcription_file) as f:
         transcription = json.load(f)
-    
+    assert transcription == result.transcription
+
     # Check required fields in transcription
     assert "text" in transcription, "Transcription missing 'text' field"
     assert "segments" in transcription, "Transcription missing 'segments' field"
     assert "words" in transcription["segments"][0], "Transcription segments missing 'words' field"
+    os.remove(transcription_file)
 
 def test_clean_audio_track(video_files):
     """Test that the clean audio track is added to the video"""
     input_video, output_video = video_files
     # First run - should create clean track
-    extracted_audio = extract_audio(input_video)
-    transcribe_audio(extracted_audio, EXPECTED_TRANSCRIPTION)
-    filter_string = generate_filter(EXPECTED_TRANSCRIPTION, target_words=TEST_TARGET_WORDS)
-    muted_audio = mute_audio(extracted_audio, filter_string)
-    
+    result = clean_sample(input_video, full_whisper=True)
+    assert result.status == "cleaned"
+    clean_audio = result.outputs[-1]
+
     # Create test output file
-    add_audio_to_video(input_video, muted_audio, output_file=output_video)
-    
+    add_audio_to_video(input_video, clean_audio, output_file=output_video)
+    os.remove(clean_audio)
+
     # Check if clean track exists in the output file
     assert check_clean_audio(output_video), "Clean audio track was not added"
 
 def test_muted_sections(video_files):
     """Test that muted sections are created correctly"""
     input_video, _ = video_files
-    # Extract and transcribe
-    extracted_audio = extract_audio(input_video)
-    transcribe_audio(extracted_audio, EXPECTED_TRANSCRIPTION)
-    
-    # Load transcription to check muted words
-    transcription_file = BASE_DIR / EXPECTED_TRANSCRIPTION
-    with open(transcription_file) as f:
-        transcription = json.load(f)
-    
+    with Cleaner(target_words=TEST_TARGET_WORDS, force=True, full_whisper=True, add_clean_subtitles=False,
+                 save_transcription=False) as cleaner:
+        result = cleaner.clean(input_video, render=False)
+
     # Generate filter string and verify it contains mute sections
-    filter_string = generate_filter(EXPECTED_TRANSCRIPTION, target_words=TEST_TARGET_WORDS)
-    assert filter_string is not None, "No mute sections were generated"
-    assert "volume=0" in filter_string, "No volume muting found in filter string"
+    assert result.status == "analysed"
+    assert len(result.starts) > 0, "No mute sections were generated"
+    assert "volume=0" in format_mute_filter(result.starts, result.ends), "No volume muting found in filter string"
 
 def test_save_filter_string(video_files):
     """Test that filter string is correctly saved to a file"""
     input_video, _ = video_files
-    base_name = os.path.splitext(os.path.basename(input_video))[0]
-    filter_file = f"{base_name}_filter-string.txt"
-    
-    # Extract and transcribe
-    extracted_audio = extract_audio(input_video)
-    transcribe_audio(extracted_audio, EXPECTED_TRANSCRIPTION)
-    
-    # Generate filter string
-    filter_string = generate_filter(EXPECTED_TRANSCRIPTION, target_words=TEST_TARGET_WORDS)
-    
-    # Save filter string to file
-    with open(filter_file, 'w') as f:
-        f.write(filter_string)
-    
+    filter_file = f"{os.path.splitext(input_video)[0]}_filter-string.txt"
+    result = clean_sample(input_video, full_whisper=True, save_filter=True)
+
     # Verify file exists and contains the filter string
     assert os.path.exists(filter_file), f"Filter string file {filter_file} was not created"
     with open(filter_file, 'r') as f:
         saved_filter = f.read()
-    assert saved_filter == filter_string, "Saved filter string doesn't match generated filter string"
-    
+    assert saved_filter == format_mute_filter(result.starts, result.ends), \
+        "Saved filter string doesn't match generated filter string"
+
     # Clean up
     os.remove(filter_file)
+    os.remove(result.outputs[-1])
 
 def test_save_clean_audio(video_files):
     """Test that clean audio is correctly saved as a separate file"""
     input_video, _ = video_files
     base_name = os.path.splitext(input_video)[0]
     expected_clean_audio = f"{base_name}.Clean.m4a"
-    
-    # Extract and transcribe
-    extracted_audio = extract_audio(input_video)
-    transcribe_audio(extracted_audio, EXPECTED_TRANSCRIPTION)
-    
-    # Generate filter string and create muted audio
-    filter_string = generate_filter(EXPECTED_TRANSCRIPTION, target_words=TEST_TARGET_WORDS)
-    muted_audio = mute_audio(extracted_audio, filter_string)
-    
-    # Save clean audio
-    save_clean_audio(input_video, muted_audio)
-    
+    clean_sample(input_video, full_whisper=True)
+
     # Verify clean audio file exists and is not empty
     assert os.path.exists(expected_clean_audio), f"Clean audio file {expected_clean_audio} was not created"
     assert os.path.getsize(expected_clean_audio) > 0, "Clean audio file is empty"
-    
+
     # Clean up
     os.remove(expected_clean_audio)
 
+def test_build_mute_windows_buffer_rules():
+    """Test that suffix padding applies per word instead of leaking to later words"""
+    starts = [1.0, 5.0, 9.0]
+    ends = [1.5, 5.5, 9.5]
+    words = [" pensioned", " detective", " Irish,"]
+    window_starts, window_ends = build_mute_windows(starts, ends, words, target_words=TEST_TARGET_WORDS)
+
+    assert window_starts.tolist() == pytest.approx([0.9, 4.9, 8.9])
+    assert window_ends.tolist() == pytest.approx([1.8, 5.6, 9.6])
+
+def test_build_mute_windows_word_rule_and_merge():
+    """Test per-word padding rules and merging of overlapping windows"""
+    rules = [{"word": "irish", "start": 0.5, "end": 0.5}]
+    window_starts, window_ends = build_mute_windows(
+        [3.0, 2.0, 10.0], [3.4, 2.6, 10.2], [" detective", " Irish", " hello"],
+        target_words=TEST_TARGET_WORDS, buffer_rules=rules
+    )
+
+    assert window_starts.tolist() == pytest.approx([1.5])
+    assert window_ends.tolist() == pytest.approx([3.5])
+
+def test_merge_mute_windows():
+    """Test that merged windows are sorted and disjoint"""
+    starts, ends = merge_mute_windows([5.0, 0.0, 1.0, 8.0], [6.0, 2.0, 1.5, 9.0])
+    assert starts.tolist() == [0.0, 5.0, 8.0]
+    assert ends.tolist() == [2.0, 6.0, 9.0]
+
+def test_build_centre_mute_filter():
+    """Test that only the centre channel passes through the mute chain"""
+    channels = ["FL", "FR", "FC", "LFE", "BL", "BR"]
+    mute_filter = "volume=enable='between(t,1,2)':volume=0"
+    graph = build_centre_mute_filter("5.1", channels, mute_filter)
+
+    assert graph.startswith("[0:a]channelsplit=channel_layout=5.1[FL][FR][FC][LFE][BL][BR];")
+    assert f"[FC]{mute_filter}[FCm];" in graph
+    assert "[FL][FR][FCm][LFE][BL][BR]join=inputs=6:channel_layout=5.1:" in graph
+    assert graph.endswith("map=0.0-FL|1.0-FR|2.0-FC|3.0-LFE|4.0-BL|5.0-BR[out]")
+
+def test_word_store_round_trip(tmp_path):
+    """Test that the compact word store preserves timestamps and words"""
+    store_file = tmp_path / "sample_transcription.words"
+    words = [" Irish", " pension", " café", " Irish"]
+    save_word_store(store_file, [0.5, 1.25, 2.0, 3.5], [1.0, 1.75, 2.5, 4.0], words)
+
+    for mmap in (True, False):
+        starts, ends, loaded_words = load_word_store(store_file, mmap=mmap)
+        assert starts.tolist() == [0.5, 1.25, 2.0, 3.5]
+        assert ends.tolist() == [1.0, 1.75, 2.5, 4.0]
+        assert loaded_words.tolist() == words
+
+def test_save_mute_edl(tmp_path):
+    """Test that targeted mute windows are written as a merged EDL mute list"""
+    video_file = str(tmp_path / "episode.mkv")
+    mute_windows = [
+        {"start": 12.0, "end": 12.4, "source": "whisper"},
+        {"start": 3.5, "end": 4.0, "source": "srt_fallback"},
+        {"start": 12.3, "end": 12.8, "source": "whisper"},
+    ]
+    edl_file = save_mute_edl(video_file, *pad_mute_windows(mute_windows))
+
+    assert edl_file == str(tmp_path / "episode.edl")
+    with open(edl_file) as f:
+        assert f.read() == "3.400\t4.100\t1\n11.900\t12.900\t1\n"
+
+def test_decode_audio_chunk_seeks_source(monkeypatch):
+    """Test that source clips seek the input before decoding the chosen stream"""
+    commands = []
+    monkeypatch.setattr("swears.subprocess.run",
+                        lambda cmd, **kwargs: commands.append(cmd) or SimpleNamespace(stdout=b""))
+
+    decode_audio_chunk(SAMPLE_VIDEO_MKV, 61.5, 3.5, audio_stream_idx=1, audio_filter="pan=mono|c0=FC")
+
+    cmd = commands[0]
+    assert cmd.index("-ss") < cmd.index("-i")
+    assert cmd[cmd.index("-ss") + 1] == "61.5"
+    assert cmd[cmd.index("-t") + 1] == "3.5"
+    assert cmd[cmd.index("-map") + 1] == "0:a:1"
+    assert cmd[cmd.index("-af") + 1] == "pan=mono|c0=FC"
+
+def test_plan_splice_segments():
+    """Test that only frame-aligned regions around mutes are re-encoded"""
+    packet_times = [i * 0.032 for i in range(1000)]  # 32ms codec frames
+    segments = plan_splice_segments([10.0, 10.9, 25.0], [10.5, 11.2, 25.4], packet_times, margin=0.5)
+
+    modes = [mode for mode, _, _ in segments]
+    assert modes == ["copy", "encode", "copy", "encode", "copy"]
+    # Segments are contiguous and cover the whole track
+    for (_, _, end), (_, start, _) in zip(segments, segments[1:]):
+        assert end == start
+    assert segments[0][1] == 0.0 and segments[-1][2] is None
+    # Cuts land on frame boundaries outside the padded windows
+    _, encode_start, encode_end = segments[1]
+    assert encode_start <= 9.5 and encode_end >= 11.7
+    assert encode_start in packet_times and encode_end in packet_times
+
+def test_plan_splice_segments_mute_at_end():
+    """Test that a mute past the last probed frame is encoded to the end"""
+    segments = plan_splice_segments([0.2, 30.0], [0.6, 31.0], [0.0, 0.5, 1.0, 1.5, 29.0, 29.5], margin=0.5)
+    assert segments == [("encode", 0.0, 1.5), ("copy", 1.5, 29.5), ("encode", 29.5, None)]
+
+def test_constrained_decode_options():
+    """Test that constrained decoding is greedy, single-pass and length-capped"""
+    model = SimpleNamespace(is_multilingual=False, dims=SimpleNamespace(n_text_ctx=448))
+    options = constrained_decode_options(model, "Is that the Irish detective?")
+
+    assert options["temperature"] == 0.0
+    assert options["condition_on_previous_text"] is False
+    assert options["beam_size"] is None and options["best_of"] is None
+    assert options["initial_prompt"] == "Is that the Irish detective?"
+    assert 16 < options["sample_len"] <= 224
+
+def test_apply_mute_block():
+    """Test that block-wise muting matches the windows across block boundaries"""
+    sample_rate = 100
+    starts, ends = np.array([0.5, 1.9]), np.array([0.75, 2.2])
+    track = np.ones((300, 2), dtype=np.int16)
+
+    for first_frame in range(0, 300, 64):
+        apply_mute_block(track[first_frame:first_frame + 64], first_frame, sample_rate, starts, ends)
+
+    silent = np.flatnonzero(track[:, 0] == 0)
+    assert silent.tolist() == list(range(50, 75)) + list(range(190, 220))
+    assert (track[:, 1] == track[:, 0]).all()
+
+def test_apply_mute_block_single_channel():
+    """Test that only the requested channel is muted"""
+    block = np.ones((100, 6), dtype=np.int16)
+    muted = apply_mute_block(block, 0, 100, np.array([0.1]), np.array([0.2]), channel=2)
+
+    assert muted == 10
+    assert (block[10:20, 2] == 0).all()
+    assert block.sum() == 600 - 10
+
+class FakePipeProcess:
+    """Popen stand-in: a decoder whose stdout holds data, or an encoder collecting its stdin"""
+    def __init__(self, data=b""):
+        self.stdout = io.BytesIO(data)
+        self.received = bytearray()
+        self.stdin = SimpleNamespace(write=self.received.extend, close=lambda: None)
+
+    def wait(self):
+        return 0
+
+def test_stream_mute_audio_keeps_source_format(monkeypatch):
+    """Test that 5.1 float audio is streamed at its own rate, layout and sample format"""
+    stream = {"channels": 6, "channel_layout": "5.1(side)", "sample_rate": "48000", "sample_fmt": "fltp"}
+    track = np.full((2 * 48000, 6), 0.25, dtype="<f4")
+    commands, processes = [], [FakePipeProcess(track.tobytes()), FakePipeProcess()]
+    monkeypatch.setattr("swears.probe_audio_stream", lambda source, idx: stream)
+    monkeypatch.setattr("swears.subprocess.Popen", lambda cmd, **kwargs: commands.append(cmd) or processes[len(commands) - 1])
+
+    muted_file = stream_mute_audio("movie.mkv", np.array([0.5]), np.array([1.0]))
+    os.unlink(muted_file)
+
+    decoder_cmd, encoder_cmd = commands
+    assert decoder_cmd[decoder_cmd.index("-f") + 1] == "f32le" and decoder_cmd[decoder_cmd.index("-ar") + 1] == "48000"
+    pcm_input = encoder_cmd[:encoder_cmd.index("-i")]
+    assert pcm_input[pcm_input.index("-channel_layout") + 1] == "5.1(side)"
+    assert pcm_input[pcm_input.index("-f") + 1] == "f32le" and pcm_input[pcm_input.index("-ar") + 1] == "48000"
+    muted = np.frombuffer(bytes(processes[1].received), dtype="<f4").reshape(-1, 6)
+    assert muted.shape == track.shape
+    assert (muted[24000:48000] == 0).all() and (muted[:24000] == 0.25).all() and (muted[48000:] == 0.25).all()
+
+def test_find_candidate_regions():
+    """Test that the scan pass flags misheard target words with a clip buffer"""
+    words = [" Well", " duck", " this,", " as", " shit!", " table"]
+    starts = np.array([1.0, 10.0, 10.4, 20.0, 30.0, 40.0])
+    ends = starts + 0.3
+    region_starts, region_ends = find_candidate_regions(starts, ends, words, clip_buffer=1.0)
+
+    # "duck" is spelled like a target word, "shit!" matches outright, "as" is too short
+    assert region_starts.tolist() == pytest.approx([9.0, 29.0])
+    assert region_ends.tolist() == pytest.approx([11.3, 31.3])
+
+    strict_starts, _ = find_candidate_regions(starts, ends, words, threshold=0.9)
+    assert strict_starts.tolist() == pytest.approx([29.0])
+
+def test_find_scan_fallbacks():
+    """Test that confident scan hits are kept only where the precise pass found no target word"""
+    scan = {"segments": [{"words": [
+        {"word": " shit", "start": 10.0, "end": 10.3, "probability": 0.9},
+        {"word": " damn", "start": 20.0, "end": 20.3, "probability": 0.9},
+        {"word": " fuck", "start": 30.0, "end": 30.3, "probability": 0.2},
+    ]}]}
+    precise = [{"word": " shit!", "start": 10.05, "end": 10.35}, {"word": " jam", "start": 20.0, "end": 20.3}]
+
+    fallbacks = find_scan_fallbacks(scan, [9.0, 19.0, 29.0], precise)
+
+    # The precise pass confirmed "shit" and the scan was unsure of "fuck"
+    assert fallbacks == [{"word": " damn", "start": 20.0, "end": 20.3}]
+
+def ffmpeg_command_option(cmd, option):
+    return cmd[cmd.index(option) + 1]
+
+def test_splice_mute_audio_keeps_duration(tmp_path):
+    """Test that an AC-3 splice keeps the source track's duration and frame count"""
+    source = str(tmp_path / "tone.mka")
+    subprocess.run(["ffmpeg", "-y", "-v", "quiet", "-f", "lavfi", "-i", "sine=frequency=440:sample_rate=48000:duration=20",
+                    "-c:a", "ac3", "-b:a", "192k", source], check=True)
+
+    spliced = splice_mute_audio(source, np.array([5.0, 12.0]), np.array([5.5, 12.4]), audio_stream_idx=0)
+    assert spliced is not None
+    try:
+        assert probe_packet_count(spliced) == probe_packet_count(source)
+        assert probe_duration(spliced) == pytest.approx(probe_duration(source), abs=0.001)
+        assert decode_audio_chunk(spliced).size == decode_audio_chunk(source).size
+    finally:
+        os.unlink(spliced)
+
+def test_splice_mute_audio_drops_priming(monkeypatch):
+    """Test that re-encoded AC-3 segments start early by the priming remainder and drop the priming frame"""
+    frame = 1536 / 48000
+    commands = []
+    monkeypatch.setattr("swears.probe_audio_stream", lambda video, idx: {"codec_name": "ac3", "sample_rate": "48000"})
+    monkeypatch.setattr("swears.probe_packet_times", lambda video, idx, intervals: [i * frame for i in range(1000)])
+    monkeypatch.setattr("swears.subprocess.run", lambda cmd, **kwargs: commands.append(cmd))
+    monkeypatch.setattr("swears.probe_packet_count", lambda segment_file: 48)  # 9.472-11.008s re-encoded
+
+    spliced = splice_mute_audio("movie.mkv", np.array([10.0]), np.array([10.5]), audio_stream_idx=0, margin=0.5)
+    assert spliced is not None
+    os.unlink(spliced)
+
+    copy_cmd, encode_cmd, tail_cmd = commands[:3]
+    region_start = float(ffmpeg_command_option(copy_cmd, "-t"))
+    assert region_start == pytest.approx(296 * frame)
+    # 256 priming samples: start 1280 samples early so the priming fills exactly one dropped frame
+    lead = 1280 / 48000
+    assert float(ffmpeg_command_option(encode_cmd, "-ss")) == pytest.approx(region_start - lead)
+    assert float(ffmpeg_command_option(encode_cmd, "-t")) == pytest.approx(48 * frame + lead)
+    assert ffmpeg_command_option(encode_cmd, "-bsf:a") == "noise=drop=not(trunc(n/1))"
+    assert f"between(t,{round(10.0 - region_start + lead, 3)}" in ffmpeg_command_option(encode_cmd, "-af")
+    assert float(ffmpeg_command_option(tail_cmd, "-ss")) == pytest.approx(region_start + 48 * frame)
+
+def test_splice_mute_audio_checks_drift_before_encoding(monkeypatch):
+    """Test that segments off the encoder's frame grid abandon the splice before anything is encoded"""
+    commands = []
+    monkeypatch.setattr("swears.probe_audio_stream", lambda video, idx: {"codec_name": "aac", "sample_rate": "48000"})
+    monkeypatch.setattr("swears.probe_packet_times", lambda video, idx, intervals: [i * 0.5 for i in range(100)])
+    monkeypatch.setattr("swears.subprocess.run", lambda cmd, **kwargs: commands.append(cmd))
+
+    # 1.5s is 70.3 AAC frames at 48 kHz, so the encoder would pad 15 ms
+    assert splice_mute_audio("movie.mkv", np.array([10.0]), np.array([10.5]), audio_stream_idx=0) is None
+    assert commands == []
+
+def audio_stream(language, title=None, layout="stereo"):
+    tags = {"language": language, **({"title": title} if title else {})}
+    return {"channels": 6 if layout == "5.1" else 2, "channel_layout": layout, "tags": tags}
+
+def test_select_dialogue_streams():
+    """Test that all English dialogue tracks are cleaned and one is transcribed"""
+    streams = [
+        audio_stream("fre"),
+        audio_stream("eng", "Stereo"),
+        audio_stream("eng", "Surround", "5.1"),
+        audio_stream("eng", "Director's Commentary"),
+        audio_stream("eng", "Clean"),
+    ]
+    assert select_dialogue_streams(streams) == ([1, 2], 1)
+    assert select_dialogue_streams(streams, centre_only=True) == ([1, 2], 2)
+    assert select_dialogue_streams([audio_stream("fre"), audio_stream("")]) == ([1], 1)
+
+def test_render_clean_tracks_single_pass(monkeypatch):
+    """Test that every selected track is muted and muxed in one ffmpeg write"""
+    streams = [audio_stream("eng", "Stereo"), audio_stream("eng", "Surround", "5.1"), audio_stream("eng", "Clean")]
+    commands = []
+    monkeypatch.setattr("swears.probe_audio_streams", lambda video_file: streams)
+    monkeypatch.setattr("swears.get_surround_channels",
+                        lambda video_file, idx: ("5.1", ["FL", "FR", "FC", "LFE", "BL", "BR"]) if idx == 1 else (None, None))
+    monkeypatch.setattr("swears.subprocess.run", lambda cmd, **kwargs: commands.append(cmd))
+    monkeypatch.setattr("swears.os.replace", lambda src, dst: None)
+
+    output = render_clean_tracks("episode.mkv", np.array([1.0]), np.array([2.0]), [0, 1], embed=True, centre_only=True)
+
+    assert output == "episode.mkv"
+    assert len(commands) == 1
+    cmd = commands[0]
+    graph = cmd[cmd.index("-filter_complex") + 1]
+    assert graph.startswith("[0:a:0]volume=enable='between(t,1.0,2.0)':volume=0[t0out];")
+    assert "[0:a:1]channelsplit=channel_layout=5.1" in graph and graph.endswith("[t1out]")
+    assert cmd[cmd.index("-map") + 1:cmd.index("-map") + 8] == ["0", "-map", "-0:a:2", "-map", "[t0out]", "-map", "[t1out]"]
+    # The old Clean track is dropped, so the new ones follow the two originals
+    assert cmd[cmd.index("-metadata:s:a:2") + 1] == "title=Clean (Stereo)"
+    assert cmd[cmd.index("-metadata:s:a:3") + 1] == "title=Clean (Surround)"
+
+SAMPLE_SRT = """1
+00:00:05,000 --> 00:00:07,000
+Well, damn it all.
+
+2
+00:00:20,000 --> 00:00:22,000
+Nothing to see here.
+"""
+
+class FakeModel:
+    """Hears "damn" 1.5s into any clip"""
+    def __init__(self):
+        self.clip_seconds = []
+
+    def transcribe(self, audio, **kwargs):
+        self.clip_seconds.append(len(audio) / 16000)
+        return {"segments": [{"words": [{"word": " Well,", "start": 1.0, "end": 1.4},
+                                          {"word": " damn", "start": 1.5, "end": 1.8}]}]}
+
+def fake_decode(decodes, track_seconds=30):
+    """Stand-in for decode_audio_chunk that records its calls and returns silence"""
+    def decode(audio_file, offset=0.0, duration=None, **kwargs):
+        decodes.append((offset, duration, kwargs))
+        seconds = track_seconds - offset if duration is None else duration
+        return np.zeros(int(seconds * 16000), dtype=np.float32)
+    return decode
+
+def test_cleaner_targeted_in_memory(tmp_path, monkeypatch):
+    """Test that Cleaner passes subtitles, audio and windows between stages in memory"""
+    video_file = str(tmp_path / "episode.mkv")
+    Path(video_file).touch()
+    model = FakeModel()
+    decodes, renders = [], []
+    monkeypatch.setattr("swears.check_clean_audio", lambda video: False)
+    monkeypatch.setattr("swears.read_subtitles", lambda video: SAMPLE_SRT)
+    monkeypatch.setattr("swears.find_english_audio_stream", lambda video: 1)
+    monkeypatch.setattr("swears.get_surround_channels", lambda video, idx: (None, None))
+    monkeypatch.setattr("swears.load_whisper_model", lambda name, workers: model)
+    monkeypatch.setattr("swears.decode_audio_chunk", fake_decode(decodes))
+    monkeypatch.setattr("swears.render_clean_tracks",
+                        lambda video, starts, ends, streams, **kwargs: renders.append((starts, ends, streams)) or video)
+    stages = []
+
+    with Cleaner(save_transcription=False, embed_audio=True) as cleaner:
+        result = cleaner.clean(video_file, on_stage=stages.append)
+        assert cleaner.clean(video_file).status == "cleaned"  # The model is loaded once and reused
+
+    assert result.status == "cleaned"
+    assert result.pipeline == "targeted"
+    assert stages == ["extracting", "transcribing", "muxing"]
+    # Only the 6s clip (2s line + 2s either side) is decoded for each title, never the whole track
+    assert decodes == [(3.0, 6.0, {"audio_stream_idx": 1, "audio_filter": None})] * 2
+    assert model.clip_seconds == [6.0, 6.0]
+    assert result.mute_windows == [{"start": 4.5, "end": 4.8, "word": "damn", "source": "whisper"}]
+    assert result.starts.tolist() == pytest.approx([4.4]) and result.ends.tolist() == pytest.approx([4.9])
+    assert renders[0][2] == [1]
+    assert "Well, ____ it all." in result.clean_subtitles
+    assert set(result.timings) == {"extracting", "transcribing", "muxing", "total"}
+    assert not (tmp_path / "episode_transcription.json").exists()
+
+def test_stage_timer_counts_only_its_thread(monkeypatch):
+    """Test that nested timers both count swears' ffmpeg and Whisper work, and other threads aren't counted"""
+    monkeypatch.setattr("swears.subprocess.run", lambda cmd, **kwargs: SimpleNamespace(stdout=b""))
+    model = FakeModel()
+    outer, inner = StageTimer(), StageTimer()
+    outer.__enter__()
+    inner.__enter__()
+    decode_audio_chunk("episode.mkv", 0.0, 3.0)
+    run_whisper(model, np.zeros(3 * 16000, dtype=np.float32), word_timestamps=True)
+    worker = threading.Thread(target=decode_audio_chunk, args=("episode.mkv",))
+    worker.start()
+    worker.join()
+    outer.__exit__(None, None, None)  # Leaving out of order must not drop the inner timer
+    decode_audio_chunk("episode.mkv", 3.0, 3.0)
+    inner.__exit__(None, None, None)
+    decode_audio_chunk("episode.mkv", 6.0, 3.0)
+
+    assert (outer.ffmpeg_calls, outer.audio_seconds) == (1, 3.0)
+    assert (inner.ffmpeg_calls, inner.audio_seconds) == (2, 3.0)
+    assert model.clip_seconds == [3.0]
+
+def test_cleaner_edl_ignores_clean_audio(tmp_path, monkeypatch):
+    """Test that --edl only skips titles that already have a mute list, not ones with a clean track"""
+    video_file = str(tmp_path / "episode.mkv")
+    Path(video_file).touch()
+    monkeypatch.setattr("swears.check_clean_audio", lambda video: True)
+    monkeypatch.setattr("swears.read_subtitles", lambda video: SAMPLE_SRT)
+    monkeypatch.setattr("swears.find_english_audio_stream", lambda video: 1)
+    monkeypatch.setattr("swears.get_surround_channels", lambda video, idx: (None, None))
+    monkeypatch.setattr("swears.load_whisper_model", lambda name, workers: FakeModel())
+    monkeypatch.setattr("swears.decode_audio_chunk", fake_decode([]))
+
+    with Cleaner(save_transcription=False, add_clean_subtitles=False, edl=True) as cleaner:
+        result = cleaner.clean(video_file)
+        assert result.status == "cleaned"
+        assert result.outputs == [str(tmp_path / "episode.edl")]
+        assert cleaner.clean(video_file).status == "exists"
+    with Cleaner(save_transcription=False, add_clean_subtitles=False) as cleaner:
+        assert cleaner.clean(video_file).status == "exists"
+
+@pytest.mark.parametrize("options, whole_track_decodes", [({}, 1), ({"chunk_minutes": 10}, 0)])
+def test_cleaner_auto_sync_decodes_once(tmp_path, monkeypatch, options, whole_track_decodes):
+    """Test that auto-sync reuses the decoded track for its envelope, or streams it when memory is bounded"""
+    video_file = str(tmp_path / "episode.mkv")
+    Path(video_file).touch()
+    decodes, sync_sources = [], []
+    monkeypatch.setattr("swears.check_clean_audio", lambda video: False)
+    monkeypatch.setattr("swears.read_subtitles", lambda video: SAMPLE_SRT)
+    monkeypatch.setattr("swears.find_english_audio_stream", lambda video: 1)
+    monkeypatch.setattr("swears.get_surround_channels", lambda video, idx: (None, None))
+    monkeypatch.setattr("swears.load_whisper_model", lambda name, workers: FakeModel())
+    monkeypatch.setattr("swears.decode_audio_chunk", fake_decode(decodes))
+    monkeypatch.setattr("swears.auto_sync_subtitles",
+                        lambda segments, source, *args, **kwargs: sync_sources.append(source) or (None, 2.0))
+
+    with Cleaner(save_transcription=False, edl=True, auto_sync=True, **options) as cleaner:
+        assert cleaner.clean(video_file).status == "cleaned"
+
+    # One decode in both cases: the whole track, which the clip is sliced from, or just the clip
+    assert len(decodes) == 1
+    assert sum(duration is None for offset, duration, kwargs in decodes) == whole_track_decodes
+    assert isinstance(sync_sources[0], np.ndarray) == bool(whole_track_decodes)
+
+class ScriptedModel:
+    """Returns the same words for any audio"""
+    def __init__(self, words):
+        self.words = words
+
+    def transcribe(self, audio, **kwargs):
+        return {"text": "", "segments": [{"words": [dict(word) for word in self.words]}]}
+
+def test_cleaner_cascade_scan_fallback(tmp_path, monkeypatch):
+    """Test that a scan hit the precise model misses is muted at the scan timing and exported"""
+    video_file = str(tmp_path / "movie.mkv")
+    Path(video_file).touch()
+    models = {
+        "tiny.en": ScriptedModel([{"word": " Oh", "start": 5.0, "end": 5.2, "probability": 0.9},
+                                  {"word": " shit", "start": 30.0, "end": 30.3, "probability": 0.9}]),
+        "base.en": ScriptedModel([{"word": " ship", "start": 1.0, "end": 1.3}]),
+    }
+    monkeypatch.setattr("swears.check_clean_audio", lambda video: False)
+    monkeypatch.setattr("swears.read_subtitles", lambda video: None)
+    monkeypatch.setattr("swears.find_english_audio_stream", lambda video: 0)
+    monkeypatch.setattr("swears.get_surround_channels", lambda video, idx: (None, None))
+    monkeypatch.setattr("swears.load_whisper_model", lambda name, workers: models[name])
+    monkeypatch.setattr("swears.decode_audio_chunk", fake_decode([], track_seconds=60))
+
+    with Cleaner(cascade=True, edl=True, export_json=True) as cleaner:
+        result = cleaner.clean(video_file)
+
+    assert result.pipeline == "cascade"
+    assert result.sources == {"scan_fallback": 1, "whisper": 0}
+    assert result.mute_windows == [{"word": "shit", "start": 30.0, "end": 30.3, "source": "scan_fallback"}]
+    assert result.starts.tolist() == pytest.approx([29.9]) and result.ends.tolist() == pytest.approx([30.4])
+    with open(tmp_path / "movie_transcription.json") as f:
+        assert json.load(f)["scan_fallbacks"] == [{"word": " shit", "start": 30.0, "end": 30.3}]
+
+def test_cleaner_rejects_unknown_options():
+    """Test that misspelled options fail loudly instead of being ignored"""
+    with pytest.raises(TypeError, match="embed_audo"):
+        Cleaner(embed_audo=True)
+
+def synthetic_subtitles(duration, seed=0):
+    rng = np.random.default_rng(seed)
+    segments, start = [], 5.0
+    while start < duration - 10:
+        length = rng.uniform(1, 4)
+        segments.append({"start": start, "end": start + length, "text": "..."})
+        start += length + rng.uniform(0.5, 6)
+    return segments
+
+@pytest.mark.parametrize("offset, drift", [(3.2, 0.0), (-1.5, 0.001), (0.4, 23.976 / 25 - 1)])
+def test_estimate_subtitle_sync(offset, drift):
+    """Test recovering a subtitle offset and drift from a noisy speech envelope"""
+    rng = np.random.default_rng(1)
+    duration = 3600
+    segments = synthetic_subtitles(duration)
+    spoken = [
+        {"start": sync_subtitle_time(seg["start"], {"offset": offset, "drift": drift}),
+         "end": sync_subtitle_time(seg["end"], {"offset": offset, "drift": drift})}
+        for seg in segments if rng.uniform() < 0.8  # Some lines are captioned but hard to hear
+    ]
+    activity = np.clip(0.4 * subtitle_cue_track(spoken, duration * 100) + rng.uniform(0, 1, duration * 100), 0, 1)
+
+    sync = estimate_subtitle_sync(activity, segments)
+    assert sync is not None
+    assert sync_subtitle_time(0, sync) == pytest.approx(offset, abs=0.1)
+    assert sync_subtitle_time(3000, sync) == pytest.approx(sync_subtitle_time(3000, {"offset": offset, "drift": drift}), abs=0.1)
+    assert sync["residual"] < 0.1
+
+def test_estimate_subtitle_sync_rejects_unrelated_audio():
+    """Test that subtitles which do not match the audio give no sync"""
+    activity = np.random.default_rng(2).uniform(0, 1, 3600 * 100)
+    assert estimate_subtitle_sync(activity, synthetic_subtitles(3600)) is None
+
 @pytest.fixture(autouse=True)
 def cleanup():
     """Clean up generated files after tests"""
@@ -0,0 +1,81 @@
+import threading
+import pytest
+from watch_videos import (
+    SettleTracker,
+    PollingWatcher,
+    InotifyWatcher,
+    is_candidate_video,
+    watch_directories
+)
+
+def test_is_candidate_video():
+    """Test that temp files and partial downloads are ignored"""
+    assert is_candidate_video("/library/show/episode.mkv")
+    assert not is_candidate_video("/library/show/episode.mkv.temp.mkv")
+    assert not is_candidate_video("/library/show/episode.mkv.part")
+    assert not is_candidate_video("/library/show/.episode.mkv")
+
+def test_settle_tracker_waits_for_stable_file(tmp_path):
+    """Test that a file is only ready once it stops changing"""
+    video = tmp_path / "episode.mkv"
+    video.write_bytes(b"a")
+    tracker = SettleTracker(settle_seconds=5)
+    tracker.touch(str(video), now=0)
+
+    assert tracker.ready(now=3) == []
+    video.write_bytes(b"ab")  # still downloading
+    assert tracker.ready(now=6) == []
+    assert tracker.ready(now=10) == []
+    assert tracker.ready(now=11) == [str(video)]
+    assert tracker.ready(now=20) == []
+
+def test_polling_watcher_reports_new_files(tmp_path):
+    """Test that the polling watcher ignores existing files and reports new ones"""
+    (tmp_path / "old.mkv").write_bytes(b"old")
+    watcher = PollingWatcher([str(tmp_path)], interval=0)
+    assert watcher.poll(timeout=0) == []
+
+    (tmp_path / "season").mkdir()
+    (tmp_path / "season" / "new.mp4").write_bytes(b"new")
+    (tmp_path / "notes.txt").write_text("not a video")
+    assert watcher.poll(timeout=0) == [str(tmp_path / "season" / "new.mp4")]
+
+def test_inotify_watcher_reports_new_files(tmp_path):
+    """Test that the inotify watcher picks up files in new subdirectories"""
+    try:
+        watcher = InotifyWatcher([str(tmp_path)])
+    except OSError:
+        pytest.skip("inotify not available")
+    try:
+        season = tmp_path / "season"
+        season.mkdir()
+        assert watcher.poll(timeout=1) == []  # registers the new directory
+        (season / "new.mkv").write_bytes(b"new")
+        assert watcher.poll(timeout=1) == [str(season / "new.mkv")]
+    finally:
+        watcher.close()
+
+@pytest.mark.parametrize("use_inotify", [True, False])
+def test_watch_directories_processes_settled_files(tmp_path, use_inotify):
+    """Test that each new video is handed to a worker exactly once"""
+    processed = []
+    stop_event = threading.Event()
+
+    def handler(path):
+        processed.append(path)
+        stop_event.set()
+
+    video = tmp_path / "new.mkv"
+    thread = threading.Thread(target=watch_directories, args=([str(tmp_path)], handler), kwargs={
+        "workers": 2, "settle_seconds": 0.2, "poll_interval": 0.05,
+        "use_inotify": use_inotify, "stop_event": stop_event,
+    })
+    thread.start()
+    try:
+        threading.Event().wait(0.3)
+        video.write_bytes(b"video")
+    finally:
+        thread.join(timeout=10)
+        stop_event.set()
+
+    assert processed == [str(video)]
@@ -0,0 +1,39 @@
+import torch
+from whisper.model import Linear
+from whisper_tuning import candidate_profiles, load_profile, plain_linear_layers, save_profile
+
+def test_candidate_profiles_split_cores_between_workers():
+    """Test that candidates never oversubscribe the cores shared by the pool"""
+    profiles = candidate_profiles(workers=4, cpu_count=16)
+    assert max(profile["threads"] for profile in profiles) == 4
+    assert {profile["threads"] for profile in profiles} == {2, 3, 4}
+    assert not any(profile["quantize"] for profile in profiles)
+    assert any(profile["quantize"] for profile in candidate_profiles(workers=4, quantize=True, cpu_count=16))
+    assert candidate_profiles(workers=8, cpu_count=4) == [{"threads": 1, "interop_threads": 1, "quantize": False}]
+
+def test_profiles_are_saved_per_model_and_pool_size(tmp_path, monkeypatch):
+    """Test that tuned profiles round-trip through the cache directory"""
+    monkeypatch.setenv("SWEARS_CACHE_DIR", str(tmp_path))
+    assert load_profile("base.en", 2) is None
+
+    profile = {"threads": 4, "interop_threads": 1, "quantize": True, "seconds": 1.5}
+    save_profile("base.en", 2, profile)
+    save_profile("tiny.en", 2, {**profile, "threads": 2})
+    assert load_profile("base.en", 2) == profile
+    assert load_profile("tiny.en", 2)["threads"] == 2
+    assert load_profile("base.en", 1) is None
+
+def test_plain_linear_layers_allow_quantization():
+    """Test that Whisper's Linear subclass is swapped out without changing outputs"""
+    model = torch.nn.Sequential(Linear(8, 4), torch.nn.ReLU(), torch.nn.Sequential(Linear(4, 2, bias=False)))
+    x = torch.randn(3, 8)
+    expected = model(x)
+
+    plain_linear_layers(model)
+    assert type(model[0]) is torch.nn.Linear
+    assert type(model[2][0]) is torch.nn.Linear
+    assert torch.allclose(model(x), expected)
+
+    quantized = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    assert type(quantized[0]) is not torch.nn.Linear
+    assert torch.allclose(quantized(x), expected, atol=0.1)
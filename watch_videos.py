@@ -0,0 +1,293 @@
+import os
+import time
+import queue
+import select
+import struct
+import ctypes
+import ctypes.util
+import argparse
+import threading
+from pathlib import Path
+from batch_metrics import add_metrics_arguments, create_metrics
+from process_videos import VIDEO_EXTENSIONS, add_pipeline_arguments, process_video
+
+# inotify flags, see <sys/inotify.h>
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0x00000800
+IN_CLOEXEC = 0x00080000
+INOTIFY_EVENT = struct.Struct("iIII")  # wd, mask, cookie, name length
+WATCH_MASK = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+
+
+def is_candidate_video(path):
+    """Check whether a path looks like a finished video we should process.
+
+    Temp files written by swears.py (video.mkv.temp.mkv) and partial
+    downloads (.part, .crdownload, ...) never match VIDEO_EXTENSIONS or are
+    excluded explicitly.
+    """
+    name = os.path.basename(path)
+    if name.startswith(".") or ".temp." in name:
+        return False
+    return Path(name).suffix.lower() in VIDEO_EXTENSIONS
+
+def file_signature(path):
+    """Return (size, mtime) for a file, or None if it no longer exists."""
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+
+class PollingWatcher:
+    """Detect new or changed video files by periodically rescanning directories."""
+
+    def __init__(self, directories, interval=10.0, report_existing=False):
+        self.directories = directories
+        self.interval = interval
+        self.last_scan = 0.0
+        self.signatures = {} if report_existing else self.scan()
+
+    def scan(self):
+        signatures = {}
+        for directory in self.directories:
+            for root, _, files in os.walk(directory):
+                for file in files:
+                    path = os.path.join(root, file)
+                    if is_candidate_video(path):
+                        signature = file_signature(path)
+                        if signature is not None:
+                            signatures[path] = signature
+        return signatures
+
+    def poll(self, timeout):
+        """Return paths that appeared or changed since the previous scan."""
+        wait = self.last_scan + self.interval - time.monotonic()
+        if wait > 0:
+            time.sleep(min(wait, timeout))
+            if wait > timeout:
+                return []
+        self.last_scan = time.monotonic()
+        signatures = self.scan()
+        changed = [path for path, sig in signatures.items() if self.signatures.get(path) != sig]
+        self.signatures = signatures
+        return changed
+
+    def close(self):
+        pass
+
+
+class InotifyWatcher:
+    """Detect new video files with Linux inotify (via ctypes, no dependencies)."""
+
+    def __init__(self, directories, report_existing=False):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or None, use_errno=True)
+        if not hasattr(libc, "inotify_init1"):
+            raise OSError("inotify is not available on this platform")
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches = {}
+        self.pending = []
+        for directory in directories:
+            self.pending.extend(self.add_tree(directory, report_files=report_existing))
+
+    def add_tree(self, directory, report_files=True):
+        """Watch a directory and its subdirectories, returning any videos inside."""
+        found = []
+        for root, _, files in os.walk(directory):
+            wd = self.libc.inotify_add_watch(self.fd, os.fsencode(root), WATCH_MASK)
+            if wd < 0:
+                print(f"Warning: cannot watch '{root}': {os.strerror(ctypes.get_errno())}")
+                continue
+            self.watches[wd] = root
+            if report_files:
+                found.extend(os.path.join(root, file) for file in files)
+        return [path for path in found if is_candidate_video(path)]
+
+    def poll(self, timeout):
+        """Return video paths that were written or moved into a watched directory."""
+        changed, self.pending = self.pending, []
+        readable, _, _ = select.select([self.fd], [], [], 0 if changed else timeout)
+        if not readable:
+            return changed
+
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return changed
+
+        offset = 0
+        while offset < len(data):
+            wd, mask, _, name_len = INOTIFY_EVENT.unpack_from(data, offset)
+            offset += INOTIFY_EVENT.size
+            name = data[offset:offset + name_len].rstrip(b"\0")
+            offset += name_len
+            if wd not in self.watches or not name:
+                continue
+            path = os.path.join(self.watches[wd], os.fsdecode(name))
+            if mask & IN_ISDIR:
+                # New directory (or one moved in): watch it and pick up its contents
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    changed.extend(self.add_tree(path))
+            elif mask & (IN_CLOSE_WRITE | IN_MOVED_TO) and is_candidate_video(path):
+                changed.append(path)
+        return changed
+
+    def close(self):
+        os.close(self.fd)
+
+
+def create_watcher(directories, poll_interval=10.0, report_existing=False, use_inotify=True):
+    """Create an inotify watcher, falling back to polling where unavailable."""
+    if use_inotify:
+        try:
+            return InotifyWatcher(directories, report_existing=report_existing)
+        except (OSError, AttributeError) as e:
+            print(f"inotify unavailable ({e}), falling back to polling every {poll_interval}s")
+    return PollingWatcher(directories, interval=poll_interval, report_existing=report_existing)
+
+
+class SettleTracker:
+    """Debounce file activity until a file has stopped changing.
+
+    A file becomes ready once its size and mtime have been stable for
+    settle_seconds, so partially written downloads are never picked up.
+    """
+
+    def __init__(self, settle_seconds=30.0):
+        self.settle_seconds = settle_seconds
+        self.pending = {}  # path -> (signature, time the signature was last seen to change)
+
+    def touch(self, path, now=None):
+        now = time.monotonic() if now is None else now
+        self.pending[path] = (file_signature(path), now)
+
+    def ready(self, now=None):
+        """Return (and stop tracking) paths that have settled."""
+        now = time.monotonic() if now is None else now
+        settled = []
+        for path, (signature, changed_at) in list(self.pending.items()):
+            current = file_signature(path)
+            if current is None:
+                del self.pending[path]
+            elif current != signature:
+                self.pending[path] = (current, now)
+            elif now - changed_at >= self.settle_seconds:
+                del self.pending[path]
+                settled.append(path)
+        return settled
+
+
+def watch_directories(directories, handler, workers=1, queue_size=16, settle_seconds=30.0,
+                      poll_interval=10.0, report_existing=False, use_inotify=True, stop_event=None, metrics=None):
+    """Watch directories and feed settled video files to handler on worker threads.
+
+    handler(path) is called once per new or replaced video. The work queue
+    is bounded: when it is full, settled files wait in a backlog until a
+    worker frees a slot. Runs until stop_event is set. The number of files
+    waiting is reported to metrics (BatchMetrics), if given.
+    """
+    stop_event = stop_event or threading.Event()
+    work_queue = queue.Queue(maxsize=queue_size)
+    tracker = SettleTracker(settle_seconds)
+    watcher = create_watcher(directories, poll_interval, report_existing, use_inotify)
+    in_flight = set()
+    # Signature of each file as we left it, so our own writes (--embed-audio
+    # replaces the video in place) don't trigger another run
+    processed = {}
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            path = work_queue.get()
+            if path is None:
+                work_queue.task_done()
+                return
+            try:
+                handler(path)
+            except Exception as e:
+                print(f"Failed to process {path}: {str(e)}")
+            finally:
+                with lock:
+                    in_flight.discard(path)
+                    processed[path] = file_signature(path)
+                work_queue.task_done()
+
+    threads = [threading.Thread(target=worker, name=f"swears-worker-{i}", daemon=True) for i in range(workers)]
+    for thread in threads:
+        thread.start()
+
+    backlog = []
+    try:
+        while not stop_event.is_set():
+            for path in watcher.poll(timeout=min(1.0, max(settle_seconds, 0.05))):
+                with lock:
+                    if path in in_flight or processed.get(path) == file_signature(path):
+                        continue
+                tracker.touch(path)
+
+            backlog.extend(path for path in tracker.ready() if path not in backlog)
+            while backlog:
+                try:
+                    work_queue.put_nowait(backlog[0])
+                except queue.Full:
+                    break
+                with lock:
+                    in_flight.add(backlog.pop(0))
+            if metrics is not None:
+                metrics.set_queue_depth(len(backlog) + work_queue.qsize())
+    finally:
+        watcher.close()
+        for _ in threads:
+            work_queue.put(None)
+        for thread in threads:
+            thread.join()
+
+def main():
+    parser = argparse.ArgumentParser(description="Watch directories and clean new video files as they arrive")
+    parser.add_argument("directories", nargs="+", help="Directories to watch (recursively)")
+    add_pipeline_arguments(parser)
+    parser.add_argument("--workers", type=int, default=1, help="Number of videos processed concurrently (default: 1)")
+    parser.add_argument("--queue-size", type=int, default=16, help="Maximum number of videos waiting for a worker (default: 16)")
+    parser.add_argument("--settle-seconds", type=float, default=30.0,
+                        help="Seconds a file must stay unchanged before it is processed (default: 30)")
+    parser.add_argument("--poll-interval", type=float, default=10.0,
+                        help="Rescan interval when inotify is unavailable (default: 10)")
+    parser.add_argument("--polling", action="store_true", help="Always poll instead of using inotify")
+    parser.add_argument("--process-existing", action="store_true", help="Also process videos already present at startup")
+    add_metrics_arguments(parser)
+    args = parser.parse_args()
+
+    for directory in args.directories:
+        if not os.path.isdir(directory):
+            print(f"Error: '{directory}' is not a valid directory")
+            return
+
+    metrics = create_metrics(args)
+    print(f"Watching {', '.join(args.directories)} with {args.workers} worker(s). Press Ctrl+C to stop.")
+    try:
+        watch_directories(
+            args.directories,
+            lambda path: process_video(path, args, metrics),
+            workers=args.workers,
+            queue_size=args.queue_size,
+            settle_seconds=args.settle_seconds,
+            poll_interval=args.poll_interval,
+            report_existing=args.process_existing,
+            use_inotify=not args.polling,
+            metrics=metrics,
+        )
+    except KeyboardInterrupt:
+        print("\nStopped watching.")
+    finally:
+        if metrics is not None:
+            metrics.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,201 @@
+import os
+import sys
+import json
+import time
+import argparse
+import subprocess
+import numpy as np
+import torch
+import whisper
+
+# Decoder steps per benchmarked 30s window, roughly a window of dialogue
+BENCHMARK_TOKENS = 48
+
+
+def cache_dir():
+    """Directory for tuning profiles and prepared model artifacts."""
+    return os.environ.get("SWEARS_CACHE_DIR") or os.path.join(os.path.expanduser("~"), ".cache", "swears")
+
+def profile_key(model_name, workers):
+    """Profiles only apply to the same model, pool size, core count and torch build."""
+    return f"{model_name}:{workers}w:{os.cpu_count()}cpu:torch-{torch.__version__}"
+
+def load_profile(model_name, workers=1):
+    """Return the tuned profile for this host, or None if it hasn't been tuned."""
+    try:
+        with open(os.path.join(cache_dir(), "whisper_profiles.json")) as f:
+            return json.load(f).get(profile_key(model_name, workers))
+    except (OSError, ValueError):
+        return None
+
+def save_profile(model_name, workers, profile):
+    profile_file = os.path.join(cache_dir(), "whisper_profiles.json")
+    os.makedirs(cache_dir(), exist_ok=True)
+    try:
+        with open(profile_file) as f:
+            profiles = json.load(f)
+    except (OSError, ValueError):
+        profiles = {}
+    profiles[profile_key(model_name, workers)] = profile
+    with open(profile_file + ".tmp", "w") as f:
+        json.dump(profiles, f, indent=4)
+    os.replace(profile_file + ".tmp", profile_file)
+
+def candidate_profiles(workers=1, quantize=False, cpu_count=None):
+    """Thread settings worth benchmarking when `workers` processes share the host."""
+    per_worker = max(1, (cpu_count or os.cpu_count() or 1) // workers)
+    profiles = []
+    for threads in sorted({per_worker, max(1, per_worker // 2), max(1, per_worker * 3 // 4)}):
+        for interop_threads in sorted({1, min(2, threads)}):
+            for quantized in ((False, True) if quantize else (False,)):
+                profiles.append({"threads": threads, "interop_threads": interop_threads, "quantize": quantized})
+    return profiles
+
+def apply_profile(profile):
+    """Apply thread settings. Inter-op threads can only be set once per process."""
+    torch.set_num_threads(profile["threads"])
+    try:
+        torch.set_num_interop_threads(profile["interop_threads"])
+    except RuntimeError:
+        pass
+
+def plain_linear_layers(module):
+    """Swap Whisper's Linear subclass for torch.nn.Linear so it can be quantized.
+
+    quantize_dynamic only converts exact nn.Linear instances. Whisper's
+    subclass only casts weights to the input dtype, a no-op in fp32 on CPU.
+    """
+    for name, child in module.named_children():
+        if isinstance(child, torch.nn.Linear) and type(child) is not torch.nn.Linear:
+            linear = torch.nn.Linear(child.in_features, child.out_features, bias=child.bias is not None)
+            linear.weight = child.weight
+            linear.bias = child.bias
+            setattr(module, name, linear)
+        else:
+            plain_linear_layers(child)
+    return module
+
+def prepare_model(model_name, quantize=False):
+    """Load a Whisper model on the CPU, optionally with int8 dynamic quantization."""
+    model = whisper.load_model(model_name, device="cpu")
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(plain_linear_layers(model), {torch.nn.Linear}, dtype=torch.qint8)
+    return model.eval()
+
+def artifact_path(model_name, quantize=False):
+    variant = "int8" if quantize else "fp32"
+    return os.path.join(cache_dir(), f"{model_name}-{variant}-whisper{whisper.__version__}-torch{torch.__version__}.pt")
+
+def load_whisper_model(model_name="base.en", workers=1):
+    """Load a Whisper model with this host's tuned CPU profile applied.
+
+    The prepared (and possibly quantized) model is cached as a pickled
+    module, which loads without whisper.load_model's checksum pass and
+    rebuild. Run `python3 whisper_tuning.py` once to tune the host; without
+    a profile the torch defaults are kept. On a GPU the model is loaded
+    exactly as before.
+    """
+    if torch.cuda.is_available():
+        return whisper.load_model(model_name)
+
+    profile = load_profile(model_name, workers)
+    quantize = False
+    if profile:
+        apply_profile(profile)
+        quantize = profile["quantize"]
+
+    path = artifact_path(model_name, quantize)
+    if os.path.exists(path):
+        try:
+            return torch.load(path, weights_only=False).eval()
+        except Exception as e:
+            print(f"Warning: ignoring unreadable model cache '{path}': {e}")
+
+    model = prepare_model(model_name, quantize)
+    os.makedirs(cache_dir(), exist_ok=True)
+    temp_path = f"{path}.{os.getpid()}.tmp"
+    torch.save(model, temp_path)
+    os.replace(temp_path, path)
+    return model
+
+def benchmark_workload(model, repeats=2):
+    """Encode a 30s window and run the decoder, as Whisper does per window."""
+    audio = np.random.default_rng(0).standard_normal(whisper.audio.N_SAMPLES).astype(np.float32) * 0.1
+    mel = whisper.log_mel_spectrogram(audio, model.dims.n_mels)
+    with torch.inference_mode():
+        for _ in range(repeats):
+            features = model.embed_audio(mel[None])
+            for length in range(1, BENCHMARK_TOKENS + 1):
+                model.logits(torch.zeros((1, length), dtype=torch.long), features)
+
+def run_benchmark(model_name, profile, repeats=2):
+    """Benchmark child: prepare, signal ready, wait for the start line, report seconds."""
+    apply_profile(profile)
+    model = prepare_model(model_name, profile["quantize"])
+    benchmark_workload(model, repeats=1)  # warm up
+    print("ready", flush=True)
+    sys.stdin.readline()
+    start = time.perf_counter()
+    benchmark_workload(model, repeats)
+    print(time.perf_counter() - start, flush=True)
+
+def benchmark_profile(model_name, profile, workers=1, repeats=2):
+    """Time a profile with `workers` processes running concurrently.
+
+    Returns the slowest process's seconds, or None if a process failed.
+    """
+    cmd = [sys.executable, os.path.abspath(__file__), model_name,
+           "--benchmark", json.dumps(profile), "--repeats", str(repeats)]
+    processes = [subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+                 for _ in range(workers)]
+    try:
+        if not all(process.stdout.readline().strip() == "ready" for process in processes):
+            return None
+        for process in processes:
+            process.stdin.write("go\n")
+            process.stdin.close()
+        return max(float(process.stdout.readline()) for process in processes)
+    except ValueError:
+        return None
+    finally:
+        for process in processes:
+            if not process.stdin.closed:
+                process.stdin.close()
+            process.wait()
+
+def tune(model_name="base.en", workers=1, quantize=False, repeats=2):
+    """Benchmark candidate profiles, save the fastest and return it."""
+    best, best_seconds = None, None
+    for profile in candidate_profiles(workers, quantize):
+        seconds = benchmark_profile(model_name, profile, workers, repeats)
+        print(f"threads={profile['threads']} interop={profile['interop_threads']} "
+              f"quantize={profile['quantize']}: {'failed' if seconds is None else f'{seconds:.2f}s'}")
+        if seconds is not None and (best_seconds is None or seconds < best_seconds):
+            best, best_seconds = profile, seconds
+    if best is None:
+        raise RuntimeError("Every benchmark run failed")
+    save_profile(model_name, workers, {**best, "seconds": round(best_seconds, 3)})
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description="Tune Whisper CPU inference settings for this host")
+    parser.add_argument("model", nargs="?", default="base.en", help="Whisper model to tune (default: base.en)")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Number of swears.py processes that will share the host (default: 1)")
+    parser.add_argument("--quantize", action="store_true",
+                        help="Also try int8 dynamic quantization of linear layers (slightly less accurate)")
+    parser.add_argument("--repeats", type=int, default=2, help="Benchmark iterations per profile (default: 2)")
+    parser.add_argument("--benchmark", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        run_benchmark(args.model, json.loads(args.benchmark), args.repeats)
+        return
+
+    print(f"Tuning {args.model} for {args.workers} worker(s) on {os.cpu_count()} CPUs...")
+    best = tune(args.model, args.workers, args.quantize, args.repeats)
+    print(f"Best profile: {best['threads']} threads, {best['interop_threads']} inter-op threads, "
+          f"{'int8' if best['quantize'] else 'fp32'} (saved to {cache_dir()})")
+
+if __name__ == "__main__":
+    main()